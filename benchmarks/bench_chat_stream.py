@@ -0,0 +1,182 @@
+"""
+聊天回复：阻塞式整段返回 vs 后台任务流式生成，对着本地模拟的OpenAI兼容接口（mock_openai_server.py）测量。
+
+1. 单个会话：阻塞式的首字可见时间 = 整段回复耗时；流式的首字可见时间 = 发送回调 + 轮询取到第一段。
+2. 固定 --workers 个请求线程（相当于 gunicorn 的 threads）同时服务 --chats 个聊天和持续的地图回调：
+   阻塞式每个聊天占住一个线程直到回复完成，地图回调排队；流式只占用几毫秒（发送 + 轮询）。
+
+运行: python benchmarks/bench_chat_stream.py [--chats 8] [--workers 4] [--first-token 0.3] [--token-delay 0.02]
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_DIR = tempfile.mkdtemp(prefix="bench_chat_jobs_")
+os.environ["CHAT_JOB_DIR"] = JOB_DIR
+
+from dash_client import callback_payload, percentile, post_callback  # noqa: E402
+from mock_openai_server import MockOpenAIServer  # noqa: E402
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import chatbot_service  # noqa: E402
+    import dashboard_app  # noqa: E402
+APP = dashboard_app.create_app()
+
+MAP_OUTPUTS = [("risk-map", "figure"), ("current-weather-risk-data-store", "data")]
+CHAT_OUTPUTS = [("chat-delta", "data"), ("chat-input", "value"), ("chat-job", "data"),
+                ("chat-stream-poll", "disabled"), ("chat-send-btn", "disabled")]
+QUESTION = "广州现在的洪涝风险如何？"
+
+
+def map_payload(i=0):
+    return callback_payload(MAP_OUTPUTS, [("disaster-tabs", "value", ("flood", "fire")[i % 2]),
+                                          ("risk-time", "value", "now"), ("data-version", "data", None)],
+                            ["risk-time.value"])
+
+
+def chat_payload(trigger, store_id, job):
+    return callback_payload(CHAT_OUTPUTS, [("chat-send-btn", "n_clicks", 1), ("chat-stream-poll", "n_intervals", 1)],
+                            [trigger], state=[("chat-input", "value", QUESTION),
+                                              ("current-weather-risk-data-store", "data", store_id),
+                                              ("risk-time", "value", "now"), ("chat-job", "data", job)])
+
+
+def blocking_chat(store_id):
+    """旧版 update_chat：在请求线程里准备上下文并等待整段回复"""
+    snapshot = dashboard_app.resolve_snapshot(store_id)
+    context = chatbot_service.get_weather_context_for_chatbot(
+        snapshot["weather_dict"], dashboard_app.cities_meta, snapshot["results"]["now"], "now")
+    return chatbot_service.get_chatbot_response(QUESTION, context)
+
+
+def output(resp, component):
+    return resp["response"].get(component, {})
+
+
+def streaming_chat(client, store_id, submit=None):
+    """
+    发送一条消息并按 CHAT_POLL_MS 轮询到结束。submit(fn) 把每次回调请求交给请求线程池执行。
+    回调只返回新增的文字，这里像浏览器端回调一样把它接到聊天记录末尾。
+    返回 (首字可见秒, 完成秒, [各次回调耗时], 最终聊天记录, [各次回调的请求+响应字节数])
+    """
+    run = submit or (lambda fn: fn())
+    t0 = time.perf_counter()
+    elapsed, sent, received, resp = run(lambda: post_callback(
+        client, chat_payload("chat-send-btn.n_clicks", store_id, None)))
+    hold, traffic = [elapsed], [sent + received]
+    history = output(resp, "chat-delta")["data"]["text"]
+    job = output(resp, "chat-job")["data"]
+    first, prompt_len = None, len(history)
+    while True:
+        time.sleep(dashboard_app.CHAT_POLL_MS / 1000.0)
+        elapsed, sent, received, resp = run(lambda: post_callback(
+            client, chat_payload("chat-stream-poll.n_intervals", store_id, job)))
+        hold.append(elapsed)
+        traffic.append(sent + received)
+        if resp is None:  # 没有新内容
+            continue
+        history += output(resp, "chat-delta")["data"]["text"]
+        job = output(resp, "chat-job").get("data", job)
+        if first is None and len(history) > prompt_len:
+            first = time.perf_counter() - t0
+        if output(resp, "chat-stream-poll").get("disabled"):
+            return first, time.perf_counter() - t0, hold, history, traffic
+
+
+def pool_run(mode, store_id, n_chats, workers, map_interval=0.05):
+    """workers 个请求线程；n_chats 个聊天同时开始，期间每 map_interval 秒来一个地图回调，直到聊天全部结束"""
+    pool = ThreadPoolExecutor(max_workers=workers)
+    map_latency, done = [], threading.Event()
+
+    def submit(fn):
+        return pool.submit(fn).result()
+
+    def chat_session(k):
+        client = APP.server.test_client()
+        if mode == "blocking":
+            submit(lambda: blocking_chat(store_id))
+        else:
+            streaming_chat(client, store_id, submit)
+
+    def map_load():
+        client = APP.server.test_client()
+        i = 0
+        while not done.is_set():
+            t0 = time.perf_counter()
+            pool.submit(post_callback, client, map_payload(i)).add_done_callback(
+                lambda _, t0=t0: map_latency.append(time.perf_counter() - t0))
+            i += 1
+            time.sleep(map_interval)
+
+    loader = threading.Thread(target=map_load)
+    sessions = [threading.Thread(target=chat_session, args=(k,)) for k in range(n_chats)]
+    t0 = time.perf_counter()
+    loader.start()
+    for t in sessions:
+        t.start()
+    for t in sessions:
+        t.join()
+    wall = time.perf_counter() - t0
+    done.set()
+    loader.join()
+    pool.shutdown(wait=True)
+    return wall, map_latency
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=8, help="同时进行的聊天数")
+    parser.add_argument("--workers", type=int, default=4, help="请求线程数")
+    parser.add_argument("--first-token", type=float, default=0.3, help="模拟模型的首token延迟(秒)")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="模拟模型的token间隔(秒)")
+    parser.add_argument("--tokens", type=int, default=120)
+    args = parser.parse_args()
+
+    with MockOpenAIServer(args.first_token, args.token_delay, args.tokens) as server, \
+            contextlib.redirect_stdout(io.StringIO()) as log:
+        chatbot_service.OPENAI_API_KEY = "mock"
+        chatbot_service.OPENAI_BASE_URL = server.base_url
+        client = APP.server.test_client()
+        _, _, _, resp = post_callback(client, map_payload())
+        store_id = output(resp, "current-weather-risk-data-store")["data"]
+        blocking_chat(store_id)  # 预热（导入openai）
+
+        t0 = time.perf_counter()
+        reply = blocking_chat(store_id)
+        blocking = time.perf_counter() - t0
+        first, total, hold, history, traffic = streaming_chat(client, store_id)
+        assert history.endswith(reply + "\n\n"), "streamed reply differs from the blocking one"
+
+        rows = []
+        for mode in ("blocking", "streaming"):
+            wall, latencies = pool_run(mode, store_id, args.chats, args.workers)
+            rows.append((mode, wall, latencies))
+
+    print(f"mock model: first token {args.first_token * 1e3:.0f} ms, {args.tokens} tokens x "
+          f"{args.token_delay * 1e3:.0f} ms; poll every {dashboard_app.CHAT_POLL_MS} ms")
+    print(f"\nsingle chat           {'first text':>11} {'complete':>10} {'request thread held':>20}")
+    print(f"  blocking            {blocking * 1e3:>8.0f} ms {blocking * 1e3:>7.0f} ms {blocking * 1e3:>17.0f} ms")
+    print(f"  streaming           {first * 1e3:>8.0f} ms {total * 1e3:>7.0f} ms {sum(hold) * 1e3:>17.1f} ms "
+          f"({len(hold)} requests, max {max(hold) * 1e3:.1f} ms, {sum(traffic) / 1024:.1f} KiB total)")
+    print(f"\n{args.chats} chats + map callbacks every 50 ms on {args.workers} request threads")
+    print(f"  {'mode':<10} {'chats done':>10} {'map p50':>9} {'map p95':>9} {'map max':>9}")
+    for mode, wall, latencies in rows:
+        print(f"  {mode:<10} {wall:>8.2f} s {percentile(latencies, 50) * 1e3:>6.1f} ms "
+              f"{percentile(latencies, 95) * 1e3:>6.1f} ms {max(latencies) * 1e3:>6.1f} ms")
+    print(f"\nchat jobs: {dashboard_app.chat_jobs.stats()}")
+    errors = [line for line in log.getvalue().splitlines() if "rror" in line]
+    if errors:
+        print("errors:\n  " + "\n  ".join(errors[:5]))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(JOB_DIR, ignore_errors=True)
@@ -0,0 +1,79 @@
+"""
+对比 update_weather_json 在不同并发上限下的整轮刷新耗时。
+
+以本地桩服务器代替OpenWeatherMap，每个请求人为延迟 --delay 秒，
+21个城市 × 2个请求。运行: python benchmarks/bench_fetch.py
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import data_fetcher  # noqa: E402
+from stub_server import StubWeatherServer  # noqa: E402
+
+REPO_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+def make_base_path():
+    """在临时目录下准备 data/admin_unit/guangdong_cities_meta.json"""
+    base = tempfile.mkdtemp(prefix="bench_fetch_")
+    os.makedirs(os.path.join(base, "data", "admin_unit"))
+    shutil.copy(os.path.join(REPO_DATA, "admin_unit", "guangdong_cities_meta.json"),
+                os.path.join(base, "data", "admin_unit", "guangdong_cities_meta.json"))
+    return base
+
+
+def shape_of(weather):
+    return {city: (sorted(v), sorted(v["weather"]["now"]), sorted(v["weather"]["forecast"]))
+            for city, v in weather.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=0.05, help="桩服务器单请求延迟(秒)")
+    parser.add_argument("--workers", default="1,2,4,8,16", help="逗号分隔的并发上限")
+    args = parser.parse_args()
+
+    base = make_base_path()
+    try:
+        with StubWeatherServer(delay=args.delay) as server:
+            data_fetcher.API_KEY = "bench"
+            data_fetcher.OWM_CALLS_PER_MINUTE = 0  # 不限速，测量的是抓取本身
+            data_fetcher._owm_client = None
+            data_fetcher.HTTP_CACHE_ENABLED = False  # 每次都请求桩服务器
+            data_fetcher.WEATHER_BASE_URL = server.url("/data/2.5/weather")
+            data_fetcher.FORECAST_BASE_URL = server.url("/data/2.5/forecast")
+
+            baseline_shape = None
+            serial_time = None
+            print(f"{'workers':>8} {'wall(s)':>9} {'speedup':>8} {'requests':>9}")
+            for workers in [int(w) for w in args.workers.split(",")]:
+                server.hits.clear()
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = data_fetcher.update_weather_json(base_path=base, max_workers=workers)
+                elapsed = time.perf_counter() - t0
+                serial_time = serial_time or elapsed
+
+                with open(os.path.join(base, "data", "guangdong_weather.json"), encoding="utf-8") as f:
+                    on_disk = json.load(f)
+                assert on_disk == json.loads(json.dumps(result, ensure_ascii=False))
+                if baseline_shape is None:
+                    baseline_shape = shape_of(on_disk)
+                assert shape_of(on_disk) == baseline_shape, "output shape differs from serial run"
+
+                print(f"{workers:>8} {elapsed:>9.3f} {serial_time / elapsed:>7.1f}x {sum(server.hits.values()):>9}")
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+预报时次选择：逐时效线性扫描（旧实现）vs 一次解析 + 二分查找，校验最近时次结果一致并对比耗时；
+另给出 1~120 小时逐小时时效与插值模式的耗时。
+
+运行: python benchmarks/bench_forecast_parse.py [--repeat 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import data_fetcher  # noqa: E402
+from stub_server import fake_forecast_payload  # noqa: E402
+
+HOURS = [3, 6, 12, 24, 48, 72]
+
+
+def legacy_select(data, hours, now):
+    """旧版 get_forecast_by_latlon 的时次选择逻辑（now 固定以便比较）"""
+    forecasts = {}
+    for hour in hours:
+        target_timestamp = now + timedelta(hours=hour)
+        closest_forecast = None
+        min_time_diff = float('inf')
+        for fc_item in data["list"]:
+            fc_time = datetime.fromtimestamp(fc_item["dt"], timezone.utc)
+            time_diff = abs((fc_time - target_timestamp).total_seconds())
+            if time_diff < min_time_diff:
+                min_time_diff = time_diff
+                closest_forecast = fc_item
+        if closest_forecast:
+            fc = closest_forecast
+            forecasts[f"{hour}h"] = {
+                "datetime": data_fetcher.utc_str_to_bj_time(fc["dt_txt"]),
+                "temperature": fc["main"]["temp"],
+                "humidity": fc["main"]["humidity"],
+                "wind_speed": fc["wind"]["speed"],
+                "wind_direction": fc["wind"].get("deg", None),
+                "precipitation": fc.get("rain", {}).get("3h", 0.0),
+            }
+    return forecasts
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    base = time.time()
+    for _ in range(500):  # 随机的“当前时间”，包括恰好落在两个时次中点的情况
+        now = base + rng.choice([rng.uniform(-3 * 3600, 3 * 3600), rng.randrange(-4, 4) * 5400])
+        data = fake_forecast_payload(23.1, 113.3, start=base)
+        old = legacy_select(data, HOURS, datetime.fromtimestamp(now, timezone.utc))
+        new = data_fetcher.select_forecast(data_fetcher.parse_forecast_series(data), HOURS, now=now)
+        assert old == new, (now, old, new)
+    print("nearest-slot selection identical to the legacy scan (500 random 'now' values)")
+
+    data = fake_forecast_payload(23.1, 113.3, start=base)
+    now_dt = datetime.fromtimestamp(base, timezone.utc)
+    hourly = list(range(1, 121))
+    rows = [
+        ("legacy scan, 6 horizons", lambda: legacy_select(data, HOURS, now_dt)),
+        ("searchsorted, 6 horizons", lambda: data_fetcher.select_forecast(
+            data_fetcher.parse_forecast_series(data), HOURS, now=base)),
+        ("legacy scan, 120 hourly", lambda: legacy_select(data, hourly, now_dt)),
+        ("searchsorted, 120 hourly", lambda: data_fetcher.select_forecast(
+            data_fetcher.parse_forecast_series(data), hourly, now=base)),
+        ("interpolated, 120 hourly", lambda: data_fetcher.select_forecast(
+            data_fetcher.parse_forecast_series(data), hourly, now=base, interpolate=True)),
+    ]
+    for name, fn in rows:
+        repeat = args.repeat if "6" in name else max(1, args.repeat // 20)
+        print(f"{name:<28} {timed(fn, repeat) * 1e6:10.1f} us per city")
+
+    series = data_fetcher.parse_forecast_series(data)
+    interp = data_fetcher.select_forecast(series, [4.5], now=float(series["dt"][0]) - 3 * 3600, interpolate=True)
+    print(f"interpolated +4.5h example: {interp}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+HTTP响应缓存：连续刷新的上游请求数与耗时（首次 / TTL内 / 过期后ETag重新验证），
+同键并发请求去重，以及缓存大小上限下的LRU淘汰。
+
+运行: python benchmarks/bench_http_cache.py [--delay 0.05]
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import data_fetcher  # noqa: E402
+from bench_fetch import make_base_path  # noqa: E402
+from http_cache import HttpCache  # noqa: E402
+from stub_server import StubWeatherServer, _default_routes, with_etag  # noqa: E402
+
+
+def refresh(base, server, label):
+    server.hits.clear()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_fetcher.update_weather_json(base_path=base)
+    elapsed = time.perf_counter() - t0
+    not_modified = sum(r.not_modified for r in server.routes.values())
+    print(f"{label:<32} {elapsed:>7.3f}s  upstream requests {sum(server.hits.values()):>3}  "
+          f"(304: {not_modified})  cache {data_fetcher.get_http_cache().info()}")
+    for r in server.routes.values():
+        r.not_modified = 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=0.05, help="桩服务器单请求延迟(秒)")
+    args = parser.parse_args()
+
+    base = make_base_path()
+    cache_dir = tempfile.mkdtemp(prefix="bench_http_cache_")
+    routes = {path: with_etag(handler) for path, handler in _default_routes().items()}
+    try:
+        with StubWeatherServer(delay=args.delay, routes=routes) as server:
+            data_fetcher.API_KEY = "bench"
+            data_fetcher.OWM_CALLS_PER_MINUTE = 0  # 不限速，测量的是抓取本身
+            data_fetcher._owm_client = None
+            data_fetcher.WEATHER_BASE_URL = server.url("/data/2.5/weather")
+            data_fetcher.FORECAST_BASE_URL = server.url("/data/2.5/forecast")
+            data_fetcher.HTTP_CACHE_DIR = cache_dir
+            data_fetcher._http_cache = None
+
+            refresh(base, server, "1st refresh (cold cache)")
+            refresh(base, server, "2nd refresh (within TTL)")
+            assert sum(server.hits.values()) == 0
+            data_fetcher.CURRENT_WEATHER_TTL = data_fetcher.FORECAST_TTL = 0.2
+            time.sleep(0.25)
+            refresh(base, server, "3rd refresh (expired, ETag)")
+
+            # 同一键的并发请求只发一次
+            cache = HttpCache(os.path.join(cache_dir, "dedup"))
+            server.hits.clear()
+            start = threading.Barrier(8)
+            url = server.url("/data/2.5/forecast")
+
+            def worker():
+                start.wait()
+                cache.get_json(data_fetcher.get_http_session(), url,
+                               {"lat": 23.13, "lon": 113.26, "units": "metric", "lang": "zh_cn"}, ttl=60)
+
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            print(f"8 concurrent identical requests -> {sum(server.hits.values())} upstream request")
+            assert sum(server.hits.values()) == 1
+
+            # LRU：上限约为5个预报响应大小
+            one = os.path.getsize(os.path.join(cache_dir, "dedup", os.listdir(os.path.join(cache_dir, "dedup"))[0]))
+            lru = HttpCache(os.path.join(cache_dir, "lru"), max_bytes=5 * one + one // 2)
+            coords = [(22.0 + i * 0.1, 113.0) for i in range(12)]
+            for lat, lon in coords:
+                lru.get_json(data_fetcher.get_http_session(), url, {"lat": lat, "lon": lon}, ttl=60)
+                lru.get_json(data_fetcher.get_http_session(), url, {"lat": coords[0][0], "lon": 113.0}, ttl=60)
+            info = lru.info()
+            print(f"LRU with room for 5 entries after 12 distinct keys: {info}")
+            assert info["entries"] <= 5 and info["bytes"] <= lru.max_bytes
+            server.hits.clear()
+            lru.get_json(data_fetcher.get_http_session(), url, {"lat": coords[0][0], "lon": 113.0}, ttl=60)
+            assert sum(server.hits.values()) == 0, "most recently used entry was evicted"
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+冷启动导入耗时：在子进程中用 python -X importtime 导入运行时模块，报告累计耗时与最慢的依赖，
+并检查回归：
+  - 运行时模块不得导入只在预处理/聊天时才需要的重型包（rasterio、geopandas、openai 等）；
+  - dashboard_app 的导入耗时（多次取最小值）不超过 --budget 秒。
+任一检查失败时以非零状态退出，可直接放进CI。
+
+运行: python benchmarks/bench_importtime.py [--repeat 3] [--budget 2.0]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+RUNTIME_MODULES = ["dashboard_app", "risk_model", "data_fetcher", "chatbot_service"]
+FORBIDDEN = ["rasterio", "geopandas", "shapely", "pyproj", "fiona", "pyogrio", "openai"]
+
+
+def importtime(module):
+    """返回 {模块名: 累计微秒}（同一模块取第一次出现）；module 为 None 时只启动解释器"""
+    env = dict(os.environ)
+    env.setdefault("GUANGDONG_DATA_DIR", os.path.join(REPO_ROOT, "data"))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}" if module else "pass"],
+                          cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.setdefault(name.strip(), int(cumulative))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=float(os.getenv("IMPORT_BUDGET_SECONDS", "2.0")),
+                        help="dashboard_app 导入耗时上限(秒)")
+    parser.add_argument("--top", type=int, default=5, help="每个模块列出的最慢依赖数")
+    args = parser.parse_args()
+
+    failures = []
+    startup = set(importtime(None))  # 解释器启动时就会导入的模块（site等），不计入
+    print(f"{'module':<16} {'import s':>9}  slowest top-level dependencies")
+    for module in RUNTIME_MODULES:
+        runs = [importtime(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda t: t[module])
+        seconds = best[module] / 1e6
+        top_level = sorted(((us, name) for name, us in best.items()
+                            if "." not in name and name != module and name not in startup),
+                           reverse=True)[:args.top]
+        print(f"{module:<16} {seconds:>9.3f}  " + ", ".join(f"{name} {us / 1e6:.2f}" for us, name in top_level))
+        heavy = sorted({name.split(".")[0] for name in best} & set(FORBIDDEN))
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at import time")
+        if module == "dashboard_app" and seconds > args.budget:
+            failures.append(f"dashboard_app import took {seconds:.2f}s > budget {args.budget:.2f}s")
+
+    if failures:
+        print("\nFAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print(f"\nOK: no heavy optional packages imported; dashboard_app within {args.budget:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+模型请求：每条消息新建 OpenAI 客户端（旧版） vs 进程内共享的连接池客户端（llm_client，同步/异步），
+对着本地模拟的OpenAI兼容接口（mock_openai_server.py）测量每次调用的延迟分位数与新建的连接数。
+另外验证：429限流按退避重试后成功；并发上限生效（模拟服务端看到的同时请求数不超过上限）。
+
+注意：模拟服务是明文HTTP，测到的只是客户端构建与TCP建连的开销；
+线上走HTTPS，每条消息还要多一次TLS握手，共享连接池省下的时间更多。
+
+运行: python benchmarks/bench_llm_client.py [--requests 40] [--concurrency 1,8] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import threading
+import time
+
+from dash_client import percentile
+from mock_openai_server import MockOpenAIServer
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import chatbot_service
+from llm_client import AsyncLlmClient, LlmClient
+
+REQUEST = dict(model="mock", messages=chatbot_service.build_messages("广州现在的洪涝风险如何？", "context"),
+               temperature=0.7, max_tokens=250)
+
+
+def per_call_client(server):
+    """旧版 get_chatbot_response：每条消息新建客户端"""
+    import openai
+
+    def call():
+        client = openai.OpenAI(api_key="mock", base_url=server.base_url)
+        return client.chat.completions.create(**REQUEST).choices[0].message.content
+    return call
+
+
+def run_threads(call, n_requests, concurrency):
+    latencies, lock = [], threading.Lock()
+    counter = iter(range(n_requests))
+
+    def worker():
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            t0 = time.perf_counter()
+            call()
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies
+
+
+def run_async(client, n_requests, concurrency):
+    async def main():
+        latencies = []
+        queue = list(range(n_requests))
+
+        async def worker():
+            while queue:
+                queue.pop()
+                t0 = time.perf_counter()
+                await client.complete(**REQUEST)
+                latencies.append(time.perf_counter() - t0)
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies
+    return asyncio.run(main())
+
+
+def measure(server, name, run):
+    """预热一轮后再测一轮，返回 (名称, 延迟列表, 测量期间新建的连接数)"""
+    run()
+    before = server.connections
+    latencies = run()
+    return name, latencies, server.connections - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=40, help="每档的请求数")
+    parser.add_argument("--concurrency", default="1,8", help="逗号分隔的并发数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟模型的响应时间(秒)")
+    args = parser.parse_args()
+
+    with MockOpenAIServer(first_token_delay=args.latency, token_delay=0.0, tokens=60) as server:
+        legacy = per_call_client(server)
+        legacy()  # 导入openai等一次性开销不计入
+        print(f"mock model latency {args.latency * 1e3:.0f} ms, {args.requests} requests per row")
+        print(f"{'conc':>4} {'client':<16} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'new conns':>10}")
+        for conc in [int(c) for c in args.concurrency.split(",")]:
+            pooled = LlmClient("mock", server.base_url, max_concurrency=max(conc, 8))
+            rows = [
+                measure(server, "per-call client", lambda: run_threads(legacy, args.requests, conc)),
+                measure(server, "pooled sync", lambda: run_threads(lambda: pooled.complete(**REQUEST),
+                                                                   args.requests, conc)),
+            ]
+            # 异步客户端绑定事件循环：每次 asyncio.run 新建一个
+            rows.append(measure(server, "pooled async", lambda: run_async(
+                AsyncLlmClient("mock", server.base_url, max_concurrency=max(conc, 8)), args.requests, conc)))
+            for name, latencies, conns in rows:
+                print(f"{conc:>4} {name:<16} {percentile(latencies, 50) * 1e3:>8.1f} "
+                      f"{percentile(latencies, 95) * 1e3:>8.1f} {max(latencies) * 1e3:>8.1f} {conns:>10}")
+            pooled.close()
+
+        # 限流：接下来3个请求返回429（Retry-After: 0），共享客户端重试后成功
+        client = LlmClient("mock", server.base_url, max_retries=3)
+        server.fail(3)
+        assert client.complete(**REQUEST)
+        summary = client.stats.summary()
+        assert summary["retries"] == 3 and summary["rate_limited"] == 3 and summary["failures"] == 0, summary
+        print(f"\nrate limited 3x then ok: retries={summary['retries']} status={summary['status']}")
+
+        # 并发上限：8个线程同时请求，上限为2
+        limited = LlmClient("mock", server.base_url, max_concurrency=2)
+        server.httpd.max_in_flight = 0
+        run_threads(lambda: limited.complete(**REQUEST), 16, 8)
+        summary = limited.stats.summary()
+        assert server.max_in_flight <= 2, server.max_in_flight
+        print(f"max_concurrency=2 with 8 threads: server saw at most {server.max_in_flight} in flight, "
+              f"queue wait p95 {summary['queue_wait_p95'] * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
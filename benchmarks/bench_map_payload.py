@@ -0,0 +1,71 @@
+"""
+地图回调的响应体积与耗时。
+
+边界GeoJSON经 /geo/... 下发一次；基础figure随页面布局下发一次；
+之后每次切换灾种/时刻的回调只返回Patch（各等级城市与悬停数据）。
+
+运行: python benchmarks/bench_map_payload.py [--repeat 20]
+"""
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import statistics
+
+from dash_client import callback_payload, percentile, post_callback
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import dashboard_app  # noqa: E402
+
+MAP_OUTPUTS = [("risk-map", "figure"), ("current-weather-risk-data-store", "data")]
+
+
+def map_inputs(tab, risk_time):
+    return [("disaster-tabs", "value", tab), ("risk-time", "value", risk_time), ("data-version", "data", None)]
+
+
+def run(client, repeat):
+    times, sizes, map_sizes = [], [], []
+    for i in range(repeat):
+        tab = ("flood", "fire")[i % 2]
+        risk_time = dashboard_app.risk_time_options[i % len(dashboard_app.risk_time_options)]["value"]
+        payload = callback_payload(MAP_OUTPUTS, map_inputs(tab, risk_time), ["risk-time.value"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed, _, resp_bytes, resp = post_callback(client, payload)
+        times.append(elapsed)
+        sizes.append(resp_bytes)
+        map_sizes.append(len(json.dumps(resp["response"]["risk-map"])))
+    return times, sizes, map_sizes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    client = dashboard_app.create_app().server.test_client()
+    with open(dashboard_app.GUANGDONG_GEOJSON_FILE, encoding="utf-8") as f:
+        full_geojson = json.load(f)
+
+    geo = client.get(dashboard_app.MAP_GEOJSON_URL, headers={"Accept-Encoding": "gzip"})
+    cached = client.get(dashboard_app.MAP_GEOJSON_URL, headers={"If-None-Match": geo.headers["ETag"].strip('"')})
+    print(f"full-resolution geojson   : {os.path.getsize(dashboard_app.GUANGDONG_GEOJSON_FILE) / 1024:8.0f} KB "
+          f"({len(gzip.compress(json.dumps(full_geojson).encode())) / 1024:.0f} KB gzip)")
+    print(f"served z{dashboard_app.MAP_GEOJSON_ZOOM} geometry (once) : "
+          f"{len(dashboard_app.geojson_bytes) / 1024:8.0f} KB ({len(geo.get_data()) / 1024:.0f} KB gzip), "
+          f"revalidation -> {cached.status_code}")
+
+    layout = client.get("/_dash-layout").get_data()
+    print(f"initial layout incl. base figure (once): {len(layout) / 1024:8.1f} KB")
+
+    run(client, 2)  # 预热
+    times, sizes, map_sizes = run(client, args.repeat)
+    print(f"\nmap callback x{args.repeat}: response {statistics.mean(sizes) / 1024:.1f} KB "
+          f"(figure patch {statistics.mean(map_sizes) / 1024:.1f} KB), "
+          f"p50 {percentile(times, 50) * 1e3:.1f} ms, p95 {percentile(times, 95) * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
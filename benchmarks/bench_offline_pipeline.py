@@ -0,0 +1,154 @@
+"""
+离线端到端吞吐：数据源回放 → update_weather_json → 风险快照 → 仪表盘地图回调，全程无网络、无API_KEY。
+
+1. 录制：用桩数据生成一份与 HttpCache 同格式的响应录制（各响应的 stored_at 分布在 --span 秒内）；
+2. RecordedResponseProvider 以不限速 / --speed 倍速回放录制，测量刷新耗时；
+3. 构造一场“暴雨”的逐小时天气快照（--frames 帧），SnapshotReplayProvider 每次刷新推进一帧，
+   逐帧测量 抓取 / 风险 / 地图回调 各阶段耗时与每秒帧数；归档库回放与JSON快照回放结果一致。
+
+运行: python benchmarks/bench_offline_pipeline.py [--frames 24] [--speed 30]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_ROOT = tempfile.mkdtemp(prefix="bench_offline_")
+RECORD_DIR = os.path.join(DATA_ROOT, "recorded")
+shutil.copytree(os.path.join(HERE, "..", "data", "admin_unit"), os.path.join(DATA_ROOT, "data", "admin_unit"))
+os.environ["GUANGDONG_DATA_DIR"] = os.path.join(DATA_ROOT, "data")
+os.environ["REFRESH_INTERVAL_SECONDS"] = "0"
+os.environ["WEATHER_PROVIDER"] = "recorded:" + RECORD_DIR  # 仪表盘启动时的首次抓取也走回放
+os.environ["WRITE_WEATHER_ARCHIVE"] = "0"
+
+from dash_client import callback_payload, percentile, post_callback  # noqa: E402
+from stub_server import fake_current_payload, fake_forecast_payload  # noqa: E402
+import data_fetcher  # noqa: E402
+from http_cache import HttpCache, cache_key  # noqa: E402
+from weather_archive import WeatherArchive  # noqa: E402
+from weather_providers import RecordedResponseProvider, SnapshotReplayProvider  # noqa: E402
+
+MAP_OUTPUTS = [("risk-map", "figure"), ("current-weather-risk-data-store", "data")]
+
+
+def record_responses(cities_meta, span, start):
+    """按 HttpCache 格式写出每个城市的实况与预报响应"""
+    cache = HttpCache(RECORD_DIR, max_bytes=2**40)
+    n = len(cities_meta)
+    for i, city in enumerate(cities_meta):
+        stored_at = start + span * i / max(1, n - 1)
+        params = {"lat": city["lat"], "lon": city["lon"], "units": "metric", "lang": data_fetcher.LANG}
+        for url, payload in ((data_fetcher.WEATHER_BASE_URL, fake_current_payload(city["lat"], city["lon"])),
+                             (data_fetcher.FORECAST_BASE_URL, fake_forecast_payload(city["lat"], city["lon"], start=start))):
+            cache.store(cache_key(url, params), {"url": url, "stored_at": stored_at, "etag": None,
+                                                 "last_modified": None, "body": json.dumps(payload)})
+
+
+def storm_frames(base_weather, n_frames, start, frame_dir):
+    """以基准天气为底，降水按“起-峰-落”放大，写出逐小时的天气JSON（mtime为该帧时间）"""
+    paths = []
+    for k in range(n_frames):
+        factor = 1.0 + 40.0 * max(0.0, 1.0 - abs(k - n_frames / 2) / (n_frames / 4))
+        frame = json.loads(json.dumps(base_weather))
+        for entry in frame.values():
+            weather = entry["weather"]
+            if weather.get("now"):
+                weather["now"]["precipitation"] *= factor
+            for block in weather.get("forecast", {}).values():
+                block["precipitation"] *= factor
+        path = os.path.join(frame_dir, f"frame_{k:03d}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(frame, f, ensure_ascii=False)
+        os.utime(path, (start + k * 3600, start + k * 3600))
+        paths.append(path)
+    return paths
+
+
+def timed_refresh(provider):
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        weather = data_fetcher.update_weather_json(base_path=DATA_ROOT, provider=provider)
+    return time.perf_counter() - t0, weather
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=24, help="暴雨过程的逐小时帧数")
+    parser.add_argument("--span", type=float, default=60.0, help="录制响应的时间跨度(秒)")
+    parser.add_argument("--speed", type=float, default=30.0, help="倍速回放录制响应")
+    args = parser.parse_args()
+
+    with open(os.path.join(DATA_ROOT, "data", "admin_unit", "guangdong_cities_meta.json"), encoding="utf-8") as f:
+        cities_meta = json.load(f)
+    start = time.time() - 7 * 86400
+    record_responses(cities_meta, args.span, start)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import dashboard_app  # noqa: E402
+        # 没有天气文件：后台刷新启动后立即抓取一次，经 WEATHER_PROVIDER 回放录制
+        dashboard_app.refresh_scheduler.start()
+        deadline = time.time() + 30
+        while dashboard_app.refresh_scheduler.version == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        dashboard_app.refresh_scheduler.stop()
+    assert all(v["weather"]["now"] for v in dashboard_app.weather_store.get().values())
+    print(f"{len(cities_meta)} cities, {2 * len(cities_meta)} recorded responses; dashboard started offline")
+
+    elapsed, base_weather = timed_refresh(RecordedResponseProvider(RECORD_DIR))
+    print(f"recorded replay, unthrottled : {elapsed * 1e3:8.1f} ms per refresh")
+    paced = RecordedResponseProvider(RECORD_DIR, speed=args.speed)
+    elapsed, _ = timed_refresh(paced)
+    print(f"recorded replay, {args.speed:g}x speed   : {elapsed:8.2f} s  (recording spans {args.span:g} s, "
+          f"expected ~{args.span / args.speed:.2f} s)  {data_fetcher.last_refresh_stats}")
+
+    frame_dir = os.path.join(DATA_ROOT, "frames")
+    os.makedirs(frame_dir)
+    frames = storm_frames(base_weather, args.frames, start, frame_dir)
+    provider = SnapshotReplayProvider.from_sources([os.path.join(frame_dir, "*.json")])
+    client = dashboard_app.create_app().server.test_client()
+    fetch_t, risk_t, map_t, high = [], [], [], []
+    t_all = time.perf_counter()
+    for k in range(len(frames)):
+        elapsed, _ = timed_refresh(provider)
+        fetch_t.append(elapsed)
+        t0 = time.perf_counter()
+        snapshot = dashboard_app.get_risk_snapshot()
+        risk_t.append(time.perf_counter() - t0)
+        payload = callback_payload(MAP_OUTPUTS, [("disaster-tabs", "value", "flood"), ("risk-time", "value", "now"),
+                                                 ("data-version", "data", dashboard_app.data_version())],
+                                   ["data-version.data"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed, _, _, _ = post_callback(client, payload)
+        map_t.append(elapsed)
+        high.append(sum(v["flood_risk_level"] in ("高风险", "极高风险") for v in snapshot["results"]["now"].values()))
+    total = time.perf_counter() - t_all
+    print(f"storm replay: {len(frames)} frames in {total:.2f} s = {len(frames) / total:.1f} frames/s")
+    for name, times in (("fetch (replay + write)", fetch_t), ("risk snapshot", risk_t), ("map callback", map_t)):
+        print(f"  {name:<24} p50 {percentile(times, 50) * 1e3:7.1f} ms   p95 {percentile(times, 95) * 1e3:7.1f} ms")
+    print(f"  cities at high/very high flood risk per frame: {high}")
+
+    # 同一场过程写入归档库后回放，now 的天气与JSON快照回放一致
+    archive_path = os.path.join(DATA_ROOT, "storm_archive.sqlite")
+    archive = WeatherArchive(archive_path)
+    for k, path in enumerate(frames):
+        with open(path, encoding="utf-8") as f:
+            archive.append_fetch(json.load(f), issue_time=int(start + k * 3600))
+    from_archive = SnapshotReplayProvider.from_sources([archive_path])
+    json_replay = SnapshotReplayProvider.from_sources([os.path.join(frame_dir, "*.json")])
+    for _ in range(3):
+        a = timed_refresh(from_archive)[1]
+        b = timed_refresh(json_replay)[1]
+        assert {c: v["weather"]["now"] for c, v in a.items()} == {c: v["weather"]["now"] for c, v in b.items()}
+    print(f"archive replay matches JSON replay ({len(from_archive.frames)} frames)")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(DATA_ROOT, ignore_errors=True)
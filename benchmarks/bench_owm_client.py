@@ -0,0 +1,91 @@
+"""
+限速与重试层：桩服务器按 --error-rate 随机返回 429/503，
+对比不重试（旧行为）与指数退避重试时，刷新后缺少实况数据的城市数与请求统计；
+并验证令牌桶把请求速率压在设定的每分钟调用数以内。
+
+运行: python benchmarks/bench_owm_client.py [--error-rate 0.3]
+"""
+import argparse
+import contextlib
+import io
+import random
+import shutil
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import data_fetcher  # noqa: E402
+from bench_fetch import make_base_path  # noqa: E402
+from owm_client import OwmClient  # noqa: E402
+from stub_server import StubWeatherServer, _default_routes  # noqa: E402
+
+
+def flaky(handler, error_rate, rng, lock):
+    def wrapped(query, headers):
+        with lock:
+            roll = rng.random()
+        if roll < error_rate / 2:
+            return 429, {"Retry-After": "0.05"}, {"cod": 429, "message": "rate limited"}
+        if roll < error_rate:
+            return 503, {}, {"cod": 503, "message": "unavailable"}
+        return handler(query, headers)
+    return wrapped
+
+
+def run_refresh(base, max_retries):
+    data_fetcher.OWM_MAX_RETRIES = max_retries
+    data_fetcher._owm_client = None
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        weather = data_fetcher.update_weather_json(base_path=base)
+    elapsed = time.perf_counter() - t0
+    missing_now = sum(1 for v in weather.values() if not v["weather"]["now"])
+    missing_fc = sum(1 for v in weather.values() if not v["weather"]["forecast"])
+    return elapsed, missing_now, missing_fc, data_fetcher.last_refresh_stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--error-rate", type=float, default=0.3)
+    parser.add_argument("--delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    base = make_base_path()
+    rng, lock = random.Random(0), threading.Lock()
+    routes = {path: flaky(h, args.error_rate, rng, lock) for path, h in _default_routes().items()}
+    try:
+        with StubWeatherServer(delay=args.delay, routes=routes) as server:
+            data_fetcher.API_KEY = "bench"
+            data_fetcher.HTTP_CACHE_ENABLED = False
+            data_fetcher.OWM_CALLS_PER_MINUTE = 0
+            data_fetcher.WEATHER_BASE_URL = server.url("/data/2.5/weather")
+            data_fetcher.FORECAST_BASE_URL = server.url("/data/2.5/forecast")
+
+            for label, retries in (("single attempt (old)", 0), ("retry with backoff", data_fetcher.OWM_MAX_RETRIES)):
+                elapsed, missing_now, missing_fc, stats = run_refresh(base, retries)
+                print(f"{label:<22} {elapsed:6.2f}s  cities missing now/forecast: {missing_now}/{missing_fc}")
+                print(f"{'':<22} attempts {stats['attempts']}, retries {stats['retries']}, "
+                      f"failures {stats['failures']}, status {stats['status']}, "
+                      f"p50 {stats['latency_p50'] * 1e3:.0f} ms, p95 {stats['latency_p95'] * 1e3:.0f} ms")
+
+            # 令牌桶：每分钟600次(10次/秒)，突发10次
+            server.routes.update(_default_routes())
+            client = OwmClient(data_fetcher.get_http_session(), calls_per_minute=600, burst=10)
+            stats = client.start_refresh()
+            t0 = time.perf_counter()
+            for _ in range(40):
+                client.get(server.url("/data/2.5/weather"), params={"lat": 23, "lon": 113})
+            elapsed = time.perf_counter() - t0
+            summary = stats.summary()
+            print(f"token bucket 600/min, burst 10: 40 calls in {elapsed:.2f}s "
+                  f"(expected >= {30 / 10:.1f}s), throttled {summary['throttled_seconds']}s")
+            assert elapsed >= 2.9
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+预处理内存峰值对比：整幅读取(原实现) vs 按块流式读取。
+
+每个步骤在独立子进程中运行，报告该进程的峰值RSS(ru_maxrss)。
+运行: python benchmarks/bench_raster_memory.py [--resolution 0.001]
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+LOWLAND_Q = 30
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_step(step, dem_path, landuse_path):
+    """子进程内执行单个步骤，返回 (结果, 耗时, 执行前的RSS)"""
+    import numpy as np
+    import rasterio
+    import preprocess_static_data as psd
+    from synthetic_rasters import NA_VALUE, load_city_gdf
+
+    baseline = peak_rss_mb()
+    t0 = time.perf_counter()
+    if step == "percentile-full":
+        with rasterio.open(dem_path) as src:
+            dem = src.read(1)
+            result = float(np.percentile(dem[dem != NA_VALUE], LOWLAND_Q))
+    elif step == "percentile-stream":
+        result = psd.raster_percentile(dem_path, LOWLAND_Q, nodata=NA_VALUE)
+    elif step == "minmax-full":
+        with rasterio.open(dem_path) as src:
+            band = src.read(1)
+            result = [float(band.min()), float(band.max())]
+    elif step == "minmax-stream":
+        result = [float(v) for v in psd.raster_min_max(dem_path)]
+    elif step == "zonal-stream":
+        geoms = list(load_city_gdf().geometry)
+        stats = psd.zonal_city_stats(geoms, dem_path, landuse_path, 300, psd.LANDUSE_WEIGHTS, NA_VALUE)
+        result = round(sum(s["lowland_index"] for s in stats), 6)
+    else:
+        raise ValueError(step)
+    return result, time.perf_counter() - t0, baseline
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resolution", type=float, default=0.001, help="合成栅格分辨率(度)")
+    parser.add_argument("--child", nargs=3, metavar=("STEP", "DEM", "LANDUSE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result, elapsed, baseline = run_step(*args.child)
+        print(json.dumps({"result": result, "seconds": elapsed, "peak_rss_mb": peak_rss_mb(),
+                          "baseline_rss_mb": baseline}))
+        return
+
+    from synthetic_rasters import write_synthetic_rasters
+
+    tmp = tempfile.mkdtemp(prefix="bench_rss_")
+    try:
+        dem_path, landuse_path, shape = write_synthetic_rasters(tmp, args.resolution)
+        print(f"raster {shape[0]}x{shape[1]} ({shape[0] * shape[1] * 2 / 2**20:.0f} MiB int16)")
+        print(f"{'step':<20} {'peak RSS(MiB)':>14} {'over imports':>13} {'time(s)':>8}  result")
+        for step in ("minmax-full", "minmax-stream", "percentile-full", "percentile-stream", "zonal-stream"):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", step, dem_path, landuse_path],
+                                 check=True, capture_output=True, text=True, cwd=HERE)
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{step:<20} {r['peak_rss_mb']:>14.0f} {r['peak_rss_mb'] - r['baseline_rss_mb']:>13.0f} "
+                  f"{r['seconds']:>8.2f}  {r['result']}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
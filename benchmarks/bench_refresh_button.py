@@ -0,0 +1,130 @@
+"""
+刷新按钮回调耗时：后台排队 vs 在回调中同步抓取；以及刷新完成后轮询发现新数据版本的延迟。
+另外用一个会失败的任务演示定时器的指数退避。
+
+运行: python benchmarks/bench_refresh_button.py [--delay 0.1]
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_ROOT = tempfile.mkdtemp(prefix="bench_refresh_btn_")
+shutil.copytree(os.path.join(HERE, "..", "data", "admin_unit"), os.path.join(DATA_ROOT, "data", "admin_unit"))
+shutil.copy(os.path.join(HERE, "..", "data", "guangdong_weather.json"), os.path.join(DATA_ROOT, "data"))
+os.environ["GUANGDONG_DATA_DIR"] = os.path.join(DATA_ROOT, "data")
+os.environ["REFRESH_INTERVAL_SECONDS"] = "0"  # 只测手动触发
+
+from dash_client import callback_payload, post_callback  # noqa: E402
+from stub_server import StubWeatherServer  # noqa: E402
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import dashboard_app  # noqa: E402
+import data_fetcher  # noqa: E402
+from refresh_scheduler import RefreshScheduler  # noqa: E402
+
+POLL_OUTPUTS = [("data-version", "data"), ("refresh-status", "children")]
+
+
+def poll(client, clicks, n_intervals, version, changed):
+    payload = callback_payload(
+        POLL_OUTPUTS,
+        [("refresh-btn", "n_clicks", clicks), ("data-version-poll", "n_intervals", n_intervals)],
+        [changed], state=[("data-version", "data", version)])
+    return post_callback(client, payload)
+
+
+def backoff_demo():
+    attempts = []
+
+    def flaky():
+        attempts.append(time.perf_counter())
+        if len(attempts) < 4:
+            raise RuntimeError("upstream unavailable")
+
+    scheduler = RefreshScheduler(flaky, interval=0, retry_delay=0.05, max_backoff=1.0, run_on_start=True)
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        scheduler.start()
+        deadline = time.time() + 5
+        while scheduler.version == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        scheduler.stop()
+    gaps = [f"{(b - a) * 1e3:.0f}" for a, b in zip(attempts, attempts[1:])]
+    print(f"backoff demo: {len(attempts)} attempts, gaps {', '.join(gaps)} ms, final version {scheduler.version}")
+
+
+def click_during_refresh_demo():
+    """刷新进行中点击：本次结束后应再运行一次，而不是并入已经取过数据的那次"""
+    runs = []
+
+    def slow():
+        runs.append(time.perf_counter())
+        time.sleep(0.2)
+
+    scheduler = RefreshScheduler(slow, interval=0, run_on_start=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        scheduler.start()
+        while not scheduler.running:
+            time.sleep(0.005)
+        queued = scheduler.request_refresh()
+        deadline = time.time() + 5
+        while scheduler.version < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        scheduler.stop()
+    assert queued and len(runs) == 2, (queued, len(runs))
+    print(f"click during a running refresh: queued a follow-up run, {len(runs)} runs "
+          f"({(runs[1] - runs[0]) * 1e3:.0f} ms apart)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=0.1, help="桩服务器单请求延迟(秒)")
+    args = parser.parse_args()
+
+    client = dashboard_app.create_app().server.test_client()
+    try:
+        with StubWeatherServer(delay=args.delay) as server:
+            data_fetcher.API_KEY = "bench"
+            data_fetcher.OWM_CALLS_PER_MINUTE = 0  # 不限速，测量的是抓取本身
+            data_fetcher._owm_client = None
+            data_fetcher.HTTP_CACHE_ENABLED = False  # 每次都请求桩服务器
+            data_fetcher.WEATHER_BASE_URL = server.url("/data/2.5/weather")
+            data_fetcher.FORECAST_BASE_URL = server.url("/data/2.5/forecast")
+
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                dashboard_app.refresh_job()
+            sync_time = time.perf_counter() - t0
+            print(f"synchronous refresh (old: inside the callback)  : {sync_time * 1e3:8.1f} ms")
+
+            dashboard_app.start_background_tasks()  # gunicorn 中由 post_worker_init 钩子调用
+            version = dashboard_app.data_version()
+            n = 0
+            new_version = version
+            with contextlib.redirect_stdout(io.StringIO()):  # 后台刷新线程的输出
+                click_elapsed, _, _, resp = poll(client, 1, 0, version, "refresh-btn.n_clicks")
+                t_click = time.perf_counter()
+                status = resp['response']['refresh-status']['children']
+                while new_version == version and time.perf_counter() - t_click < 60:
+                    time.sleep(0.05)
+                    n += 1
+                    elapsed, _, _, resp = poll(client, 1, n, version, "data-version-poll.n_intervals")
+                    new_version = resp["response"].get("data-version", {}).get("data", version) if resp else version
+                seen_after = time.perf_counter() - t_click
+                dashboard_app.refresh_scheduler.stop()
+            print(f"refresh button callback (enqueue only)          : {click_elapsed * 1e3:8.1f} ms  -> {status!r}")
+            print(f"new data version seen by polling after           : {seen_after * 1e3:8.1f} ms "
+                  f"(poll callback {elapsed * 1e3:.1f} ms)")
+            assert new_version != version, "background refresh did not publish a new version"
+        backoff_demo()
+        click_during_refresh_demo()
+    finally:
+        shutil.rmtree(DATA_ROOT, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
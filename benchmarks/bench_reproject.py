@@ -0,0 +1,103 @@
+"""
+分块并行重投影耗时对比，并校验最近邻结果与串行逐字节一致。
+另与整幅一次 rasterio.warp.reproject 的结果比较：分块输出与整幅输出并不逐字节相同
+（GDAL按窗口计算坐标近似与重采样核的缩放），差异须在下方的容差以内。
+
+运行: python benchmarks/bench_reproject.py [--resolution 0.001] [--workers 1,2,4]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import rasterio
+from rasterio.warp import reproject
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import preprocess_static_data as psd  # noqa: E402
+from synthetic_rasters import NA_VALUE, write_synthetic_rasters  # noqa: E402
+
+TARGET_CRS = "ESRI:102025"  # Asia North Albers，保证发生真实的坐标变换
+
+# 分块输出相对整幅重投影的容差
+MAX_DIFF_FRACTION_NEAREST = 0.01  # 最近邻(土地利用)：取值不同的像元比例
+MAX_MEAN_ABS_DIFF_BILINEAR = 2.0  # 双线性(DEM)：两者都有效的像元上的平均绝对差(米)；合成DEM含sigma=20米的逐像元噪声
+MAX_LOWLAND_THRESHOLD_DIFF = 1.0  # 双线性(DEM)：低地阈值(LOWLAND_PERCENTILE分位数)之差(米)
+
+
+def read_all(path):
+    with rasterio.open(path) as src:
+        return src.read(), os.path.getsize(path)
+
+
+def untiled(src_path, like_path, resampling, nodata):
+    """在分块输出的同一目标格网上整幅一次重投影"""
+    with rasterio.open(like_path) as like, rasterio.open(src_path) as src:
+        nodata = src.nodata if nodata is None else nodata
+        out = np.full((like.height, like.width), nodata, dtype=like.dtypes[0])
+        reproject(rasterio.band(src, 1), out, src_nodata=nodata, dst_nodata=nodata,
+                  dst_transform=like.transform, dst_crs=like.crs, resampling=resampling)
+    return out, nodata
+
+
+def compare_untiled(name, tiled, whole, resampling, nodata):
+    differ = float((tiled != whole).mean())
+    if resampling == psd.Resampling.nearest:
+        print(f"{name:<8} vs untiled reproject: {differ:.3%} of pixels differ (limit {MAX_DIFF_FRACTION_NEAREST:.0%})")
+        assert differ <= MAX_DIFF_FRACTION_NEAREST, "tiled nearest-neighbour output too far from untiled"
+        return
+    valid = (tiled != nodata) & (whole != nodata)
+    mean_abs = float(np.abs(tiled[valid].astype(np.float64) - whole[valid]).mean())
+    thresholds = [np.percentile(a[a != nodata], psd.LOWLAND_PERCENTILE) for a in (tiled, whole)]
+    threshold_diff = abs(thresholds[0] - thresholds[1])
+    print(f"{name:<8} vs untiled reproject: {differ:.1%} of pixels differ, mean abs diff {mean_abs:.2f} m "
+          f"(limit {MAX_MEAN_ABS_DIFF_BILINEAR:g}), lowland threshold {thresholds[0]:.1f} vs {thresholds[1]:.1f} m "
+          f"(limit {MAX_LOWLAND_THRESHOLD_DIFF:g})")
+    assert mean_abs <= MAX_MEAN_ABS_DIFF_BILINEAR, "tiled bilinear output too far from untiled"
+    assert threshold_diff <= MAX_LOWLAND_THRESHOLD_DIFF, "lowland threshold shifted by tiling"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resolution", type=float, default=0.001, help="合成栅格分辨率(度)")
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的进程数")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_reproj_")
+    try:
+        dem_path, landuse_path, shape = write_synthetic_rasters(tmp, args.resolution)
+        print(f"source {shape[0]}x{shape[1]} -> {TARGET_CRS}")
+        print(f"{'layer':<8} {'resampling':<10} {'workers':>7} {'time(s)':>8} {'size(MiB)':>10}  identical-to-serial")
+        untiled_rows = []
+        layers = [("landuse", landuse_path, psd.LANDUSE_RESAMPLING, None),
+                  ("dem", dem_path, psd.DEM_RESAMPLING, NA_VALUE)]
+        for name, path, resampling, nodata in layers:
+            serial = None
+            for workers in [int(w) for w in args.workers.split(",")]:
+                out = os.path.join(tmp, f"{name}_{workers}.tif")
+                t0 = time.perf_counter()
+                psd.reproject_raster(path, out, TARGET_CRS, resampling=resampling,
+                                     workers=workers, src_nodata=nodata)
+                elapsed = time.perf_counter() - t0
+                data, size = read_all(out)
+                if serial is None:
+                    serial = data
+                same = (data == serial).all() and data.dtype == serial.dtype
+                if resampling == psd.Resampling.nearest:
+                    assert same, "nearest-neighbour tiles differ from serial output"
+                print(f"{name:<8} {resampling.name:<10} {workers:>7} {elapsed:>8.2f} {size / 2**20:>10.1f}  {same}")
+            whole, whole_nodata = untiled(path, out, resampling, nodata)
+            untiled_rows.append((name, serial[0], whole, resampling, whole_nodata))
+        print()
+        for row in untiled_rows:
+            compare_untiled(*row)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+地图回调耗时：查预计算风险快照 vs 每次回调重新读取天气JSON并计算风险。
+
+运行: python benchmarks/bench_risk_lookup.py [--repeat 30]
+"""
+import argparse
+import contextlib
+import io
+
+from dash_client import callback_payload, percentile, post_callback
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import dashboard_app  # noqa: E402
+
+MAP_OUTPUTS = [("risk-map", "figure"), ("current-weather-risk-data-store", "data")]
+
+
+def run(client, repeat, recompute):
+    times = []
+    for i in range(repeat):
+        tab = ("flood", "fire")[i % 2]
+        risk_time = dashboard_app.risk_time_options[i % len(dashboard_app.risk_time_options)]["value"]
+        inputs = [("disaster-tabs", "value", tab), ("risk-time", "value", risk_time), ("data-version", "data", None)]
+        if recompute:
+            # 模拟旧行为：每次回调都读JSON并计算全部时刻
+            dashboard_app._risk_snapshot = None
+            dashboard_app.weather_store.invalidate()
+        payload = callback_payload(MAP_OUTPUTS, inputs, ["risk-time.value"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed, _, _, resp = post_callback(client, payload)
+        times.append(elapsed)
+        if not recompute:
+            cached = dashboard_app._risk_snapshot["results"][risk_time]
+            assert cached == dashboard_app.estimate_region_risk(
+                dashboard_app.cities_meta, dashboard_app._risk_snapshot["weather_dict"], risk_time)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    client = dashboard_app.create_app().server.test_client()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run(client, 2, False)  # 预热并校验快照与逐时刻计算一致
+        lookup = run(client, args.repeat, False)
+        recompute = run(client, args.repeat, True)
+    for name, times in (("snapshot lookup", lookup), ("reload + recompute", recompute)):
+        print(f"{name:<20} p50 {percentile(times, 50) * 1e3:6.1f} ms   p95 {percentile(times, 95) * 1e3:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+聊天上下文 Store 的体积与并发延迟：Store 只存快照ID vs 旧版存整份 weather_dict / risk_results / cities_meta。
+
+每个会话重复“切换时刻(地图回调) + 发送一条聊天(聊天回调，再轮询取回后台生成的回复)”。
+旧版的 Store 内容按原结构从同一快照重建，用于计算字节数；旧版的并发延迟以
+“同样的请求 + 每次请求在服务端多做一次旧Store的JSON序列化/反序列化”模拟。
+未设置 OPENAI_API_KEY 时聊天回调不访问网络，测量的是上下文准备与回调本身。
+
+运行: python benchmarks/bench_store_payload.py [--sessions 1,4,16] [--rounds 10]
+"""
+import argparse
+import contextlib
+import io
+import json
+import threading
+import time
+
+from dash_client import callback_payload, percentile, post_callback
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import dashboard_app  # noqa: E402
+APP = dashboard_app.create_app()
+
+MAP_OUTPUTS = [("risk-map", "figure"), ("current-weather-risk-data-store", "data")]
+CHAT_OUTPUTS = [("chat-delta", "data"), ("chat-input", "value"), ("chat-job", "data"),
+                ("chat-stream-poll", "disabled"), ("chat-send-btn", "disabled")]
+STORE = "current-weather-risk-data-store"
+POLL_IDLE = 0.01  # 回复尚无新内容时再次轮询前的等待(秒)
+MAX_POLLS = 500
+
+
+def map_payload(risk_time):
+    return callback_payload(MAP_OUTPUTS, [("disaster-tabs", "value", "flood"), ("risk-time", "value", risk_time),
+                                          ("data-version", "data", None)], ["risk-time.value"])
+
+
+def chat_payload(store_value, risk_time, trigger="chat-send-btn.n_clicks", job=None):
+    return callback_payload(CHAT_OUTPUTS, [("chat-send-btn", "n_clicks", 1), ("chat-stream-poll", "n_intervals", 1)],
+                            [trigger], state=[("chat-input", "value", "广州现在的洪涝风险如何？"),
+                                              (STORE, "data", store_value), ("risk-time", "value", risk_time),
+                                              ("chat-job", "data", job)])
+
+
+def chat_round(client, store_id, risk_time, times, legacy_blob=None):
+    """发送一条聊天并轮询（poll_chat）到回复结束；每次回调的耗时记入 times"""
+    t0 = time.perf_counter()
+    if legacy_blob is not None:
+        json.loads(json.dumps(legacy_blob))  # 旧版：聊天请求携带整份Store，服务端解析
+    _, _, _, resp = post_callback(client, chat_payload(store_id, risk_time))
+    times.append(time.perf_counter() - t0)
+    job = resp["response"]["chat-job"]["data"]
+    for _ in range(MAX_POLLS):
+        if job is None:  # 未提交任务（数据未加载）或回复已结束
+            return
+        t0 = time.perf_counter()
+        _, _, _, resp = post_callback(client, chat_payload(store_id, risk_time, "chat-stream-poll.n_intervals", job))
+        times.append(time.perf_counter() - t0)
+        if resp is None:  # 还没有新内容
+            time.sleep(POLL_IDLE)
+            continue
+        job = resp["response"]["chat-job"].get("data", job)
+        if resp["response"]["chat-stream-poll"].get("disabled"):
+            return
+    raise RuntimeError(f"chat reply not finished after {MAX_POLLS} polls")
+
+
+def legacy_store(risk_time):
+    """旧版 update_map_and_store_data 写入 Store 的内容"""
+    snapshot = dashboard_app.get_risk_snapshot()
+    return {
+        "weather_dict": snapshot["weather_dict"],
+        "risk_results": snapshot["results"][risk_time],
+        "risk_time_selection": risk_time,
+        "cities_meta": dashboard_app.cities_meta,
+    }
+
+
+def byte_sizes(client, risk_time):
+    """(地图响应, 聊天请求) 的字节数：新版实测；旧版把Store值替换为旧结构后计算"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, _, map_resp_bytes, resp = post_callback(client, map_payload(risk_time))
+    store_id = resp["response"][STORE]["data"]
+    chat_req_bytes = len(json.dumps(chat_payload(store_id, risk_time)).encode("utf-8"))
+
+    legacy = legacy_store(risk_time)
+    legacy_map = map_resp_bytes - len(json.dumps(store_id)) + len(json.dumps(legacy).encode("utf-8"))
+    legacy_chat = len(json.dumps(chat_payload(legacy, risk_time)).encode("utf-8"))
+    return store_id, (map_resp_bytes, chat_req_bytes), (legacy_map, legacy_chat)
+
+
+def session(client, rounds, legacy_blob, latencies, errors, lock):
+    times = []
+    try:
+        for i in range(rounds):
+            risk_time = dashboard_app.risk_time_options[i % len(dashboard_app.risk_time_options)]["value"]
+            t0 = time.perf_counter()
+            _, _, _, resp = post_callback(client, map_payload(risk_time))
+            if legacy_blob is not None:
+                json.loads(json.dumps(legacy_blob))  # 旧版：服务端序列化Store写入响应
+            store_id = resp["response"][STORE]["data"]
+            times.append(time.perf_counter() - t0)
+            chat_round(client, store_id, risk_time, times, legacy_blob)
+    except Exception as e:
+        with lock:
+            errors.append(f"{type(e).__name__}: {e}")
+    with lock:
+        latencies.extend(times)
+
+
+def concurrent_run(n_sessions, rounds, legacy_blob):
+    latencies, errors, lock = [], [], threading.Lock()
+    clients = [APP.server.test_client() for _ in range(n_sessions)]
+    threads = [threading.Thread(target=session, args=(c, rounds, legacy_blob, latencies, errors, lock))
+               for c in clients]
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    wall = time.perf_counter() - t0
+    if errors or not latencies:
+        raise SystemExit(f"{len(errors)} of {n_sessions} sessions failed"
+                         + (f", e.g. {errors[0]}" if errors else "; no requests completed"))
+    return latencies, len(latencies) / wall
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", default="1,4,16")
+    parser.add_argument("--rounds", type=int, default=10, help="每个会话的 地图+聊天 轮数")
+    args = parser.parse_args()
+
+    client = APP.server.test_client()
+    store_id, new, old = byte_sizes(client, "now")
+    print(f"store value: {store_id!r}")
+    print(f"{'':<22} {'snapshot ID':>12} {'legacy store':>13}")
+    print(f"{'map response bytes':<22} {new[0]:>12,} {old[0]:>13,}")
+    print(f"{'chat request bytes':<22} {new[1]:>12,} {old[1]:>13,}")
+    blob = legacy_store("now")
+    t0 = time.perf_counter()
+    for _ in range(20):
+        json.loads(json.dumps(blob))
+    print(f"legacy store JSON round trip: {(time.perf_counter() - t0) / 20 * 1e3:.2f} ms per callback")
+
+    # 按ID取回地图所用的快照；未知ID退回最新快照
+    assert dashboard_app.resolve_snapshot(store_id)["id"] == store_id
+    assert dashboard_app.resolve_snapshot("unknown")["id"] == dashboard_app.get_risk_snapshot()["id"]
+
+    print(f"\n{'sessions':>8} {'mode':<12} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8}")
+    for n in [int(s) for s in args.sessions.split(",")]:
+        for mode, legacy_blob in (("snapshot ID", None), ("legacy", blob)):
+            latencies, rate = concurrent_run(n, args.rounds, legacy_blob)
+            print(f"{n:>8} {mode:<12} {percentile(latencies, 50) * 1e3:>8.1f} "
+                  f"{percentile(latencies, 95) * 1e3:>8.1f} {rate:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
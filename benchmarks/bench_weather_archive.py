@@ -0,0 +1,82 @@
+"""
+历史归档：批量追加吞吐、库大小，以及按城市 + 时间范围查询并计算风险曲线的耗时。
+用仓库自带的天气数据加扰动，模拟每小时抓取一次、持续 --days 天。
+
+运行: python benchmarks/bench_weather_archive.py [--days 30] [--batch 24]
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from weather_archive import WeatherArchive  # noqa: E402
+from risk_model import WEATHER_FIELDS, estimate_series_risk  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+def perturbed(weather_dict, rng):
+    out = copy.deepcopy(weather_dict)
+    for city_weather in out.values():
+        blocks = [city_weather.get("weather", {}).get("now")] + list(city_weather.get("weather", {}).get("forecast", {}).values())
+        for block in blocks:
+            if block:
+                block["temperature"] += rng.uniform(-2, 2)
+                block["precipitation"] = max(0.0, block["precipitation"] + rng.uniform(-1, 3))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=24, help="每个事务写入的抓取次数")
+    args = parser.parse_args()
+
+    with open(os.path.join(DATA_DIR, "guangdong_weather.json"), encoding="utf-8") as f:
+        weather_dict = json.load(f)
+    with open(os.path.join(DATA_DIR, "admin_unit", "guangdong_cities_meta.json"), encoding="utf-8") as f:
+        cities_meta = {c["city_name"]: c for c in json.load(f)}
+    rng = random.Random(0)
+    t_end = int(time.time()) // 3600 * 3600
+    issue_times = [t_end - h * 3600 for h in range(args.days * 24)][::-1]
+    fetches = [(t, perturbed(weather_dict, rng)) for t in issue_times]
+
+    tmp = tempfile.mkdtemp(prefix="bench_archive_")
+    try:
+        archive = WeatherArchive(os.path.join(tmp, "archive.sqlite"))
+        t0 = time.perf_counter()
+        rows = sum(archive.append_fetches(fetches[i:i + args.batch]) for i in range(0, len(fetches), args.batch))
+        elapsed = time.perf_counter() - t0
+        print(f"appended {len(fetches)} fetches / {rows} rows in {elapsed:.2f}s "
+              f"({rows / elapsed:,.0f} rows/s), db {os.path.getsize(archive.path) / 2**20:.1f} MiB")
+        assert archive.append_fetch(fetches[-1][1], fetches[-1][0]) == 0, "re-appending a fetch must be a no-op"
+
+        t0 = time.perf_counter()
+        one = archive.append_fetch(weather_dict, t_end + 3600)
+        print(f"single fetch append: {one} rows in {(time.perf_counter() - t0) * 1e3:.1f} ms")
+
+        city = "广州市"
+        for days in (1, 7, 30):
+            t0 = time.perf_counter()
+            for _ in range(20):
+                hist = archive.city_history(city, start=t_end - days * 86400, end=t_end)
+                values = np.stack([hist[f] for f in WEATHER_FIELDS], axis=-1)
+                risk = estimate_series_risk(cities_meta[city], values)
+            per = (time.perf_counter() - t0) / 20
+            print(f"{city} last {days:>2} day(s): {len(hist['issue_time']):>4} points, "
+                  f"query + risk {per * 1e3:.2f} ms (max flood {np.nanmax(risk['flood_score']):.2f})")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
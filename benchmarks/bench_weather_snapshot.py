@@ -0,0 +1,128 @@
+"""
+列式天气快照：与JSON的往返一致性校验，以及加载耗时对比 (json.load + 打包数组 / np.load 快照)。
+21个城市时JSON略快，快照的意义在于列式存储完整预报序列；--cities 较大时快照读取才更快。
+
+运行: python benchmarks/bench_weather_snapshot.py [--repeat 50] [--cities 21]
+--cities 大于实际城市数时复制城市以模拟更大的数据量。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import weather_snapshot as ws  # noqa: E402
+from risk_model import estimate_risk_table, estimate_risk_table_from_snapshot  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def check_round_trip(weather_dict, snap):
+    """快照还原出的四个风险变量与 datetime 应与JSON完全一致"""
+    restored = ws.snapshot_to_weather_dict(snap)
+    for city_name, city_weather in weather_dict.items():
+        for weather_time in snap["weather_times"]:
+            original = ws.weather_block(city_weather, weather_time)
+            back = ws.weather_block(restored[city_name], weather_time)
+            assert (original is None) == (back is None), (city_name, weather_time)
+            if original is None:
+                continue
+            for field in ws.SNAPSHOT_FIELDS:
+                assert float(original.get(field, 0.0)) == back[field], (city_name, weather_time, field)
+            if weather_time != "now":
+                assert original.get("datetime", "") == back["datetime"]
+
+
+def with_gaps(weather_dict, city_names):
+    """
+    复制天气字典并制造缺失：一个城市没有实况、一个缺24h预报、一个实况缺湿度字段、一个城市完全没有天气，
+    往返校验与风险表比对要覆盖这些情况。
+    """
+    weather_dict = json.loads(json.dumps(weather_dict))
+    gaps = city_names[:4]
+    if len(gaps) < 4:
+        return weather_dict
+    weather_dict.setdefault(gaps[0], {}).setdefault("weather", {})["now"] = None
+    weather_dict.setdefault(gaps[1], {}).setdefault("weather", {}).setdefault("forecast", {}).pop("24h", None)
+    now = weather_dict.setdefault(gaps[2], {}).setdefault("weather", {}).get("now")
+    if now:
+        now.pop("humidity", None)
+    weather_dict.pop(gaps[3], None)
+    return weather_dict
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--cities", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(os.path.join(DATA_DIR, "admin_unit", "guangdong_cities_meta.json"), encoding="utf-8") as f:
+        cities_meta = json.load(f)
+    with open(os.path.join(DATA_DIR, "guangdong_weather.json"), encoding="utf-8") as f:
+        weather_dict = json.load(f)
+    if args.cities > len(cities_meta):
+        base_meta, base_weather = cities_meta, weather_dict
+        cities_meta, weather_dict = [], {}
+        for i in range(args.cities):
+            c = dict(base_meta[i % len(base_meta)])
+            c["city_name"] = f"{c['city_name']}#{i}"
+            cities_meta.append(c)
+            weather_dict[c["city_name"]] = base_weather.get(base_meta[i % len(base_meta)]["city_name"], {})
+    city_names = [c["city_name"] for c in cities_meta]
+    weather_dict = with_gaps(weather_dict, city_names)
+
+    tmp = tempfile.mkdtemp(prefix="bench_snap_")
+    try:
+        json_path = os.path.join(tmp, "guangdong_weather.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(weather_dict, f, ensure_ascii=False, indent=2)
+        snap_path = ws.weather_snapshot_path(json_path)
+        ws.write_weather_snapshot(snap_path, city_names, weather_dict)
+
+        check_round_trip(weather_dict, ws.load_weather_snapshot(snap_path))
+        from_json = estimate_risk_table(cities_meta, weather_dict)
+        from_snap = estimate_risk_table_from_snapshot(cities_meta, snap_path)
+        for key in ("flood_score", "fire_score", "flood_level", "fire_level", "valid"):
+            np.testing.assert_array_equal(from_json[key], from_snap[key])
+        assert not from_json["valid"].all(), "expected the injected gaps to leave invalid cells"
+        print(f"{len(city_names)} cities ({int((~from_json['valid']).sum())} missing cells): "
+              f"round trip OK, risk tables identical")
+        print(f"json {os.path.getsize(json_path) / 1024:.1f} KB, snapshot {os.path.getsize(snap_path) / 1024:.1f} KB")
+
+        def json_path_load():
+            with open(json_path, encoding="utf-8") as f:
+                data = json.load(f)
+            return ws.pack_weather(city_names, data)
+
+        def npz_load():
+            return ws.load_weather_snapshot(snap_path)
+
+        rows = [("json.load + pack arrays", json_path_load), ("np.load snapshot", npz_load)]
+        base = None
+        for name, fn in rows:
+            with contextlib.redirect_stdout(io.StringIO()):
+                t = timed(fn, args.repeat)
+            base = base or t
+            print(f"{name:<24} {t * 1e3:8.3f} ms  ({base / t:.1f}x)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
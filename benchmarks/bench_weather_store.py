@@ -0,0 +1,81 @@
+"""
+天气数据读取：每次 json.load vs WeatherStore 缓存命中，以及多线程并发读取与文件更新后的重载。
+
+运行: python benchmarks/bench_weather_store.py [--repeat 200] [--threads 8]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from weather_store import WeatherStore  # noqa: E402
+
+REPO_WEATHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "guangdong_weather.json")
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_store_")
+    try:
+        path = os.path.join(tmp, "guangdong_weather.json")
+        shutil.copy(REPO_WEATHER, path)
+        print(f"weather file: {os.path.getsize(path) / 1024:.0f} KB")
+
+        def json_load():
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+
+        store = WeatherStore(path)
+        assert store.get() == json_load()
+        per_load = timed(json_load, args.repeat)
+        per_hit = timed(store.get, args.repeat)
+        print(f"json.load per call      : {per_load * 1e3:8.3f} ms")
+        print(f"WeatherStore.get (hit)  : {per_hit * 1e3:8.3f} ms  ({per_load / per_hit:.0f}x)")
+
+        # 多线程并发读取，期间改写文件一次：每个版本只应解析一次
+        store = WeatherStore(path)
+        data = json_load()
+        seen = []
+
+        def reader():
+            for _ in range(args.repeat):
+                seen.append(store.snapshot()[1])
+
+        threads = [threading.Thread(target=reader) for _ in range(args.threads)]
+        for t in threads:
+            t.start()
+        time.sleep(0.01)
+        data["__marker__"] = {}
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+        for t in threads:
+            t.join()
+        store.get()
+        stats = store.stats()
+        print(f"{args.threads} threads x {args.repeat} reads with one rewrite: "
+              f"{len(set(seen))} version(s) seen, stats={stats}")
+        assert stats["reloads"] <= 2, "file was parsed more than once per version"
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
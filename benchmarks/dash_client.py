@@ -0,0 +1,50 @@
+"""
+通过Flask测试客户端直接请求Dash回调接口(/_dash-update-component)，
+测量回调的服务端耗时与请求/响应字节数，无需启动浏览器。
+"""
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, REPO_ROOT)
+# 仪表盘读取仓库自带的数据目录
+os.environ.setdefault("GUANGDONG_DATA_DIR", os.path.join(REPO_ROOT, "data"))
+
+
+def _output_key(outputs):
+    if len(outputs) == 1:
+        return f"{outputs[0][0]}.{outputs[0][1]}"
+    return ".." + "...".join(f"{cid}.{prop}" for cid, prop in outputs) + ".."
+
+
+def callback_payload(outputs, inputs, changed, state=()):
+    """
+    outputs: [(id, prop)]；inputs/state: [(id, prop, value)]；changed: 触发的 'id.prop' 列表
+    """
+    out = [{"id": cid, "property": prop} for cid, prop in outputs]
+    return {
+        "output": _output_key(outputs),
+        "outputs": out if len(out) > 1 else out[0],
+        "inputs": [{"id": cid, "property": prop, "value": v} for cid, prop, v in inputs],
+        "state": [{"id": cid, "property": prop, "value": v} for cid, prop, v in state],
+        "changedPropIds": list(changed),
+    }
+
+
+def post_callback(client, payload):
+    """发送一次回调请求，返回 (耗时秒, 请求字节数, 响应字节数, 响应JSON)"""
+    body = json.dumps(payload).encode("utf-8")
+    t0 = time.perf_counter()
+    resp = client.post("/_dash-update-component", data=body, content_type="application/json")
+    elapsed = time.perf_counter() - t0
+    assert resp.status_code in (200, 204), resp.status_code
+    data = resp.get_data()
+    return elapsed, len(body), len(data), (json.loads(data) if data else None)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
@@ -0,0 +1,145 @@
+"""
+地图回调压测：N个并发会话持续请求 /_dash-update-component（切换灾种/时刻），报告 req/s 与延迟分位数。
+
+    # 压测已在运行的服务（如 gunicorn -c gunicorn.conf.py wsgi:server）
+    python benchmarks/load_test.py --url http://127.0.0.1:8050 --concurrency 1,8,32
+
+    # 不给 --url 时自行启动服务：装有gunicorn时用 wsgi.py 起 --workers 个进程，否则在本进程内起单进程线程服务器
+    python benchmarks/load_test.py --workers 4 --duration 10
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from dash_client import callback_payload, percentile
+from weather_snapshot import SNAPSHOT_TIMES
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MAP_OUTPUTS = [("risk-map", "figure"), ("current-weather-risk-data-store", "data")]
+RISK_TIMES = list(SNAPSHOT_TIMES)  # 与被测服务相同的 FORECAST_HOURS 配置
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url + "/_dash-layout", timeout=2).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not become ready")
+
+
+@contextlib.contextmanager
+def local_server(workers):
+    """启动被测服务，返回其URL"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, REFRESH_INTERVAL_SECONDS="0", ACCESS_LOG="")
+    env.setdefault("GUANGDONG_DATA_DIR", os.path.join(REPO_ROOT, "data"))
+    if shutil.which("gunicorn"):
+        proc = subprocess.Popen(["gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+                                 "--workers", str(workers), "wsgi:server"], cwd=REPO_ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(url)
+            print(f"server: gunicorn, {workers} workers (preload)")
+            yield url
+        finally:
+            proc.terminate()
+            proc.wait(10)
+        return
+    # 没有gunicorn：本进程内的多线程WSGI服务器（单进程）
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    os.environ.update({k: v for k, v in env.items() if k in ("REFRESH_INTERVAL_SECONDS", "GUANGDONG_DATA_DIR")})
+    sys.path.insert(0, REPO_ROOT)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import wsgi
+    server = make_server("127.0.0.1", port, wsgi.server, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        wait_ready(url)
+        print("server: werkzeug threaded (single process; install gunicorn for multi-worker runs)")
+        yield url
+    finally:
+        server.shutdown()
+
+
+def session_loop(url, stop_at, latencies, errors, lock, offset):
+    session = requests.Session()
+    times, failed, i = [], 0, offset
+    while time.perf_counter() < stop_at:
+        payload = callback_payload(
+            MAP_OUTPUTS, [("disaster-tabs", "value", ("flood", "fire")[i % 2]),
+                          ("risk-time", "value", RISK_TIMES[i % len(RISK_TIMES)]),
+                          ("data-version", "data", None)], ["risk-time.value"])
+        t0 = time.perf_counter()
+        try:
+            resp = session.post(url + "/_dash-update-component", json=payload, timeout=30)
+            ok = resp.status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        times.append(time.perf_counter() - t0)
+        failed += 0 if ok else 1
+        i += 1
+    with lock:
+        latencies.extend(times)
+        errors.append(failed)
+
+
+def run(url, concurrency, duration):
+    latencies, errors, lock = [], [], threading.Lock()
+    stop_at = time.perf_counter() + duration
+    threads = [threading.Thread(target=session_loop, args=(url, stop_at, latencies, errors, lock, k))
+               for k in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    return len(latencies) / wall, latencies, sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="被测服务地址；不给则自行启动")
+    parser.add_argument("--workers", type=int, default=4, help="自行启动gunicorn时的worker数")
+    parser.add_argument("--concurrency", default="1,8,32", help="逗号分隔的并发会话数")
+    parser.add_argument("--duration", type=float, default=5.0, help="每档持续秒数")
+    args = parser.parse_args()
+
+    server = contextlib.nullcontext(args.url.rstrip("/")) if args.url else local_server(args.workers)
+    with server as url:
+        run(url, 2, 1.0)  # 预热（风险快照、连接）
+        print(f"{'sessions':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for n in [int(c) for c in args.concurrency.split(",")]:
+            rate, latencies, errors = run(url, n, args.duration)
+            print(f"{n:>8} {rate:>8.1f} {percentile(latencies, 50) * 1e3:>8.1f} "
+                  f"{percentile(latencies, 95) * 1e3:>8.1f} {percentile(latencies, 99) * 1e3:>8.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+本地模拟的OpenAI兼容接口（POST /v1/chat/completions），供benchmarks下的脚本离线测试聊天助手。
+支持 stream=true（SSE逐token下发，以 data: [DONE] 结束）与普通的整段JSON响应。
+
+用法:
+    with MockOpenAIServer(first_token_delay=0.3, token_delay=0.02) as server:
+        chatbot_service.OPENAI_API_KEY = "mock"
+        chatbot_service.OPENAI_BASE_URL = server.base_url
+        ...
+        print(server.requests, server.connections, server.max_in_flight)
+
+也可单独运行，供手动打开的仪表盘使用:
+    python benchmarks/mock_openai_server.py --port 8999
+    OPENAI_API_KEY=mock OPENAI_BASE_URL=http://127.0.0.1:8999/v1 python dashboard_app.py
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ("根据当前数据，广州市的洪涝风险为中风险，主要来自近期累计降水偏多；"
+         "火险等级较低。建议关注短时强降水预警，低洼地带注意防范内涝。")
+
+
+def reply_tokens(n_tokens):
+    """把固定回复切成 n_tokens 段（不足时重复），模拟逐token生成"""
+    text = REPLY
+    while len(text) < n_tokens * 2:
+        text += REPLY
+    return [text[2 * i:2 * i + 2] for i in range(n_tokens)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头与正文分两次写出；不关Nagle的话，复用的连接上会碰到客户端的延迟ACK（约40ms）
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1  # 每个TCP连接创建一个处理器实例
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.requests += 1
+            fail = server.fail_next > 0
+            server.fail_next -= 1 if fail else 0
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            self._complete(body, fail)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _complete(self, body, fail):
+        server = self.server
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            return self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+        if fail:
+            return self._json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                              {"Retry-After": "0"})
+
+        model = body.get("model", "mock")
+        tokens = reply_tokens(min(server.tokens, int(body.get("max_tokens") or server.tokens)))
+        completion_id = "chatcmpl-" + uuid.uuid4().hex[:12]
+        time.sleep(server.first_token_delay)
+        if not body.get("stream"):
+            time.sleep(server.token_delay * (len(tokens) - 1))
+            return self._json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": len(tokens), "total_tokens": 100 + len(tokens)},
+            })
+
+        # SSE：分块传输逐块下发，连接保持可复用
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(server.token_delay)
+            self._event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+        self._event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _event(self, obj):
+        self._chunk(b"data: " + json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n\n")
+
+    def _chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _json(self, status, obj, headers=None):
+        payload = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class MockOpenAIServer:
+    """
+    在127.0.0.1随机端口（或指定端口）启动的模拟服务。
+    first_token_delay: 首个token前的等待(秒)；token_delay: 之后每个token的间隔(秒)；tokens: 回复的token数。
+    fail(n): 接下来的n个请求返回429（限流），用于测试重试。
+    """
+
+    def __init__(self, first_token_delay=0.3, token_delay=0.02, tokens=120, port=0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.first_token_delay = first_token_delay
+        self.httpd.token_delay = token_delay
+        self.httpd.tokens = tokens
+        self.httpd.fail_next = 0
+        self.httpd.requests = 0
+        self.httpd.connections = 0
+        self.httpd.in_flight = 0
+        self.httpd.max_in_flight = 0
+        self.httpd.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def connections(self):
+        return self.httpd.connections
+
+    @property
+    def max_in_flight(self):
+        return self.httpd.max_in_flight
+
+    def fail(self, n):
+        with self.httpd.lock:
+            self.httpd.fail_next = n
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--tokens", type=int, default=120)
+    args = parser.parse_args()
+    with MockOpenAIServer(args.first_token_delay, args.token_delay, args.tokens, args.port) as server:
+        print(f"mock OpenAI API at {server.base_url} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
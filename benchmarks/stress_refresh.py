@@ -0,0 +1,150 @@
+"""
+并发刷新压力测试：多个线程/进程同时调用 update_weather_json，另有读取线程不停解析天气JSON。
+
+检查:
+  - 读取方从不遇到 JSONDecodeError / 文件不存在（原子替换）
+  - 同一进程内的并发刷新合并为一次（桩服务器请求数 = 城市数 × 2）
+  - 多进程同时刷新由文件锁串行化，等锁的进程复用刚写出的结果
+
+运行: python benchmarks/stress_refresh.py [--threads 16] [--waves 5] [--processes 4]
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import data_fetcher  # noqa: E402
+from bench_fetch import make_base_path  # noqa: E402
+from stub_server import StubWeatherServer  # noqa: E402
+
+
+class Readers:
+    """后台线程循环读取并解析JSON，统计失败次数"""
+
+    def __init__(self, path, n):
+        self.path = path
+        self.stop = threading.Event()
+        self.reads = 0
+        self.errors = []
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(n)]
+
+    def _run(self):
+        while not self.stop.is_set():
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    json.load(f)
+                self.reads += 1
+            except (ValueError, OSError) as e:
+                self.errors.append(repr(e))
+
+    def __enter__(self):
+        for t in self.threads:
+            t.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        for t in self.threads:
+            t.join()
+
+
+def _configure(server):
+    data_fetcher.API_KEY = "bench"
+    data_fetcher.OWM_CALLS_PER_MINUTE = 0  # 不限速，测量的是抓取本身
+    data_fetcher._owm_client = None
+    data_fetcher.HTTP_CACHE_ENABLED = False  # 每次都请求桩服务器
+    data_fetcher.WEATHER_BASE_URL = server.url("/data/2.5/weather")
+    data_fetcher.FORECAST_BASE_URL = server.url("/data/2.5/forecast")
+
+
+def _process_refresh(base, weather_url, forecast_url, barrier):
+    data_fetcher.API_KEY = "bench"
+    data_fetcher.OWM_CALLS_PER_MINUTE = 0  # 不限速，测量的是抓取本身
+    data_fetcher._owm_client = None
+    data_fetcher.HTTP_CACHE_ENABLED = False  # 每次都请求桩服务器
+    data_fetcher.WEATHER_BASE_URL = weather_url
+    data_fetcher.FORECAST_BASE_URL = forecast_url
+    barrier.wait()
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_fetcher.update_weather_json(base_path=base)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16, help="每轮同时发起刷新的线程数")
+    parser.add_argument("--waves", type=int, default=5)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    base = make_base_path()
+    path = os.path.join(base, "data", "guangdong_weather.json")
+    with open(os.path.join(base, "data", "admin_unit", "guangdong_cities_meta.json"), encoding="utf-8") as f:
+        requests_per_refresh = 2 * len(json.load(f))
+    try:
+        with StubWeatherServer(delay=args.delay) as server:
+            _configure(server)
+            with contextlib.redirect_stdout(io.StringIO()):
+                data_fetcher.update_weather_json(base_path=base)
+
+            with Readers(path, args.readers) as readers:
+                # 1) 同一进程内的并发刷新
+                for wave in range(args.waves):
+                    server.hits.clear()
+                    results = []
+                    start = threading.Barrier(args.threads)
+
+                    def refresh():
+                        start.wait()
+                        results.append(data_fetcher.update_weather_json(base_path=base))
+
+                    threads = [threading.Thread(target=refresh) for _ in range(args.threads)]
+                    t0 = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        for t in threads:
+                            t.start()
+                        for t in threads:
+                            t.join()
+                    hits = sum(server.hits.values())
+                    assert len(results) == args.threads and all(r is results[0] for r in results)
+                    print(f"wave {wave}: {args.threads} concurrent refreshes -> {hits} upstream requests "
+                          f"({hits / requests_per_refresh:.0f} refresh), {time.perf_counter() - t0:.2f}s")
+                    assert hits == requests_per_refresh, "concurrent refreshes were not coalesced"
+
+                # 2) 多进程同时刷新
+                ctx = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+                barrier = ctx.Barrier(args.processes)
+                server.hits.clear()
+                procs = [ctx.Process(target=_process_refresh,
+                                     args=(base, server.url("/data/2.5/weather"),
+                                           server.url("/data/2.5/forecast"), barrier))
+                         for _ in range(args.processes)]
+                t0 = time.perf_counter()
+                for p in procs:
+                    p.start()
+                for p in procs:
+                    p.join()
+                    assert p.exitcode == 0
+                hits = sum(server.hits.values())
+                print(f"{args.processes} processes refreshing at once -> {hits} upstream requests "
+                      f"({hits / requests_per_refresh:.0f} refresh), {time.perf_counter() - t0:.2f}s")
+
+            print(f"readers: {readers.reads} successful parses, {len(readers.errors)} errors")
+            assert not readers.errors, readers.errors[:3]
+            leftovers = [n for n in os.listdir(os.path.dirname(path)) if n.endswith(".tmp")]
+            assert not leftovers, leftovers
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+本地桩HTTP服务器，模拟OpenWeatherMap接口，供benchmarks下的脚本使用。
+
+用法:
+    with StubWeatherServer(delay=0.05) as server:
+        data_fetcher.WEATHER_BASE_URL = server.url("/data/2.5/weather")
+        data_fetcher.FORECAST_BASE_URL = server.url("/data/2.5/forecast")
+        ...
+        print(server.hits)
+"""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def fake_current_payload(lat, lon):
+    """构造一条与 /data/2.5/weather 结构一致的实况数据"""
+    return {
+        "coord": {"lat": lat, "lon": lon},
+        "main": {"temp": 20.0 + lat % 10, "humidity": 60 + int(lon) % 30},
+        "wind": {"speed": 2.5, "deg": 90},
+        "rain": {"1h": round(lon % 3, 2)},
+    }
+
+
+def fake_forecast_payload(lat, lon, slots=40, start=None):
+    """构造一条与 /data/2.5/forecast 结构一致的5天/3小时预报，共slots个时次"""
+    start = int(start if start is not None else time.time())
+    start -= start % 10800
+    items = []
+    for i in range(slots):
+        dt = start + (i + 1) * 10800
+        items.append({
+            "dt": dt,
+            "dt_txt": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(dt)),
+            "main": {"temp": 18.0 + (i % 8), "humidity": 50 + (i * 7) % 45},
+            "wind": {"speed": 1.0 + (i % 5) * 0.5, "deg": (i * 37) % 360},
+            "rain": {"3h": round(((lat + lon + i) % 7) * 0.4, 2)},
+        })
+    return {"cod": "200", "cnt": len(items), "list": items}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 允许keep-alive，便于观察连接复用
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        with server.lock:
+            server.hits[parsed.path] += 1
+        if server.delay:
+            time.sleep(server.delay)
+
+        route = server.routes.get(parsed.path)
+        if route is None:
+            status, headers, body = 404, {}, {"cod": "404", "message": "not found"}
+        else:
+            status, headers, body = route(query, dict(self.headers))
+
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def with_etag(handler):
+    """
+    包装路由：为响应加上内容哈希ETag，请求带匹配的 If-None-Match 时返回304（无正文）。
+    返回的包装函数带 .not_modified 计数。
+    """
+    import hashlib
+
+    def wrapped(query, headers):
+        status, out_headers, body = handler(query, headers)
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+        if status == 200 and headers.get("If-None-Match") == etag:
+            wrapped.not_modified += 1
+            return 304, {"ETag": etag}, b""
+        return status, dict(out_headers, ETag=etag), payload
+
+    wrapped.not_modified = 0
+    return wrapped
+
+
+def _default_routes():
+    def weather(query, headers):
+        return 200, {}, fake_current_payload(float(query.get("lat", 0)), float(query.get("lon", 0)))
+
+    def forecast(query, headers):
+        return 200, {}, fake_forecast_payload(float(query.get("lat", 0)), float(query.get("lon", 0)))
+
+    return {"/data/2.5/weather": weather, "/data/2.5/forecast": forecast}
+
+
+class StubWeatherServer:
+    """
+    在127.0.0.1随机端口启动的多线程桩服务器。
+    routes: {path: handler(query, headers) -> (status, headers, body)}，默认模拟OWM实况和预报。
+    delay: 每个请求的人为延迟(秒)，模拟网络往返。
+    """
+
+    def __init__(self, delay=0.0, routes=None):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.delay = delay
+        self.httpd.routes = routes if routes is not None else _default_routes()
+        self.httpd.hits = Counter()
+        self.httpd.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def hits(self):
+        return self.httpd.hits
+
+    @property
+    def routes(self):
+        return self.httpd.routes
+
+    def url(self, path):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
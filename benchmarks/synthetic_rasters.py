@@ -0,0 +1,56 @@
+"""
+为栅格预处理基准生成合成输入：覆盖广东省范围的DEM/土地利用GeoTIFF和地级市shp。
+地级市多边形取自仓库内的 guangdong_border.geojson，栅格值为平滑地形加噪声/随机地类。
+"""
+import os
+
+import geopandas as gpd
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+REPO_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+GEOJSON_PATH = os.path.join(REPO_DATA, "admin_unit", "guangdong_border.geojson")
+NA_VALUE = -32768
+
+
+def load_city_gdf():
+    return gpd.read_file(GEOJSON_PATH)
+
+
+def write_city_shapefile(out_dir, gdf=None):
+    """写出只含 地级/地级码/省级 字段的 地级.shp"""
+    gdf = load_city_gdf() if gdf is None else gdf
+    path = os.path.join(out_dir, "地级.shp")
+    gdf[["地级", "地级码", "省级", "geometry"]].to_file(path, encoding="utf-8")
+    return path
+
+
+def write_synthetic_rasters(out_dir, resolution=0.003, block=256, crs="EPSG:4326", seed=1):
+    """
+    写出 dem.tif(int16, nodata=-32768) 与 landuse.tif(uint8, 类别0-9)，按行块生成以控制内存。
+    返回 (dem_path, landuse_path, (height, width))。
+    """
+    west, south, east, north = load_city_gdf().total_bounds
+    width = int((east - west) / resolution) + 2
+    height = int((north - south) / resolution) + 2
+    transform = from_origin(west - resolution, north + resolution, resolution, resolution)
+    profile = dict(driver="GTiff", height=height, width=width, count=1, crs=crs,
+                   transform=transform, tiled=True, blockxsize=block, blockysize=block)
+
+    dem_path = os.path.join(out_dir, "dem.tif")
+    landuse_path = os.path.join(out_dir, "landuse.tif")
+    rng = np.random.default_rng(seed)
+    with rasterio.open(dem_path, "w", dtype="int16", nodata=NA_VALUE, **profile) as dem_dst, \
+            rasterio.open(landuse_path, "w", dtype="uint8", nodata=0, **profile) as lu_dst:
+        for row0 in range(0, height, block):
+            rows = min(block, height - row0)
+            yy, xx = np.mgrid[row0:row0 + rows, 0:width]
+            dem = np.sin(xx / 150.0) * 300 + np.cos(yy / 90.0) * 200 + 400 + rng.normal(0, 20, (rows, width))
+            dem = dem.astype("int16")
+            if row0 == 0:
+                dem[:5, :] = NA_VALUE
+            window = rasterio.windows.Window(0, row0, width, rows)
+            dem_dst.write(dem, 1, window=window)
+            lu_dst.write(rng.integers(0, 10, (rows, width)).astype("uint8"), 1, window=window)
+    return dem_path, landuse_path, (height, width)
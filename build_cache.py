@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+# ========== 静态数据构建缓存 ==========
+# 每个派生产物(重投影栅格、GeoJSON、城市元数据……)作为一个"阶段"，
+# 以 输入文件内容哈希 + 参数哈希 作为键；键不变且产物仍在时跳过该阶段。
+# 清单(manifest)记录每个阶段的输入、参数、产物哈希与耗时，便于追溯数据来源。
+
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+# shapefile 的内容分散在多个同名文件中，任何一个变化都视为输入变化
+SHAPEFILE_SIDECARS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def params_digest(params):
+    """参数字典的稳定哈希（键排序，非JSON类型按str处理）"""
+    blob = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+class BuildCache:
+    """
+    基于内容哈希的阶段缓存。
+
+    cache = BuildCache('../data/build_manifest.json')
+    cache.run('dem_reproj', inputs=[dem_tif], params={...}, outputs=[dem_reproj_tif],
+              build=lambda: reproject_raster(...))
+
+    文件哈希按 (大小, mtime) 缓存在清单中，未改动的大文件不会被重复读取。
+    """
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.manifest = {'version': MANIFEST_VERSION, 'files': {}, 'stages': {}}
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, encoding='utf-8') as f:
+                    loaded = json.load(f)
+                if loaded.get('version') == MANIFEST_VERSION:
+                    self.manifest = loaded
+            except (ValueError, OSError) as e:
+                print(f"Warning: build manifest {manifest_path} unreadable, rebuilding all stages: {e}")
+
+    # --------- 哈希 ---------
+
+    def file_digest(self, path):
+        """单个文件的sha256，命中(大小, mtime)缓存时不重新读取"""
+        st = os.stat(path)
+        abspath = os.path.abspath(path)
+        cached = self.manifest['files'].get(abspath)
+        if cached and cached['size'] == st.st_size and cached['mtime_ns'] == st.st_mtime_ns:
+            return cached['sha256']
+        digest = _sha256_file(path)
+        self.manifest['files'][abspath] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest}
+        return digest
+
+    def path_digest(self, path):
+        """输入路径的内容哈希；.shp 会连同其配套文件一起计算"""
+        root, ext = os.path.splitext(path)
+        if ext.lower() != '.shp':
+            return self.file_digest(path)
+        parts = [f"{side}:{self.file_digest(root + side)}"
+                 for side in SHAPEFILE_SIDECARS if os.path.exists(root + side)]
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def stage_key(self, inputs, params):
+        h = hashlib.sha256()
+        for path in inputs:
+            h.update(f"{os.path.basename(path)}={self.path_digest(path)};".encode('utf-8'))
+        h.update(params_digest(params).encode('utf-8'))
+        return h.hexdigest()
+
+    # --------- 阶段 ---------
+
+    def is_fresh(self, name, key, outputs):
+        """键一致、产物都存在且未被改动时为最新"""
+        entry = self.manifest['stages'].get(name)
+        if not entry or entry.get('key') != key:
+            return False
+        for path in outputs:
+            if not os.path.exists(path) or self.file_digest(path) != entry['outputs'].get(path):
+                return False
+        return True
+
+    def run(self, name, inputs, params, outputs, build):
+        """
+        若阶段过期则调用 build() 重新生成 outputs，否则跳过。
+        返回 build() 的结果；跳过时返回上次记录的结果（需可JSON序列化，如低地阈值）。
+        """
+        missing = [p for p in inputs if not os.path.exists(p)]
+        if missing:
+            raise FileNotFoundError(f"stage '{name}' inputs not found: {missing}")
+
+        key = self.stage_key(inputs, params)
+        if self.is_fresh(name, key, outputs):
+            entry = self.manifest['stages'][name]
+            print(f"[=] {name}: 输入与参数未变化，跳过 (built {entry['built_at']})")
+            return entry.get('result')
+
+        print(f"[>] {name}: 重新构建 ...")
+        t0 = time.perf_counter()
+        result = build()
+        elapsed = time.perf_counter() - t0
+
+        self.manifest['stages'][name] = {
+            'key': key,
+            'inputs': {p: self.path_digest(p) for p in inputs},
+            'params': json.loads(json.dumps(params, ensure_ascii=False, default=str)),
+            'outputs': {p: self.file_digest(p) for p in outputs},
+            'result': result,
+            'built_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'seconds': round(elapsed, 3),
+        }
+        self.save()
+        print(f"[+] {name}: 完成，用时 {elapsed:.1f}s")
+        return result
+
+    def save(self):
+        """先写临时文件再原子替换，避免中断时留下半个清单"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
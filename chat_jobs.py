@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from file_lock import atomic_write
+
+# ========== 聊天后台任务 ==========
+# 模型回复在后台线程池中以流式方式生成，Dash回调只负责提交任务和读取已生成的部分，
+# 请求线程不会被一次完整的模型调用（数秒）占住，地图等回调不必排队等待聊天。
+# 任务状态保存在内存中；给出 job_dir 时还会定期写成JSON文件，
+# 多worker部署下轮询请求落到别的worker时也能读到（见 get）。
+# 生成中的任务文件每 heartbeat_interval 秒更新一次修改时间（等待首字期间也是）；
+# 超过 stale_after 秒未更新的未完成任务视为失败（所在worker已退出），页面不会一直轮询下去。
+
+
+class ChatJobs:
+    """
+    jobs = ChatJobs(max_workers=8, job_dir='data/chat_jobs')
+    job_id = jobs.submit(stream, *args)   # stream(*args) 逐段产出回复文本；立即返回任务ID
+    jobs.get(job_id)                      # {'text', 'done', 'error', 'first_token', 'elapsed'}，未知ID为None
+    jobs.stats()                          # 首字延迟/总耗时分位数
+
+    线程池与心跳线程在第一次提交任务时才创建，模块导入（WSGI预加载）时不启动线程。
+    """
+
+    def __init__(self, max_workers=8, job_dir=None, ttl=600.0, flush_interval=0.1,
+                 heartbeat_interval=1.0, stale_after=None, name="chat"):
+        self.job_dir = job_dir
+        self.ttl = float(ttl)
+        self.flush_interval = float(flush_interval)
+        self.heartbeat_interval = float(heartbeat_interval)
+        self.stale_after = float(stale_after) if stale_after is not None else 5 * self.heartbeat_interval
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._heartbeat = None
+        self._stopping = threading.Event()
+        self._first_token = []  # 最近完成任务的首字延迟(秒)
+        self._elapsed = []
+
+    def submit(self, stream, *args):
+        self._expire()
+        job_id = uuid.uuid4().hex
+        job = {'id': job_id, 'text': '', 'done': False, 'error': None,
+               'started': time.time(), 'first_token': None, 'elapsed': None}
+        with self._lock:
+            self._jobs[job_id] = job
+        self._flush(job)
+        self._start_heartbeat()
+        self._executor.submit(self._run, job, stream, args)
+        return job_id
+
+    def _run(self, job, stream, args):
+        t0 = time.perf_counter()
+        last_flush = 0.0
+        try:
+            for delta in stream(*args):
+                if not delta:
+                    continue
+                with self._lock:
+                    job['text'] += delta
+                    if job['first_token'] is None:
+                        job['first_token'] = time.perf_counter() - t0
+                now = time.perf_counter()
+                if now - last_flush >= self.flush_interval:
+                    self._flush(job)
+                    last_flush = now
+        except Exception as e:
+            print(f"[!] chat job {job['id']} failed: {type(e).__name__}: {e}")
+            with self._lock:
+                job['error'] = f"{type(e).__name__}: {e}"
+        finally:
+            with self._lock:
+                job['done'] = True
+                job['elapsed'] = time.perf_counter() - t0
+                if job['first_token'] is not None:
+                    self._first_token = (self._first_token + [job['first_token']])[-500:]
+                self._elapsed = (self._elapsed + [job['elapsed']])[-500:]
+            self._flush(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self._load(job_id)
+
+    # --------- 跨进程共享 ---------
+
+    def _path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.json")
+
+    def _flush(self, job):
+        if not self.job_dir:
+            return
+        with self._lock:
+            data = dict(job)
+        try:
+            with atomic_write(self._path(data['id'])) as f:
+                json.dump(data, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"Warning: could not write chat job {data['id']}: {e}")
+
+    def _load(self, job_id):
+        # 任务ID由本模块生成（32位十六进制），不是的话不去读文件
+        if not self.job_dir or len(job_id or '') != 32 or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        try:
+            with open(self._path(job_id), encoding='utf-8') as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not data.get('done') and time.time() - mtime > self.stale_after:
+            # 生成它的worker不再更新（已退出或被杀），按失败结束
+            data['done'] = True
+            data['error'] = data.get('error') or f"job stalled: no update for {time.time() - mtime:.0f} s"
+        return data
+
+    def _start_heartbeat(self):
+        if not self.job_dir:
+            return
+        with self._lock:
+            if self._heartbeat is not None:
+                return
+            self._heartbeat = threading.Thread(target=self._beat, name=f"{self.name}-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self):
+        """定期更新生成中任务文件的修改时间，供其他worker判断任务是否还活着"""
+        while not self._stopping.wait(self.heartbeat_interval):
+            with self._lock:
+                active = [k for k, job in self._jobs.items() if not job['done']]
+            for job_id in active:
+                try:
+                    os.utime(self._path(job_id))
+                except OSError:
+                    pass
+
+    def _expire(self):
+        """丢弃完成超过 ttl 秒的任务（内存与文件）"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [k for k, job in self._jobs.items() if job['done'] and job['started'] < cutoff]
+            for k in expired:
+                del self._jobs[k]
+        if not self.job_dir:
+            return
+        try:
+            names = os.listdir(self.job_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.job_dir, name)
+            try:
+                if name.endswith('.json') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        def pct(values, q):
+            if not values:
+                return None
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))], 3)
+
+        with self._lock:
+            active = sum(not job['done'] for job in self._jobs.values())
+            first, elapsed = list(self._first_token), list(self._elapsed)
+        return {'active': active, 'completed': len(elapsed),
+                'first_token_p50': pct(first, 50), 'first_token_p95': pct(first, 95),
+                'elapsed_p50': pct(elapsed, 50), 'elapsed_p95': pct(elapsed, 95)}
+
+    def shutdown(self, wait=True):
+        self._stopping.set()
+        self._executor.shutdown(wait=wait)
@@ -1,6 +1,8 @@
-import openai
-from openai import OpenAI
 import json
+import os
+import threading
+
+# openai 包导入较慢（约1秒），只在第一次真正请求模型时导入，不拖慢仪表盘进程启动
 
 # IMPORTANT: Set your OpenAI API key as an environment variable
 # or replace "YOUR_OPENAI_API_KEY" with your actual key.
@@ -9,8 +11,30 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if OPENAI_API_KEY == "YOUR_OPENAI_API_KEY" or not OPENAI_API_KEY:
     print("Warning: OpenAI API key is not configured in chatbot_service.py. Chatbot will not function.")
     # You might want to raise an error or handle this more gracefully
-else:
-    openai.api_key = OPENAI_API_KEY
+
+# OpenAI兼容接口的地址与模型；指向本地模拟服务即可离线测试（见 benchmarks/mock_openai_server.py）
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai-next.com/v1")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-2025-04-14")
+NOT_CONFIGURED_MESSAGE = "OpenAI API key not configured. Cannot connect to the assistant."
+# 共享客户端（llm_client）：总超时/连接超时(秒)、空闲连接保持时间(秒)、同时进行的请求数、可重试错误的最多重试次数
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "30"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant for a disaster risk dashboard focused on Guangdong province, China. "
+    "You are provided with the current weather and risk assessment context for selected cities. "
+    "This context includes risk levels, scores, and the specific weather data (temperature, precipitation, humidity, wind speed) that contributed to those assessments for the selected time period. "
+    "Use this information to answer user questions about weather, flood risks, and fire risks in the region. "
+    "If the user asks about a specific city in Guangdong not detailed in the immediate context, "
+    "acknowledge that you have general data for Guangdong (if true based on overall context) and try to provide a relevant answer based on the overall situation or typical patterns. "
+    "If the query is outside your scope of weather/risk in Guangdong, politely state your limitations. "
+    "Be concise and helpful. The available weather data is from OpenWeatherMap."
+    "Refer to precipitation as 'relevant period precipitation' if unsure if it's 1h or 3h, but the user knows the forecast period from 'risk_time_selection'."
+)
+
 
 def get_weather_context_for_chatbot(weather_dict, cities_meta, risk_results, risk_time_selection):
     """
@@ -71,37 +95,67 @@ def get_weather_context_for_chatbot(weather_dict, cities_meta, risk_results, ris
     return "\n".join(context_lines)
 
 
+def api_key_configured():
+    return bool(OPENAI_API_KEY) and OPENAI_API_KEY != "YOUR_OPENAI_API_KEY"
+
+
+def build_messages(user_query, weather_context):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Current Context for Guangdong Province (selected cities shown):\n{weather_context}\n\nUser Question: {user_query}"}
+    ]
+
+
+_llm_client = None
+_async_llm_client = None
+_client_lock = threading.Lock()
+
+
+def _client_options():
+    return dict(max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT_SECONDS,
+                connect_timeout=LLM_CONNECT_TIMEOUT_SECONDS, keepalive=LLM_KEEPALIVE_SECONDS,
+                max_retries=LLM_MAX_RETRIES)
+
+
+def get_llm_client():
+    """进程内共享的模型客户端（连接池、并发上限、限流重试）；第一次调用时创建"""
+    global _llm_client
+    from llm_client import LlmClient
+    with _client_lock:
+        if _llm_client is None or _llm_client.base_url != OPENAI_BASE_URL:
+            _llm_client = LlmClient(OPENAI_API_KEY, OPENAI_BASE_URL, **_client_options())
+    return _llm_client
+
+
+def get_async_llm_client():
+    """异步版共享客户端；应在同一个事件循环中使用"""
+    global _async_llm_client
+    from llm_client import AsyncLlmClient
+    with _client_lock:
+        if _async_llm_client is None or _async_llm_client.base_url != OPENAI_BASE_URL:
+            _async_llm_client = AsyncLlmClient(OPENAI_API_KEY, OPENAI_BASE_URL, **_client_options())
+    return _async_llm_client
+
+
+def llm_stats():
+    """共享客户端的调用统计（次数、重试、限流、耗时与首字延迟分位数）"""
+    return {name: client.stats.summary() for name, client in (("sync", _llm_client), ("async", _async_llm_client))
+            if client is not None}
+
+
+def _request(user_query, weather_context):
+    return dict(model=OPENAI_MODEL, messages=build_messages(user_query, weather_context),
+                temperature=0.7, max_tokens=250) # Increased slightly for potentially more detailed answers
+
+
 def get_chatbot_response(user_query, weather_context):
-    if not openai.api_key or openai.api_key == "YOUR_OPENAI_API_KEY": # Check if API key is placeholder
-        return "OpenAI API key not configured. Cannot connect to the assistant."
+    if not api_key_configured(): # Check if API key is placeholder
+        return NOT_CONFIGURED_MESSAGE
+
+    import openai
 
     try:
-        system_prompt = (
-            "You are a helpful assistant for a disaster risk dashboard focused on Guangdong province, China. "
-            "You are provided with the current weather and risk assessment context for selected cities. "
-            "This context includes risk levels, scores, and the specific weather data (temperature, precipitation, humidity, wind speed) that contributed to those assessments for the selected time period. "
-            "Use this information to answer user questions about weather, flood risks, and fire risks in the region. "
-            "If the user asks about a specific city in Guangdong not detailed in the immediate context, "
-            "acknowledge that you have general data for Guangdong (if true based on overall context) and try to provide a relevant answer based on the overall situation or typical patterns. "
-            "If the query is outside your scope of weather/risk in Guangdong, politely state your limitations. "
-            "Be concise and helpful. The available weather data is from OpenWeatherMap."
-            "Refer to precipitation as 'relevant period precipitation' if unsure if it's 1h or 3h, but the user knows the forecast period from 'risk_time_selection'."
-        )
-        # Using the provided API key and base URL
-        api_key = OPENAI_API_KEY # Ensured it's not the placeholder
-        api_base = "https://api.openai-next.com/v1"
-        client = OpenAI(api_key=api_key, base_url=api_base)
-
-        completion = client.chat.completions.create(
-            model="gpt-4.1-2025-04-14", # User-specified model
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Current Context for Guangdong Province (selected cities shown):\n{weather_context}\n\nUser Question: {user_query}"}
-            ],
-            temperature=0.7,
-            max_tokens=250 # Increased slightly for potentially more detailed answers
-        )
-        return completion.choices[0].message.content
+        return get_llm_client().complete(**_request(user_query, weather_context))
     except openai.APIError as e:
         print(f"OpenAI API Error: {e}")
         return f"Sorry, I encountered an error trying to connect to the assistant: {e}"
@@ -109,6 +163,63 @@ def get_chatbot_response(user_query, weather_context):
         print(f"An unexpected error occurred: {e}")
         return "Sorry, an unexpected error occurred while processing your request."
 
+
+def stream_chatbot_response(user_query, weather_context):
+    """
+    与 get_chatbot_response 相同的请求，但以 stream=True 逐段产出回复文本，
+    第一段在模型生成出首个token后即可显示。出错时产出一条错误提示（已产出的部分保留）。
+    """
+    if not api_key_configured():
+        yield NOT_CONFIGURED_MESSAGE
+        return
+
+    import openai
+
+    try:
+        yield from get_llm_client().stream(**_request(user_query, weather_context))
+    except openai.APIError as e:
+        print(f"OpenAI API Error: {e}")
+        yield f"Sorry, I encountered an error trying to connect to the assistant: {e}"
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        yield "Sorry, an unexpected error occurred while processing your request."
+
+
+async def async_get_chatbot_response(user_query, weather_context):
+    """get_chatbot_response 的异步版本，经共享的异步客户端"""
+    if not api_key_configured():
+        return NOT_CONFIGURED_MESSAGE
+
+    import openai
+
+    try:
+        return await get_async_llm_client().complete(**_request(user_query, weather_context))
+    except openai.APIError as e:
+        print(f"OpenAI API Error: {e}")
+        return f"Sorry, I encountered an error trying to connect to the assistant: {e}"
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return "Sorry, an unexpected error occurred while processing your request."
+
+
+async def async_stream_chatbot_response(user_query, weather_context):
+    """stream_chatbot_response 的异步版本"""
+    if not api_key_configured():
+        yield NOT_CONFIGURED_MESSAGE
+        return
+
+    import openai
+
+    try:
+        async for delta in get_async_llm_client().stream(**_request(user_query, weather_context)):
+            yield delta
+    except openai.APIError as e:
+        print(f"OpenAI API Error: {e}")
+        yield f"Sorry, I encountered an error trying to connect to the assistant: {e}"
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        yield "Sorry, an unexpected error occurred while processing your request."
+
 if __name__ == '__main__':
     # This is for testing the chatbot service directly
     sample_weather_dict = { # Still useful for broader context if chatbot needs it, though not primary for risk explanation
@@ -147,7 +258,7 @@ if __name__ == '__main__':
     print("---- Context for Chatbot ----")
     print(test_context)
     print("\n---- Chatbot Test Response ----")
-    if OPENAI_API_KEY != "YOUR_OPENAI_API_KEY" and OPENAI_API_KEY: # Check again for safety
+    if api_key_configured(): # Check again for safety
         test_query = "What is the flood risk in Guangzhou and why? What's the temperature there?"
         response = get_chatbot_response(test_query, test_context)
         print(f"Q: {test_query}\nA: {response}")
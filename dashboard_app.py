@@ -1,20 +1,55 @@
 import dash
-from dash import dcc, html, Input, Output, State, ctx # Added State and ctx
-import plotly.express as px
+from dash import dcc, html, Input, Output, State, ctx, Patch # Added State and ctx
+import plotly.graph_objects as go
 import pandas as pd
 import json
 from data_fetcher import update_weather_json # (modified to be callable)
-from risk_model import estimate_region_risk #
+from owm_parse import FORECAST_HOURS, forecast_time
+from risk_model import estimate_region_risk, precompute_risk, load_risk_table, risk_table_to_results, RISK_TIMES, WEATHER_FIELDS, estimate_series_risk, risk_level_name #
 from ui_theme import dashboard_theme #
-from chatbot_service import get_chatbot_response, get_weather_context_for_chatbot # New import
+from chatbot_service import stream_chatbot_response, get_weather_context_for_chatbot # New import
+from chat_jobs import ChatJobs
 import os
 import time # For refresh button logic
+import threading
+from collections import OrderedDict
+from weather_store import get_weather_store, file_stamp
+from refresh_scheduler import RefreshScheduler
+from weather_archive import get_weather_archive, weather_archive_path
+import numpy as np
+from datetime import datetime, timedelta, timezone
+import gzip
+import hashlib
+import uuid
+import flask
 
 # --- Global Variables & Initial Data Loading ---
-DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+DATA_DIR = os.getenv('GUANGDONG_DATA_DIR', os.path.join(os.path.dirname(__file__), '..', 'data'))
 GUANGDONG_CITIES_META_FILE = os.path.join(DATA_DIR, 'admin_unit', 'guangdong_cities_meta.json')
 GUANGDONG_GEOJSON_FILE = os.path.join(DATA_DIR, 'admin_unit', 'guangdong_border.geojson')
 GUANGDONG_WEATHER_FILE = os.path.join(DATA_DIR, 'guangdong_weather.json')
+GUANGDONG_RISK_FILE = os.path.join(DATA_DIR, 'guangdong_risk.npz') # 全部时刻的风险快照
+# 地图使用的简化边界级别（preprocess_static_data.GEOJSON_SIMPLIFY_LEVELS: 5/7/9）
+MAP_GEOJSON_ZOOM = int(os.getenv('MAP_GEOJSON_ZOOM', '7'))
+MAP_GEOJSON_FILE = os.path.join(DATA_DIR, 'admin_unit', f'guangdong_border_z{MAP_GEOJSON_ZOOM}.geojson')
+MAP_GEOJSON_URL = f'/geo/guangdong_border_z{MAP_GEOJSON_ZOOM}.geojson'
+GUANGDONG_WEATHER_ARCHIVE = weather_archive_path(GUANGDONG_WEATHER_FILE) # 历史天气归档 (SQLite)
+HISTORY_DAYS = int(os.getenv('HISTORY_DAYS', '7')) # 城市历史曲线显示的天数
+# update_weather_json 写入 <base_path>/data/，这里取 DATA_DIR 的上一级
+DATA_BASE_PATH = os.path.dirname(os.path.abspath(DATA_DIR))
+# 后台定时刷新：间隔/抖动/失败重试的初始等待与上限(秒)；间隔为0时只在点击刷新时抓取
+REFRESH_INTERVAL_SECONDS = float(os.getenv('REFRESH_INTERVAL_SECONDS', '1800'))
+REFRESH_JITTER_SECONDS = float(os.getenv('REFRESH_JITTER_SECONDS', '60'))
+REFRESH_RETRY_SECONDS = float(os.getenv('REFRESH_RETRY_SECONDS', '30'))
+REFRESH_MAX_BACKOFF_SECONDS = float(os.getenv('REFRESH_MAX_BACKOFF_SECONDS', '1800'))
+DATA_VERSION_POLL_MS = int(os.getenv('DATA_VERSION_POLL_MS', '5000')) # 页面轮询数据版本的间隔
+# 多个worker各有自己的定时器：定时触发时天气文件比这更新（其他worker刚刷新过）则跳过抓取，只更新风险快照
+REFRESH_MIN_AGE_SECONDS = float(os.getenv('REFRESH_MIN_AGE_SECONDS', str(REFRESH_INTERVAL_SECONDS / 2)))
+SNAPSHOT_HISTORY = int(os.getenv('SNAPSHOT_HISTORY', '4')) # 保留最近几个风险快照，供仍显示旧数据的页面按ID取用
+# 聊天回复在后台流式生成：页面轮询已生成部分的间隔、同时进行的模型请求数、跨worker共享任务状态的目录
+CHAT_POLL_MS = int(os.getenv('CHAT_POLL_MS', '200'))
+CHAT_MAX_CONCURRENCY = int(os.getenv('CHAT_MAX_CONCURRENCY', '8'))
+CHAT_JOB_DIR = os.getenv('CHAT_JOB_DIR', os.path.join(DATA_DIR, 'chat_jobs'))
 
 # Ensure data files exist or try to create them
 if not os.path.exists(GUANGDONG_CITIES_META_FILE) or not os.path.exists(GUANGDONG_GEOJSON_FILE):
@@ -37,35 +72,146 @@ except FileNotFoundError:
     print(f"ERROR: {GUANGDONG_CITIES_META_FILE} not found. Please run `preprocess_static_data.py`.")
     cities_meta = [] # Fallback to empty list
 
+# 地图边界：读取预先简化、序列化好的GeoJSON字节（找不到简化版本时退回全分辨率文件），
+# 启动时只读一次并预先gzip；图形中以URL引用，浏览器只下载一次并可缓存，回调只下发着色数据
+geojson_source = MAP_GEOJSON_FILE if os.path.exists(MAP_GEOJSON_FILE) else GUANGDONG_GEOJSON_FILE
 try:
-    with open(GUANGDONG_GEOJSON_FILE, 'r', encoding='utf-8') as f:
-        geojson = json.load(f) #
+    with open(geojson_source, 'rb') as f:
+        geojson_bytes = f.read()
 except FileNotFoundError:
     print(f"ERROR: {GUANGDONG_GEOJSON_FILE} not found. Please run `preprocess_static_data.py`.")
-    geojson = {"type": "FeatureCollection", "features": []} # Fallback
+    geojson_bytes = json.dumps({"type": "FeatureCollection", "features": []}).encode('utf-8') # Fallback
+geojson_gzip = gzip.compress(geojson_bytes, compresslevel=9)
+geojson_etag = hashlib.sha1(geojson_bytes).hexdigest()
+map_geojson = MAP_GEOJSON_URL # 传给 choropleth_mapbox 的 geojson（URL或dict）
 
 cities_meta_dict = {c['city_name']: c for c in cities_meta} if cities_meta else {}
 city_list = [c['city_name'] for c in cities_meta] if cities_meta else []
 
-# Initial weather data load or update
-if not os.path.exists(GUANGDONG_WEATHER_FILE) or (os.path.exists(GUANGDONG_WEATHER_FILE) and os.path.getsize(GUANGDONG_WEATHER_FILE) < 100): # check if file is too small/empty
-    print("Weather data file not found or empty, attempting to fetch initial data...")
-    # Determine base path correctly. If dashboard_app.py is in project root, base_path is "."
-    # If it's in a subfolder like 'app', base_path might be ".."
-    # Assuming dashboard_app.py is at the same level as the 'data' folder parent (e.g. in project_root/app/)
-    project_root_for_data_fetcher = os.path.join(os.path.dirname(__file__), '..')
-    update_weather_json(base_path=project_root_for_data_fetcher)
-
-
-risk_time_options = [
-    {'label': '现在 (Now)', 'value': 'now'},
-    {'label': '3小时预报 (3h Fcst)', 'value': 'forecast-3h'},
-    {'label': '6小时预报 (6h Fcst)', 'value': 'forecast-6h'},
-    {'label': '12小时预报 (12h Fcst)', 'value': 'forecast-12h'},
-    {'label': '24小时预报 (24h Fcst)', 'value': 'forecast-24h'},
-    {'label': '48小时预报 (48h Fcst)', 'value': 'forecast-48h'},
-    {'label': '72小时预报 (72h Fcst)', 'value': 'forecast-72h'},
+# 以上静态数据在导入时加载一次；WSGI服务器预加载(preload)后由各worker以写时复制共享。
+# 导入时不再抓取天气：天气文件缺失时，由各worker的后台刷新在启动后立即抓取一次（见 refresh_scheduler）。
+def weather_data_available():
+    """天气文件存在且非空（过小视为占位文件）"""
+    return os.path.exists(GUANGDONG_WEATHER_FILE) and os.path.getsize(GUANGDONG_WEATHER_FILE) >= 100 # check if file is too small/empty
+
+
+# --- Risk Snapshot ---
+# 每次天气数据更新后一次性计算 now 与全部预报时刻的风险；回调只做查表。
+# 天气数据经 WeatherStore 读取，文件(mtime, size)变化时（如外部定时任务刷新）才重新解析并重算一次。
+# 快照发布后不再修改；浏览器端的 Store 只保存快照ID，服务端按ID取回同一份快照。
+weather_store = get_weather_store(GUANGDONG_WEATHER_FILE)
+_risk_snapshot = None
+_risk_snapshot_lock = threading.Lock()
+_snapshot_history = OrderedDict()  # 快照ID -> 快照，最近发布的在末尾
+
+
+def snapshot_id(stamp):
+    """天气文件 (mtime_ns, size) -> 快照ID，与 data_version() 的格式相同"""
+    return "{}-{}".format(*stamp)
+
+
+def publish_risk_snapshot(weather_dict, stamp, table=None):
+    """预计算(或使用已有的table)全部时刻风险并替换当前快照；新算的快照同时写入磁盘"""
+    global _risk_snapshot
+    if table is None:
+        table, results_by_time = precompute_risk(cities_meta, weather_dict, GUANGDONG_RISK_FILE, stamp)
+    else:
+        results_by_time = {t: risk_table_to_results(table, t, warn=False) for t in table["weather_times"]}
+    snapshot = {
+        "id": snapshot_id(stamp),
+        "stamp": stamp,
+        "weather_dict": weather_dict,
+        "table": table,
+        "results": results_by_time,
+    }
+    _snapshot_history[snapshot["id"]] = snapshot
+    _snapshot_history.move_to_end(snapshot["id"])
+    while len(_snapshot_history) > max(1, SNAPSHOT_HISTORY):
+        _snapshot_history.popitem(last=False)
+    _risk_snapshot = snapshot
+    return snapshot
+
+
+def resolve_snapshot(snapshot_id):
+    """
+    按ID取回已发布的快照；ID未知（已被淘汰、由其他进程发布或为空）时返回当前最新快照。
+    异常同 get_risk_snapshot。
+    """
+    snapshot = _snapshot_history.get(snapshot_id) if snapshot_id else None
+    return snapshot if snapshot is not None else get_risk_snapshot()
+
+
+def get_risk_snapshot():
+    """
+    返回与当前天气文件一致的风险快照。
+    文件不存在抛 FileNotFoundError，内容损坏抛 json.JSONDecodeError。
+    """
+    weather_dict, stamp = weather_store.snapshot()
+    snapshot = _risk_snapshot
+    if snapshot is not None and snapshot["stamp"] == stamp:
+        return snapshot
+    with _risk_snapshot_lock:
+        snapshot = _risk_snapshot
+        if snapshot is not None and snapshot["stamp"] == stamp:
+            return snapshot
+        # 磁盘上已有同一份天气数据的快照（如其他进程刚算过）则直接复用
+        table = None
+        if os.path.exists(GUANGDONG_RISK_FILE):
+            try:
+                disk_table, disk_stamp = load_risk_table(GUANGDONG_RISK_FILE)
+                # 时刻不同（FORECAST_HOURS 改过）时重新计算
+                if (disk_stamp == stamp and disk_table["city_name"] == city_list
+                        and disk_table["weather_times"] == list(RISK_TIMES)):
+                    table = disk_table
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: could not read risk snapshot {GUANGDONG_RISK_FILE}: {e}")
+        return publish_risk_snapshot(weather_dict, stamp, table)
+
+
+# --- Background Refresh ---
+def refresh_job():
+    """后台刷新：抓取天气 → 预计算全部时刻风险 → 发布快照"""
+    if (refresh_scheduler.trigger == 'scheduled' and weather_data_available()
+            and time.time() - os.path.getmtime(GUANGDONG_WEATHER_FILE) < REFRESH_MIN_AGE_SECONDS):
+        print("[*] Weather file was refreshed recently (another worker?), skipping the fetch")
+        get_risk_snapshot()
+        return
+    weather = update_weather_json(base_path=DATA_BASE_PATH)
+    if city_list and not any((weather.get(c) or {}).get('weather', {}).get('now') for c in city_list):
+        raise RuntimeError("no city returned current weather")  # 触发退避重试
+    get_risk_snapshot()
+
+
+refresh_scheduler = RefreshScheduler(
+    refresh_job, interval=REFRESH_INTERVAL_SECONDS, jitter=REFRESH_JITTER_SECONDS,
+    retry_delay=REFRESH_RETRY_SECONDS, max_backoff=REFRESH_MAX_BACKOFF_SECONDS,
+    run_on_start=not weather_data_available()) # 没有天气数据时，后台线程启动后立即抓取
+chat_jobs = ChatJobs(max_workers=CHAT_MAX_CONCURRENCY, job_dir=CHAT_JOB_DIR) # 聊天回复的后台任务
+
+
+def start_background_tasks():
+    """
+    在每个服务进程中调用一次，启动后台定时刷新线程（重复调用无影响）。
+    线程不能跨fork，preload模式下由 gunicorn.conf.py 的 post_worker_init 钩子在各worker中调用；
+    直接运行本文件时在启动服务前调用。不依赖有页面打开，定时刷新照常进行。
+    """
+    refresh_scheduler.start()
+
+
+def data_version():
+    """当前天气数据的版本标识（文件 mtime_ns-size）；文件不存在时为None"""
+    try:
+        return snapshot_id(file_stamp(GUANGDONG_WEATHER_FILE))
+    except FileNotFoundError:
+        return None
+
+
+# 下拉选项与预计算的时刻一致，由 FORECAST_HOURS 决定
+risk_time_options = [{'label': '现在 (Now)', 'value': 'now'}] + [
+    {'label': f'{h:g}小时预报 ({h:g}h Fcst)', 'value': forecast_time(h)} for h in FORECAST_HOURS
 ]
+# 默认显示24小时预报；未配置该时效时取第一个预报时效
+DEFAULT_RISK_TIME = forecast_time(24) if 24 in FORECAST_HOURS else forecast_time(FORECAST_HOURS[0])
 
 def build_dataframe(risk_results, disaster_type="flood"): #
     records = []
@@ -92,256 +238,424 @@ def build_dataframe(risk_results, disaster_type="flood"): #
         records.append(record)
     return pd.DataFrame(records)
 
-app = dash.Dash(__name__, external_stylesheets=dashboard_theme) #
-app.title = "粤港澳灾害风险仪表盘 (Guangdong Risk Dashboard)"
+# --- Base Map Figure (built once) ---
+# 图形结构（边界、底图、图例、悬停格式）在启动时构建一次；回调只用Patch更新各等级的城市列表与悬停数据
+RISK_LEVEL_COLORS = { #
+    "极低风险": "#5abaff",
+    "低风险": "#56bb6c",
+    "中风险": "#efcb67",
+    "高风险": "#ec5736",
+    "极高风险": "#ad1457",
+    "未知": "#cccccc" # Added a color for unknown status
+}
+RISK_LEVEL_ORDER = list(RISK_LEVEL_COLORS) # 图例顺序，每个等级一条trace
+MAP_HOVER_FIELDS = ["风险等级", "风险指数", "降水(mm)", "温度(°C)", "湿度(%)", "风速(m/s)"]
+
+
+def build_base_figure():
+    fig = go.Figure()
+    hovertemplate = "<b>%{location}</b><br><br>" + "<br>".join(
+        f"{name}=%{{customdata[{i}]}}" for i, name in enumerate(MAP_HOVER_FIELDS)) + "<extra></extra>"
+    for level, color in RISK_LEVEL_COLORS.items():
+        fig.add_trace(go.Choroplethmapbox(
+            geojson=map_geojson, featureidkey="properties.地级", #
+            locations=[], z=[], customdata=[],
+            name=level, legendgroup=level, showlegend=True, showscale=False,
+            colorscale=[[0, color], [1, color]], zmin=0, zmax=1,
+            marker_opacity=0.7, marker_line_width=0.5, marker_line_color='white', # (changed line color and width)
+            hovertemplate=hovertemplate
+        ))
+    fig.update_layout(
+        mapbox_style="carto-positron", # Using a different mapbox style for potentially better visuals
+        mapbox_zoom=6, #
+        mapbox_center={"lat": 23.5, "lon": 113.3}, #
+        legend_title_text='风险等级 (Risk Level)', #
+        margin={"r":0,"t":40,"l":0,"b":0}, title_x=0.5,
+        uirevision='risk-map' # 保留用户的平移/缩放
+    )
+    return fig
+
+
+def _fmt(x, spec):
+    return format(x, spec) if pd.notnull(x) else "N/A"
+
+
+def map_patch(df=None, tab_value="flood", title=""):
+    """生成只包含各等级城市、悬停数据与标题的Patch"""
+    patch = Patch()
+    patch['layout']['title']['text'] = title
+    groups = {level: ([], []) for level in RISK_LEVEL_ORDER}
+    if df is not None and not df.empty:
+        map_color_col = 'flood_risk_level' if tab_value == 'flood' else 'fire_risk_level'
+        map_score_col = 'flood_score' if tab_value == 'flood' else 'fire_score'
+        for row in df.itertuples(index=False):
+            level = getattr(row, map_color_col)
+            locations, customdata = groups[level if level in groups else "未知"]
+            locations.append(row.city)
+            customdata.append([
+                level,
+                _fmt(getattr(row, map_score_col), ".2f"),
+                _fmt(row.precip, ".1f"),
+                _fmt(row.temperature, ".1f"),
+                _fmt(row.humidity, ".0f"),
+                _fmt(row.wind_speed, ".1f"),
+            ])
+    for i, level in enumerate(RISK_LEVEL_ORDER):
+        locations, customdata = groups[level]
+        patch['data'][i]['locations'] = locations
+        patch['data'][i]['z'] = [0] * len(locations)
+        patch['data'][i]['customdata'] = customdata
+    return patch
+
+
+# --- City History Figure ---
+# 点击地图上的城市后，从归档库中按城市 + 时间范围取出实况序列与最近一次预报，计算风险分数曲线。
+# 归档只保存天气；风险按当前的模型、静态因子与阈值重新计算，模型或静态数据更新后历史曲线也随之变化。
+BJ_TZ = timezone(timedelta(hours=8))
+
+
+def _bj_times(unix_seconds):
+    return [datetime.fromtimestamp(int(t), BJ_TZ) for t in unix_seconds]
+
+
+def build_history_figure(city=None, tab_value="flood", days=HISTORY_DAYS):
+    fig = go.Figure()
+    score_key = 'flood_score' if tab_value == 'flood' else 'fire_score'
+    label = '洪水' if tab_value == 'flood' else '火灾'
+    fig.update_layout(margin={"r": 10, "t": 40, "l": 40, "b": 30}, title_x=0.5,
+                      yaxis_title=f'{label}风险分数', showlegend=True,
+                      legend={"orientation": "h", "y": -0.2})
+    if not city:
+        fig.update_layout(title_text='点击地图上的城市查看风险历史 (Click a city for its risk history)')
+        return fig
+    if city not in cities_meta_dict or not os.path.exists(GUANGDONG_WEATHER_ARCHIVE):
+        fig.update_layout(title_text=f'{city}: 暂无历史数据 (No history yet)')
+        return fig
+
+    archive = get_weather_archive(GUANGDONG_WEATHER_ARCHIVE)
+    end = time.time()
+    observed = archive.city_history(city, start=end - days * 86400, end=end, horizons=('now',))
+    latest = archive.latest_issue_time(city)
+    forecast = archive.city_history(city, start=latest, end=latest, horizons=RISK_TIMES) if latest else None
+
+    for name, hist, dash_style in (('实况 (Observed)', observed, 'solid'),
+                                   ('最新预报 (Latest forecast)', forecast, 'dash')):
+        if hist is None or not len(hist['valid_time']):
+            continue
+        weather_values = np.stack([hist[field] for field in WEATHER_FIELDS], axis=-1)
+        risk = estimate_series_risk(cities_meta_dict[city], weather_values)
+        fig.add_trace(go.Scatter(
+            x=_bj_times(hist['valid_time']), y=risk[score_key], name=name, mode='lines+markers',
+            line={'dash': dash_style},
+            text=[risk_level_name(level) for level in risk[score_key.replace('score', 'level')]],
+            hovertemplate='%{x|%m-%d %H:%M}<br>%{y:.2f} (%{text})<extra></extra>'
+        ))
+    fig.update_layout(title_text=f'{city} {label}风险 - 近{days}天 (Risk history)'
+                                 '<br><sup>按当前模型由归档天气重新计算 (recomputed from archived weather)</sup>')
+    return fig
+
+
+base_figure = build_base_figure()
+
+
+def serve_map_geojson():
+    """下发预序列化的边界GeoJSON，支持gzip与ETag条件请求"""
+    use_gzip = 'gzip' in flask.request.headers.get('Accept-Encoding', '')
+    response = flask.Response(geojson_gzip if use_gzip else geojson_bytes, mimetype='application/geo+json')
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    response.set_etag(geojson_etag)
+    return response.make_conditional(flask.request)
 
 # --- App Layout ---
-app.layout = html.Div([
-    # Hidden div to store current weather/risk data as JSON for the chatbot
-    dcc.Store(id='current-weather-risk-data-store'),
-
-    html.Div([ # Main container for a more structured layout
-        # Header
-        html.Div(
-            html.H1("粤港澳气象灾害风险分析平台 (Guangdong Meteorological Disaster Risk Analysis Platform)", 
-                    style={'textAlign': 'center', 'color': '#333', 'padding': '20px 0', 'borderBottom': '2px solid #007bff'}),
-            style={'marginBottom': '20px'}
-        ),
-
-        # App content: Controls on left, Map on right
-        html.Div([
-            # Left Control Panel
+# 每次加载页面时生成，data-version 取当前值（而不是进程启动时的值）
+def serve_layout():
+    return html.Div([
+        # 地图当前显示的风险快照ID（天气/风险数据留在服务端），供聊天回调取用同一份数据
+        dcc.Store(id='current-weather-risk-data-store'),
+        # 当前天气数据版本；后台刷新完成后由轮询更新，驱动地图与历史曲线重绘
+        dcc.Store(id='data-version', data=data_version()),
+        dcc.Interval(id='data-version-poll', interval=DATA_VERSION_POLL_MS),
+        # 正在生成的聊天回复：任务ID与已显示的回复长度；生成期间启用轮询
+        dcc.Store(id='chat-job'),
+        # 新增的聊天文字，由浏览器端回调接到聊天记录末尾（完整记录不在请求中往返）
+        dcc.Store(id='chat-delta'),
+        dcc.Interval(id='chat-stream-poll', interval=CHAT_POLL_MS, disabled=True),
+
+        html.Div([ # Main container for a more structured layout
+            # Header
+            html.Div(
+                html.H1("粤港澳气象灾害风险分析平台 (Guangdong Meteorological Disaster Risk Analysis Platform)", 
+                        style={'textAlign': 'center', 'color': '#333', 'padding': '20px 0', 'borderBottom': '2px solid #007bff'}),
+                style={'marginBottom': '20px'}
+            ),
+
+            # App content: Controls on left, Map on right
             html.Div([
-                dcc.Tabs(id="disaster-tabs", value="flood", children=[
-                    dcc.Tab(label="洪灾风险分析 (Flood Risk)", value="flood"),
-                    dcc.Tab(label="火灾风险分析 (Fire Risk)", value="fire")
-                ], style={'marginBottom': '20px'}),
+                # Left Control Panel
+                html.Div([
+                    dcc.Tabs(id="disaster-tabs", value="flood", children=[
+                        dcc.Tab(label="洪灾风险分析 (Flood Risk)", value="flood"),
+                        dcc.Tab(label="火灾风险分析 (Fire Risk)", value="fire")
+                    ], style={'marginBottom': '20px'}),
                 
-                html.H4("数据与显示控制 (Controls)", style={'marginTop': '0px'}),
-                dcc.Dropdown(
-                    id='risk-time',
-                    options=risk_time_options,
-                    value='forecast-24h', #
-                    clearable=False,
-                    style={'marginBottom': '15px'}
-                ),
-                html.Button('更新实时数据 (Refresh Live Data)', id='refresh-btn', n_clicks=0, className='button', style={'width': '100%', 'marginBottom': '20px'}),
-
-                # Chatbot Area
+                    html.H4("数据与显示控制 (Controls)", style={'marginTop': '0px'}),
+                    dcc.Dropdown(
+                        id='risk-time',
+                        options=risk_time_options,
+                        value=DEFAULT_RISK_TIME, #
+                        clearable=False,
+                        style={'marginBottom': '15px'}
+                    ),
+                    html.Button('更新实时数据 (Refresh Live Data)', id='refresh-btn', n_clicks=0, className='button', style={'width': '100%', 'marginBottom': '5px'}),
+                    html.Div(id='refresh-status', style={'fontSize': '12px', 'color': '#666', 'marginBottom': '15px'}),
+
+                    # Chatbot Area
+                    html.Div([
+                        html.H4("智能助手 (Smart Assistant)", style={'marginTop': '10px', 'marginBottom': '10px'}),
+                        # 回复逐段写入聊天记录，不再整块显示加载动画
+                        html.Div(id='chat-history-container', children=[
+                            dcc.Textarea(
+                                id='chat-history',
+                                value="助手: 您好！我可以根据当前数据显示的广东省天气和风险情况，回答您的问题。\n",
+                                readOnly=True,
+                                style={'width': '100%', 'height': '250px', 'marginBottom': '10px', 'resize': 'none'}
+                            )
+                        ]),
+                        dcc.Input(
+                            id='chat-input', 
+                            type='text', 
+                            placeholder='咨询天气、风险或相关建议...', # (original was search-box)
+                            style={'width': 'calc(80% - 10px)', 'marginRight': '10px', 'padding': '10px'}
+                        ),
+                        html.Button('发送 (Send)', id='chat-send-btn', n_clicks=0, className='button', style={'width': '20%', 'padding': '10px'})
+                    ], style={"marginTop": "20px", "padding": "15px", "border": "1px solid #ddd", "borderRadius": "5px", "backgroundColor": "#f9f9f9"})
+
+                ], className="control-panel", style={"width": "30%", "display": "inline-block", "verticalAlign": "top", "padding": "20px", "boxSizing": "border-box"}), # Adjusted width
+            
+                # Right Map Panel
                 html.Div([
-                    html.H4("智能助手 (Smart Assistant)", style={'marginTop': '10px', 'marginBottom': '10px'}),
-                    dcc.Loading( # Loading indicator for chat responses
-                        id="loading-chat",
+                    dcc.Loading( # Loading indicator for the map
+                        id="loading-map",
                         type="default",
-                        children=[
-                            html.Div(id='chat-history-container', children=[
-                                dcc.Textarea(
-                                    id='chat-history',
-                                    value="助手: 您好！我可以根据当前数据显示的广东省天气和风险情况，回答您的问题。\n",
-                                    readOnly=True,
-                                    style={'width': '100%', 'height': '250px', 'marginBottom': '10px', 'resize': 'none'}
-                                )
-                            ])
-                        ]
-                    ),
-                    dcc.Input(
-                        id='chat-input', 
-                        type='text', 
-                        placeholder='咨询天气、风险或相关建议...', # (original was search-box)
-                        style={'width': 'calc(80% - 10px)', 'marginRight': '10px', 'padding': '10px'}
+                        children=dcc.Graph(id='risk-map', figure=base_figure, style={'height': 'calc(100vh - 450px)', 'minHeight': '400px'}) # Adjusted height
                     ),
-                    html.Button('发送 (Send)', id='chat-send-btn', n_clicks=0, className='button', style={'width': '20%', 'padding': '10px'})
-                ], style={"marginTop": "20px", "padding": "15px", "border": "1px solid #ddd", "borderRadius": "5px", "backgroundColor": "#f9f9f9"})
-
-            ], className="control-panel", style={"width": "30%", "display": "inline-block", "verticalAlign": "top", "padding": "20px", "boxSizing": "border-box"}), # Adjusted width
-            
-            # Right Map Panel
-            html.Div([
-                dcc.Loading( # Loading indicator for the map
-                    id="loading-map",
-                    type="default",
-                    children=dcc.Graph(id='risk-map', style={'height': 'calc(100vh - 150px)'}) # Adjusted height
-                )
-            ], className="map-panel", style={"width": "68%", "display": "inline-block", "verticalAlign": "top", "padding": "20px", "boxSizing": "border-box", "marginLeft": "2%"})
+                    dcc.Graph(id='city-history', figure=build_history_figure(), style={'height': '280px'})
+                ], className="map-panel", style={"width": "68%", "display": "inline-block", "verticalAlign": "top", "padding": "20px", "boxSizing": "border-box", "marginLeft": "2%"})
 
-        ], style={'display': 'flex', 'flexDirection': 'row'})
-    ], style={'padding': '0 20px'}) # Overall page padding
-])
+            ], style={'display': 'flex', 'flexDirection': 'row'})
+        ], style={'padding': '0 20px'}) # Overall page padding
+    ])
 
 
 # --- Callbacks ---
+# 回调在模块中声明、在 create_app() 时注册到新建的应用实例上（应用工厂）
+_callbacks = []
+
+
+def callback(*args, **kwargs):
+    """参数与 app.callback 相同；只记录下来，由 create_app() 注册"""
+    def decorator(func):
+        _callbacks.append((args, kwargs, func))
+        return func
+    return decorator
+
 
 # Callback to update map and store data for chatbot
-@app.callback(
+@callback(
     [Output('risk-map', 'figure'),
      Output('current-weather-risk-data-store', 'data')],
     [Input('disaster-tabs', 'value'),
      Input('risk-time', 'value'),
-     Input('refresh-btn', 'n_clicks')]
+     Input('data-version', 'data')]
 )
-def update_map_and_store_data(tab_value, risk_time_value, refresh_clicks):
-    changed_id = [p['prop_id'] for p in dash.callback_context.triggered][0]
-    
+def update_map_and_store_data(tab_value, risk_time_value, version):
     weather_dict_path = GUANGDONG_WEATHER_FILE
-    
-    # If refresh button was clicked, update weather data
-    if 'refresh-btn' in changed_id:
-        print("Refresh button clicked. Updating weather data...")
-        # Determine base path correctly for data_fetcher
-        project_root_for_data_fetcher = os.path.join(os.path.dirname(__file__), '..')
-        update_weather_json(base_path=project_root_for_data_fetcher)
-        # Add a small delay to ensure file system has updated
-        time.sleep(1) 
-        print("Weather data update complete.")
-
-    # 1. Load (potentially updated) weather data
+
+    # 1. Look up the precomputed weather/risk snapshot (recomputed right after a refresh,
+    #    or when the weather file changed on disk)
     try:
-        with open(weather_dict_path, 'r', encoding="utf-8") as f:
-            weather_dict = json.load(f) #
+        snapshot = get_risk_snapshot()
     except FileNotFoundError:
         print(f"Error: {weather_dict_path} not found. Returning empty map and data.")
-        fig = px.choropleth_mapbox() # Empty figure
-        fig.update_layout(
-            mapbox_style="carto-positron",
-            mapbox_zoom=5,
-            mapbox_center={"lat": 23.5, "lon": 113.3},
-            title_text="数据加载失败 (Data Loading Failed)",
-            height=800
-        )
-        return fig, {}
+        return map_patch(title="数据加载失败 (Data Loading Failed)"), None
     except json.JSONDecodeError:
         print(f"Error: Could not decode JSON from {weather_dict_path}. File might be corrupted or empty.")
-        fig = px.choropleth_mapbox() # Empty figure
-        fig.update_layout(
-            mapbox_style="carto-positron",
-            mapbox_zoom=5,
-            mapbox_center={"lat": 23.5, "lon": 113.3},
-            title_text="气象数据错误 (Weather Data Error)",
-            height=800
-        )
-        return fig, {}
+        return map_patch(title="气象数据错误 (Weather Data Error)"), None
 
     if not cities_meta:
         print("Error: cities_meta is empty. Cannot generate map.")
-        # Return an empty map or a message
-        fig = px.choropleth_mapbox() # Empty figure
-        fig.update_layout(
-            mapbox_style="carto-positron",
-            mapbox_zoom=5,
-            mapbox_center={"lat": 23.5, "lon": 113.3},
-            title_text="城市元数据缺失 (City Metadata Missing)",
-            height=800
-        )
-        return fig, {}
+        # Return an empty map with a message
+        return map_patch(title="城市元数据缺失 (City Metadata Missing)"), None
 
 
-    # 2. Call risk assessment model
-    results = estimate_region_risk(cities_meta, weather_dict, risk_time_value) #
+    # 2. Risk results for the selected time (precomputed for all RISK_TIMES)
+    weather_dict = snapshot["weather_dict"]
+    results = snapshot["results"].get(risk_time_value)
+    if results is None:
+        results = estimate_region_risk(cities_meta, weather_dict, risk_time_value) #
     
     # 3. Build dataframe for the map
     df = build_dataframe(results, disaster_type=tab_value) #
 
-    # 4. Prepare data for chatbot store
-    chatbot_context_data = {
-        "weather_dict": weather_dict,
-        "risk_results": results,
-        "risk_time_selection": risk_time_value,
-        "cities_meta": cities_meta # Pass along cities_meta as well
-    }
+    # 4. The chatbot store only carries the snapshot ID; the data stays on the server
+    chatbot_context_data = snapshot["id"]
 
     # 5. Draw the map
     if df.empty:
-        fig = px.choropleth_mapbox() # Empty figure
-        fig.update_layout(
-            mapbox_style="carto-positron",
-            mapbox_zoom=5,
-            mapbox_center={"lat": 23.5, "lon": 113.3},
-            title_text="无数据显示 (No Data to Display)",
-            height=800
-        )
-        return fig, chatbot_context_data
+        return map_patch(title="无数据显示 (No Data to Display)"), chatbot_context_data
 
 
-    map_color_col = 'flood_risk_level' if tab_value == 'flood' else 'fire_risk_level'
-    map_score_col = 'flood_score' if tab_value == 'flood' else 'fire_score'
     map_title = "广东省洪涝灾害风险等级分布 ({})" if tab_value == "flood" else "广东省森林火险气象等级分布 ({})"
     
     # Add risk time label to title
     selected_time_label = next((opt['label'] for opt in risk_time_options if opt['value'] == risk_time_value), risk_time_value)
     map_title = map_title.format(selected_time_label)
 
+    # 只下发着色与悬停数据的增量更新
+    return map_patch(df, tab_value, map_title), chatbot_context_data
 
-    fig = px.choropleth_mapbox(
-        df, geojson=geojson, locations='city', featureidkey="properties.地级", #
-        color=map_color_col,
-        mapbox_style="carto-positron", # Using a different mapbox style for potentially better visuals
-        hover_name='city',
-        hover_data={
-            # "城市": df['city'], # Already in hover_name
-            "风险等级": df[map_color_col],
-            "风险指数": df[map_score_col].apply(lambda x: f"{x:.2f}" if pd.notnull(x) else "N/A"),
-            "降水(mm)": df['precip'].apply(lambda x: f"{x:.1f}" if pd.notnull(x) else "N/A"),
-            "温度(°C)": df['temperature'].apply(lambda x: f"{x:.1f}" if pd.notnull(x) else "N/A"),
-            "湿度(%)": df['humidity'].apply(lambda x: f"{x:.0f}" if pd.notnull(x) else "N/A"),
-            "风速(m/s)": df['wind_speed'].apply(lambda x: f"{x:.1f}" if pd.notnull(x) else "N/A"),
-            # We need to remove columns not present for hover_data to work if they were direct df columns
-            'city': False # Don't show the city column again if it's the hover_name
-        },
-        color_discrete_map={ #
-            "极低风险": "#5abaff",
-            "低风险": "#56bb6c",
-            "中风险": "#efcb67",
-            "高风险": "#ec5736",
-            "极高风险": "#ad1457",
-            "未知": "#cccccc" # Added a color for unknown status
-        },
-        category_orders={ # Ensure consistent ordering of risk levels in legend
-            map_color_col: ["极低风险", "低风险", "中风险", "高风险", "极高风险", "未知"]
-        },
-        zoom=6, #
-        center={"lat": 23.5, "lon": 113.3}, #
-        opacity=0.7, #
-        # height parameter removed to allow CSS or style prop to control it
-        labels={map_color_col: '风险等级 (Risk Level)'}, #
-        title=map_title
-    )
-    fig.update_traces(marker_line_width=0.5, marker_line_color='white') # (changed line color and width)
-    fig.update_layout(margin={"r":0,"t":40,"l":0,"b":0}, title_x=0.5)
-    
-    return fig, chatbot_context_data
+
+# Refresh button only enqueues a background refresh; polling picks up the new data version
+@callback(
+    Output('data-version', 'data'),
+    Output('refresh-status', 'children'),
+    Input('refresh-btn', 'n_clicks'),
+    Input('data-version-poll', 'n_intervals'),
+    State('data-version', 'data')
+)
+def poll_data_version(refresh_clicks, n_intervals, current_version):
+    if ctx.triggered_id == 'refresh-btn' and refresh_clicks:
+        if refresh_scheduler.request_refresh():
+            print("Refresh button clicked. Weather refresh queued.")
+    status = refresh_scheduler.status()
+    if status['running'] or status['pending']:
+        message = "正在后台更新数据… (Refreshing in background…)"
+    elif status['failures']:
+        message = f"上次更新失败，稍后自动重试 (Last refresh failed, retrying): {status['last_error']}"
+    elif status['last_success']:
+        message = "数据已更新于 (Updated at) " + time.strftime('%H:%M:%S', time.localtime(status['last_success']))
+    else:
+        message = ""
+    version = data_version()
+    return (version if version != current_version else dash.no_update), message
+
+
+# Callback for the clicked city's risk history
+@callback(
+    Output('city-history', 'figure'),
+    Input('risk-map', 'clickData'),
+    Input('disaster-tabs', 'value'),
+    Input('data-version', 'data')
+)
+def update_city_history(click_data, tab_value, version):
+    city = None
+    if click_data and click_data.get('points'):
+        city = click_data['points'][0].get('location')
+    return build_history_figure(city, tab_value)
 
 
 # Callback for Chatbot
-@app.callback(
-    Output('chat-history', 'value'),
+# 发送：准备上下文、提交后台任务后立即返回；之后每 CHAT_POLL_MS 毫秒取回新生成的部分，生成结束后停止轮询。
+# 回调只输出新增的文字（chat-delta），由浏览器端的 CHAT_APPEND_JS 接到聊天记录末尾。
+@callback(
+    Output('chat-delta', 'data'),
     Output('chat-input', 'value'), # Clear input after sending
+    Output('chat-job', 'data'),
+    Output('chat-stream-poll', 'disabled'),
+    Output('chat-send-btn', 'disabled'), # 一次只生成一条回复
     Input('chat-send-btn', 'n_clicks'),
+    Input('chat-stream-poll', 'n_intervals'),
     State('chat-input', 'value'),
-    State('chat-history', 'value'),
-    State('current-weather-risk-data-store', 'data') # Get context from the store
+    State('current-weather-risk-data-store', 'data'), # Snapshot ID of the map being shown
+    State('risk-time', 'value'),
+    State('chat-job', 'data')
 )
-def update_chat(send_clicks, user_input, chat_history_val, stored_data):
+def update_chat(send_clicks, n_intervals, user_input, stored_snapshot_id, risk_time_selection, job_data):
+    if ctx.triggered_id == 'chat-stream-poll':
+        return poll_chat(job_data)
     if send_clicks > 0 and user_input:
-        if not stored_data:
+        snapshot = None
+        if stored_snapshot_id:
+            # 与地图相同的那份快照（已被淘汰时取最新的）
+            try:
+                snapshot = resolve_snapshot(stored_snapshot_id)
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+        prompt = f"您 (You): {user_input}\n助手 (Assistant): "
+        if snapshot is None:
             bot_response = "抱歉，系统当前的气象和风险数据尚未加载，请稍后再试或点击刷新数据。(Sorry, current weather/risk data is not loaded yet.)"
-        else:
-            weather_dict = stored_data.get("weather_dict")
-            cities_meta_from_store = stored_data.get("cities_meta") # Make sure this is passed
-            risk_results = stored_data.get("risk_results")
-            risk_time_selection = stored_data.get("risk_time_selection")
-
-            # Prepare context for the chatbot
-            weather_context_for_ai = get_weather_context_for_chatbot(
-                weather_dict, cities_meta_from_store, risk_results, risk_time_selection
-            )
-            
-            # Get response from chatbot service
-            bot_response = get_chatbot_response(user_input, weather_context_for_ai)
+            return chat_delta(prompt + bot_response + "\n\n"), "", None, True, False
+
+        weather_dict = snapshot["weather_dict"]
+        risk_results = snapshot["results"].get(risk_time_selection)
+        if risk_results is None:
+            risk_results = estimate_region_risk(cities_meta, weather_dict, risk_time_selection)
+
+        # Prepare context for the chatbot
+        weather_context_for_ai = get_weather_context_for_chatbot(
+            weather_dict, cities_meta, risk_results, risk_time_selection
+        )
+
+        # 模型回复在后台生成，这里立即返回
+        job_id = chat_jobs.submit(stream_chatbot_response, user_input, weather_context_for_ai)
+        return chat_delta(prompt), "", {"id": job_id, "offset": 0}, False, True
+    return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update # No change if no input or button not clicked
+
+
+def chat_delta(text):
+    # 带上唯一序号：相同的文字连续出现两次也会被追加
+    return {"text": text, "seq": uuid.uuid4().hex}
+
+
+def poll_chat(job_data):
+    """取回后台任务在 offset 之后新生成的回复；任务结束（或已过期、已失效）时停止轮询"""
+    if not job_data:
+        return dash.no_update, dash.no_update, dash.no_update, True, False
+    offset = job_data.get("offset", 0)
+    job = chat_jobs.get(job_data["id"])
+    if job is None:
+        text, done = "抱歉，回复已失效，请重新提问。(Sorry, the reply expired, please ask again.)", True
+        offset = 0
+    else:
+        text, done = job["text"], job["done"]
+        if done and job["error"] and not text:
+            text = f"抱歉，助手出错了。(Sorry, the assistant failed: {job['error']})"
+    new_text = text[offset:]
+    if not done:
+        if not new_text:
+            return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+        return chat_delta(new_text), dash.no_update, {"id": job_data["id"], "offset": len(text)}, False, True
+    return chat_delta(new_text + "\n\n"), dash.no_update, None, True, False
+
+
+# 浏览器端：把 chat-delta 的文字接到聊天记录末尾
+CHAT_APPEND_JS = """
+function(delta, history) {
+    if (!delta) { return window.dash_clientside.no_update; }
+    return (history || '') + delta.text;
+}
+"""
+
+# --- App Factory ---
+def create_app():
+    """
+    创建Dash应用：注册边界GeoJSON路由、布局与全部回调。
+    静态数据已在模块导入时加载；这里不做任何I/O，也不启动线程（后台刷新由 start_background_tasks 在各worker中启动），
+    因此可在WSGI服务器的主进程中预加载后fork出多个worker，见 wsgi.py。
+    """
+    app = dash.Dash(__name__, external_stylesheets=dashboard_theme) #
+    app.title = "粤港澳灾害风险仪表盘 (Guangdong Risk Dashboard)"
+    app.server.add_url_rule(MAP_GEOJSON_URL, 'serve_map_geojson', serve_map_geojson)
+    app.layout = serve_layout
+    for args, kwargs, func in _callbacks:
+        app.callback(*args, **kwargs)(func)
+    app.clientside_callback(CHAT_APPEND_JS, Output('chat-history', 'value'),
+                            Input('chat-delta', 'data'), State('chat-history', 'value'))
+    return app
 
-        # Append user message and bot response to chat history
-        new_chat_history = chat_history_val + f"您 (You): {user_input}\n助手 (Assistant): {bot_response}\n\n"
-        return new_chat_history, "" # Clear input box
-    return dash.no_update, dash.no_update # No change if no input or button not clicked
 
 if __name__ == "__main__":
     # Create dummy data files if they don't exist, to allow the app to start for the first time
@@ -372,4 +686,9 @@ if __name__ == "__main__":
             json.dump({}, f)
 
 
-    app.run(debug=True, host='127.0.0.1', port=8050)    
\ No newline at end of file
+    # 开发模式；生产环境请用 WSGI 服务器加载 wsgi.py（见 README）
+    app = create_app()
+    debug = os.getenv('DASH_DEBUG', '1') == '1'
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_tasks() # 调试模式的自动重载会起两个进程，只在实际提供服务的子进程中启动
+    app.run(debug=debug, host=os.getenv('HOST', '127.0.0.1'), port=int(os.getenv('PORT', '8050')))    
\ No newline at end of file
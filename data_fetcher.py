@@ -1,15 +1,103 @@
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 import json
 import os # Added for path joining
+import threading
+import time
+import sqlite3
+from weather_store import get_weather_store
+from weather_snapshot import weather_snapshot_path, write_weather_snapshot
+from weather_archive import get_weather_archive, weather_archive_path
+from file_lock import FileLock, atomic_write
+from http_cache import HttpCache
+from owm_client import OwmClient
+from weather_providers import WeatherProvider, provider_from_env
+# 接口地址与响应解析在 owm_parse 中，供回放数据源共用；这里再导出，沿用 data_fetcher.X 的写法
+from owm_parse import (WEATHER_BASE_URL, FORECAST_BASE_URL, LANG, FORECAST_HOURS, FORECAST_INTERPOLATE,
+                       parse_current_weather, parse_forecast_series, select_forecast,
+                       series_to_json, series_from_json, city_entry)
 
 # ========== 配置 ==========
 
 
 API_KEY = os.getenv("API_KEY") 
-WEATHER_BASE_URL = "http://api.openweathermap.org/data/2.5/weather"
-FORECAST_BASE_URL = "http://api.openweathermap.org/data/2.5/forecast"  # 未来预报接口
-LANG = "zh_cn"
+REQUEST_TIMEOUT = 10  # 单次请求超时(秒)
+# 并发抓取城市数上限，设为1即退回逐个城市串行抓取
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "8"))
+# 是否在JSON旁同时写出列式快照 guangdong_weather.npz（设为0关闭）
+WRITE_WEATHER_SNAPSHOT = os.getenv("WRITE_WEATHER_SNAPSHOT", "1") != "0"
+# 是否把每次抓取追加到历史归档 guangdong_weather_archive.sqlite（设为0关闭）
+WRITE_WEATHER_ARCHIVE = os.getenv("WRITE_WEATHER_ARCHIVE", "1") != "0"
+# HTTP响应缓存：实况/预报在TTL(秒)内重复请求直接使用缓存，过期后用ETag/Last-Modified重新验证
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE", "1") != "0"
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "http_cache"))
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_MB", "50")) * 2**20
+CURRENT_WEATHER_TTL = int(os.getenv("CURRENT_WEATHER_TTL", "600"))   # OWM实况约10分钟更新一次
+FORECAST_TTL = int(os.getenv("FORECAST_TTL", "3600"))                # 3小时步长预报，数小时才变化
+# 上游限速与重试：套餐每分钟调用数（免费版60，0为不限速）、单个请求最多重试次数、每轮刷新的总重试预算
+OWM_CALLS_PER_MINUTE = float(os.getenv("OWM_CALLS_PER_MINUTE", "60"))
+OWM_MAX_RETRIES = int(os.getenv("OWM_MAX_RETRIES", "3"))
+OWM_RETRY_BUDGET = int(os.getenv("OWM_RETRY_BUDGET", "20"))
+
+
+# ========== 共享HTTP会话 ==========
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """
+    返回进程内共享的requests.Session，复用连接池(keep-alive)，
+    避免每个请求重新建立TCP连接。连接池大小与并发上限一致。
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(FETCH_MAX_WORKERS, 10))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+_http_cache = None
+
+
+def get_http_cache():
+    """进程内共享的磁盘HTTP响应缓存"""
+    global _http_cache
+    with _session_lock:
+        if _http_cache is None:
+            _http_cache = HttpCache(HTTP_CACHE_DIR, max_bytes=HTTP_CACHE_MAX_BYTES)
+    return _http_cache
+
+
+_owm_client = None
+last_refresh_stats = None  # 最近一轮刷新的上游请求统计（OwmClient / RefreshStats.summary）
+
+
+def get_owm_client():
+    """进程内共享的限速/重试客户端"""
+    global _owm_client
+    session = get_http_session()
+    with _session_lock:
+        if _owm_client is None:
+            _owm_client = OwmClient(session, calls_per_minute=OWM_CALLS_PER_MINUTE,
+                                    max_retries=OWM_MAX_RETRIES, retry_budget=OWM_RETRY_BUDGET)
+    return _owm_client
+
+
+def get_json(url, params, ttl):
+    """GET并解析JSON：经限速/重试客户端；启用缓存时先查 HttpCache（TTL + 条件请求）"""
+    client = get_owm_client()
+    if HTTP_CACHE_ENABLED and ttl > 0:
+        return get_http_cache().get_json(client, url, params, ttl, timeout=REQUEST_TIMEOUT)
+    resp = client.get(url, params=params, timeout=REQUEST_TIMEOUT)
+    resp.raise_for_status() # Raises an HTTPError for bad responses (4XX or 5XX)
+    return resp.json()
 
 
 # ========== 气象数据获取 ==========
@@ -26,28 +114,29 @@ def get_weather_by_latlon(lat, lon):
         "lang": LANG
     }
     try:
-        resp = requests.get(WEATHER_BASE_URL, params=params, timeout=10)
-        resp.raise_for_status() # Raises an HTTPError for bad responses (4XX or 5XX)
-        d = resp.json()
-        return {
-            "temperature": d["main"]["temp"],
-            "humidity": d["main"]["humidity"],
-            "wind_speed": d["wind"]["speed"],
-            "wind_direction": d["wind"].get("deg", None),
-            "precipitation": d.get("rain", {}).get("1h", 0.0) #
-        }
+        return parse_current_weather(get_json(WEATHER_BASE_URL, params, CURRENT_WEATHER_TTL))
     except requests.exceptions.RequestException as e:
         print(f"Error fetching current weather for lat={lat}, lon={lon}: {e}")
         return None
     except KeyError as e:
         print(f"KeyError parsing current weather data for lat={lat}, lon={lon}: {e}")
         return None
+    except ValueError as e:  # 200但正文不是JSON（代理/网关的HTML错误页等）
+        print(f"Error decoding current weather for lat={lat}, lon={lon}: {e}")
+        return None
 
 
-def get_forecast_by_latlon(lat, lon, hours=[3, 6, 12, 24, 48, 72]):
+def get_forecast_series_by_latlon(lat, lon, hours=None, interpolate=None):
+    """
+    返回 (各时效预报 {'{h}h': ...}, 完整预报序列 {'dt': ..., 各变量: ...})；失败时为 ({}, None)。
+    hours: 目标时效列表（小时，1~120），默认 FORECAST_HOURS；
+    interpolate: 是否在相邻时次间插值，默认 FORECAST_INTERPOLATE。
+    """
     if not API_KEY:
         print("Error: OpenWeatherMap API_KEY is not set.")
-        return {}
+        return {}, None
+    hours = FORECAST_HOURS if hours is None else hours
+    interpolate = FORECAST_INTERPOLATE if interpolate is None else interpolate
     params = {
         "lat": lat,
         "lon": lon,
@@ -55,52 +144,23 @@ def get_forecast_by_latlon(lat, lon, hours=[3, 6, 12, 24, 48, 72]):
         "units": "metric",
         "lang": LANG
     }
-    forecasts = {}
     try:
-        resp = requests.get(FORECAST_BASE_URL, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        if "list" not in data: return forecasts
-        for hour in hours:
-            # The API provides forecasts in 3-hour intervals.
-            # We need to find the forecast entry closest to the desired hour.
-            # dt is unix timestamp. dt_txt is string.
-            # For simplicity, we'll use the index, assuming the first few entries cover our needs.
-            # idx = (hour // 3) -1 if hour % 3 == 0 and hour > 0 else hour // 3
-            # OpenWeatherMap's free forecast provides 3-hour steps.
-            # So 3h is index 0 (or 1 if current time is past the first interval), 6h is index 1 or 2 etc.
-            # The original code used `idx = hour // 3`. Let's refine this to pick the correct forecast.
-            # The API returns a list of 3-hour forecasts. `data['list'][0]` is the next 3-hour forecast.
-            # `data['list'][1]` is the one after that (6 hours from start of list).
-            
-            target_timestamp = datetime.now(timezone.utc) + timedelta(hours=hour)
-            
-            closest_forecast = None
-            min_time_diff = float('inf')
-
-            for fc_item in data["list"]:
-                fc_time = datetime.fromtimestamp(fc_item["dt"], timezone.utc)
-                time_diff = abs((fc_time - target_timestamp).total_seconds())
-                if time_diff < min_time_diff:
-                    min_time_diff = time_diff
-                    closest_forecast = fc_item
-            
-            if closest_forecast:
-                fc = closest_forecast
-                dt_bj = utc_str_to_bj_time(fc["dt_txt"]) #
-                forecasts[f"{hour}h"] = {
-                    "datetime": dt_bj,
-                    "temperature": fc["main"]["temp"],
-                    "humidity": fc["main"]["humidity"],
-                    "wind_speed": fc["wind"]["speed"],
-                    "wind_direction": fc["wind"].get("deg", None),
-                    "precipitation": fc.get("rain", {}).get("3h", 0.0) #
-                }
+        data = get_json(FORECAST_BASE_URL, params, FORECAST_TTL)
+        if "list" not in data: return {}, None
+        series = parse_forecast_series(data)
+        return select_forecast(series, hours, interpolate=interpolate), series
     except requests.exceptions.RequestException as e:
         print(f"Error fetching forecast for lat={lat}, lon={lon}: {e}")
     except KeyError as e:
         print(f"KeyError parsing forecast data for lat={lat}, lon={lon}: {e}")
-    return forecasts
+    except ValueError as e:  # 正文不是JSON
+        print(f"Error decoding forecast for lat={lat}, lon={lon}: {e}")
+    return {}, None
+
+
+def get_forecast_by_latlon(lat, lon, hours=None, interpolate=None):
+    """只返回各时效预报（完整序列见 get_forecast_series_by_latlon）"""
+    return get_forecast_series_by_latlon(lat, lon, hours, interpolate)[0]
 
 
 # ========== 时区转换 ==========
@@ -116,21 +176,146 @@ def utc_str_to_bj_time(utc_str, fmt="%Y-%m-%d %H:%M:%S"):
 
 
 # ========== 更新天气数据 ==========
-def update_weather_json(base_path=".."): # Added base_path for flexibility
+def fetch_city_weather(city):
+    """
+    抓取单个城市的实况与预报，返回 (city_name, 城市天气条目)。
+    任何异常都只影响该城市的对应部分（置为空数据），不会中断整轮刷新。
+    """
+    city_name = city['city_name']
+    # city_code = city['adcode'] # Not used in API calls here
+    lat = city['lat']
+    lon = city['lon']
+    print(f"[+] Fetching weather for {city_name} ... (lat={lat:.3f}, lon={lon:.3f})")
+    # 实况与预报分别处理：一个步骤出错不会丢掉另一个已取得的数据
+    try:
+        now_weather = get_weather_by_latlon(lat, lon)
+    except Exception as e:
+        print(f"Unexpected error fetching current weather for {city_name}: {e}")
+        now_weather = None
+    try:
+        # 保留完整的40个时次；各时效(3h/6h/...)是从序列中派生的视图
+        forecast, series = get_forecast_series_by_latlon(lat, lon) # Uses default hours
+    except Exception as e:
+        print(f"Unexpected error fetching forecast for {city_name}: {e}")
+        forecast, series = {}, None
+    return city_name, city_entry(city, now_weather, forecast, series)
+
+
+# ========== 数据源 ==========
+# WEATHER_PROVIDER 选择默认数据源：
+#   openweathermap（默认）| recorded:<录制目录> | snapshots:<天气JSON/归档库，逗号分隔或通配符>
+# 回放速度 REPLAY_SPEED：录制时间相对墙钟的倍数，0 表示每次刷新推进一帧/不等待。
+WEATHER_PROVIDER = os.getenv("WEATHER_PROVIDER", "openweathermap")
+REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", "0"))
+
+
+
+class OpenWeatherMapProvider(WeatherProvider):
+    """在线抓取：经共享会话、限速重试客户端与HTTP缓存"""
+    name = "openweathermap"
+
+    def __init__(self):
+        self._stats = None
+
+    def check(self):
+        if not API_KEY:
+            return "OpenWeatherMap API_KEY not set in data_fetcher.py."
+        return None
+
+    def start_refresh(self):
+        self._stats = get_owm_client().start_refresh()
+
+    def fetch_city(self, city):
+        return fetch_city_weather(city)
+
+    def finish_refresh(self):
+        return self._stats.summary() if self._stats is not None else None
+
+
+_default_provider = None
+
+
+def get_default_provider():
+    """进程内共享的默认数据源（由 WEATHER_PROVIDER / REPLAY_SPEED 构造）"""
+    global _default_provider
+    with _session_lock:
+        if _default_provider is None:
+            _default_provider = provider_from_env(WEATHER_PROVIDER, REPLAY_SPEED, online=OpenWeatherMapProvider)
+    return _default_provider
+
+
+# ========== 刷新协调 ==========
+# 同一进程内的并发刷新请求加入正在进行的那一次（single-flight），共享其结果；
+# 跨进程由 guangdong_weather.json.lock 文件锁串行化，等锁期间文件已被别的进程刷新过则直接复用。
+
+REFRESH_LOCK_TIMEOUT = float(os.getenv("REFRESH_LOCK_TIMEOUT", "600"))  # 等待其他进程刷新的最长时间(秒)
+
+_refresh_guard = threading.Lock()
+_refresh_inflight = {}  # 输出文件绝对路径 -> Future
+
+
+def update_weather_json(base_path="..", max_workers=None, provider=None): # Added base_path for flexibility
+    """
+    抓取全部城市天气并写入 data/guangdong_weather.json。
+    max_workers: 并发抓取的城市数上限，默认取 FETCH_MAX_WORKERS；为1时串行。
+    provider: 天气数据源（weather_providers.WeatherProvider），默认由 WEATHER_PROVIDER 环境变量决定（OpenWeatherMap）。
+    并发调用不会重复抓取：后来者等待并返回正在进行的那次刷新的结果。
+    """
+    key = os.path.abspath(os.path.join(base_path, "data", "guangdong_weather.json"))
+    with _refresh_guard:
+        future = _refresh_inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _refresh_inflight[key] = Future()
+    if not leader:
+        print("[*] Weather refresh already in progress, waiting for it ...")
+        return future.result()
+
+    try:
+        result = _refresh_weather_json(base_path, max_workers, provider or get_default_provider())
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+    finally:
+        with _refresh_guard:
+            _refresh_inflight.pop(key, None)
+    return result
+
+
+def write_weather_json(output_file_path, data):
+    """原子写出天气JSON：读取方只会看到完整的旧文件或新文件"""
+    with atomic_write(output_file_path) as f1:
+        json.dump(data, f1, ensure_ascii=False, indent=2)
+    # 同进程内的读取方直接使用刚写出的数据，无需重新解析文件
+    get_weather_store(output_file_path).put(data)
+
+
+def _refresh_weather_json(base_path, max_workers, provider):
     meta_file_path = os.path.join(base_path, "data", "admin_unit", "guangdong_cities_meta.json")
     output_file_path = os.path.join(base_path, "data", "guangdong_weather.json")
     
     # Ensure data directory exists
     os.makedirs(os.path.join(base_path, "data"), exist_ok=True)
 
+    requested_at = time.time()
+    with FileLock(output_file_path + ".lock", timeout=REFRESH_LOCK_TIMEOUT):
+        # 等锁期间另一个进程已完成刷新：直接使用它的结果
+        if os.path.exists(output_file_path) and os.path.getmtime(output_file_path) >= requested_at:
+            print(f"[*] {output_file_path} was refreshed by another process, reusing it")
+            return get_weather_store(output_file_path).get()
+        return _fetch_and_write(meta_file_path, output_file_path, max_workers, provider)
+
+
+def _fetch_and_write(meta_file_path, output_file_path, max_workers, provider):
     if not os.path.exists(meta_file_path):
         print(f"Error: City metadata file not found at {meta_file_path}")
         # Create a dummy file or return an empty dict to prevent crash if it's missing
         # and the app needs to run for the first time.
         # For a real scenario, ensure preprocess_static_data.py has run.
         placeholder_data = {}
-        with open(output_file_path, 'w', encoding="utf-8") as f1:
-            json.dump(placeholder_data, f1, ensure_ascii=False, indent=2)
+        write_weather_json(output_file_path, placeholder_data)
         return placeholder_data
 
 
@@ -138,37 +323,44 @@ def update_weather_json(base_path=".."): # Added base_path for flexibility
         cities_meta = json.load(f)
 
     all_weather = {}
-    if not API_KEY:
-        print("Critical Error: OpenWeatherMap API_KEY not set in data_fetcher.py. Cannot fetch weather.")
+    error = provider.check()
+    if error:
+        print(f"Critical Error: {error} Cannot fetch weather.")
         # Save empty data to avoid crashing app that reads this file
-        with open(output_file_path, 'w', encoding="utf-8") as f1:
-            json.dump(all_weather, f1, ensure_ascii=False, indent=2)
+        write_weather_json(output_file_path, all_weather)
         return all_weather
 
-    for city in cities_meta:
-        city_name = city['city_name']
-        # city_code = city['adcode'] # Not used in API calls here
-        lat = city['lat']
-        lon = city['lon']
-        print(f"[+] Fetching weather for {city_name} ... (lat={lat:.3f}, lon={lon:.3f})")
-        now_weather = get_weather_by_latlon(lat, lon)
-        forecast = get_forecast_by_latlon(lat, lon) # Uses default hours
-        
-        # Ensure now_weather is not None before trying to access it
-        current_weather_data = now_weather if now_weather else {}
-        
-        all_weather[city_name] = {
-            'adcode': city.get('adcode'), # Use .get for safety
-            'lon': lon,
-            'lat': lat,
-            'weather': {
-                'now': current_weather_data,
-                'forecast': forecast
-            }
-        }
-    with open(output_file_path, 'w', encoding="utf-8") as f1:
-        json.dump(all_weather, f1, ensure_ascii=False, indent=2)
+    global last_refresh_stats
+    provider.start_refresh()
+
+    if max_workers is None:
+        max_workers = FETCH_MAX_WORKERS
+    max_workers = max(1, min(int(max_workers), len(cities_meta) or 1))
+
+    if max_workers == 1:
+        city_results = [provider.fetch_city(city) for city in cities_meta]
+    else:
+        # 有界线程池并发抓取；map保持cities_meta顺序，输出与串行模式一致
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="weather-fetch") as pool:
+            city_results = list(pool.map(provider.fetch_city, cities_meta))
+
+    for city_name, entry in city_results:
+        all_weather[city_name] = entry
+    write_weather_json(output_file_path, all_weather)
+    if WRITE_WEATHER_SNAPSHOT:
+        try:
+            write_weather_snapshot(weather_snapshot_path(output_file_path),
+                                   [c["city_name"] for c in cities_meta], all_weather)
+        except (OSError, ValueError) as e:  # 快照只是附带产物，写入失败不影响本次刷新
+            print(f"Warning: could not write weather snapshot: {e}")
+    if WRITE_WEATHER_ARCHIVE:
+        try:
+            get_weather_archive(weather_archive_path(output_file_path)).append_fetch(all_weather)
+        except sqlite3.Error as e:  # 归档失败不影响本次刷新
+            print(f"Warning: could not append to weather archive: {e}")
     print(f"\n[*] Guangdong city weather data collection complete, saved to {output_file_path}")
+    last_refresh_stats = provider.finish_refresh()
+    print(f"[*] {provider.name} requests: {last_refresh_stats}")
 
     return all_weather
 
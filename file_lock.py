@@ -0,0 +1,116 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# ========== 文件锁与原子写入 ==========
+# 多个进程（仪表盘工作进程、cron 运行的 data_fetcher.py）可能同时刷新同一份数据文件。
+# FileLock 用一个旁路 .lock 文件做跨进程互斥（POSIX: fcntl.flock，Windows: msvcrt.locking）；
+# atomic_write 先写同目录下的唯一临时文件再 os.replace，读取方只会看到完整的旧文件或新文件。
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lock_fd(fd, blocking):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+
+    def _unlock_fd(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_fd(fd, blocking):
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock_fd(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class FileLockTimeout(TimeoutError):
+    pass
+
+
+class FileLock:
+    """
+    with FileLock('../data/guangdong_weather.json.lock', timeout=300):
+        ...  # 同一时刻只有一个进程/线程进入
+
+    同一进程内的线程也会互斥（每个锁文件配一把线程锁，避免同进程内 flock 不互斥的问题）。
+    timeout=None 表示一直等待。
+    """
+
+    _thread_locks = {}
+    _thread_locks_guard = threading.Lock()
+
+    def __init__(self, path, timeout=None, poll_interval=0.05):
+        self.path = os.path.abspath(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd = None
+        with FileLock._thread_locks_guard:
+            self._thread_lock = FileLock._thread_locks.setdefault(self.path, threading.Lock())
+
+    def acquire(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=-1 if self.timeout is None else self.timeout):
+            raise FileLockTimeout(f"timed out waiting for {self.path}")
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            while True:
+                try:
+                    _lock_fd(fd, blocking=deadline is None)
+                    break
+                except OSError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        os.close(fd)
+                        raise FileLockTimeout(f"timed out waiting for {self.path}")
+                    time.sleep(self.poll_interval)
+            self._fd = fd
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        try:
+            _unlock_fd(fd)
+        finally:
+            os.close(fd)
+            self._thread_lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding='utf-8'):
+    """
+    with atomic_write(path) as f:
+        json.dump(data, f)
+
+    写入同目录的唯一临时文件，成功后 os.replace 到目标路径；出错时删除临时文件，目标保持不变。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)  # mkstemp 默认 0600
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,18 @@
+# gunicorn -c gunicorn.conf.py wsgi:server
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8050")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+threads = int(os.getenv("WEB_THREADS", "4"))   # 每个worker的线程数（gthread）
+worker_class = "gthread"
+preload_app = True   # 主进程加载一次静态数据，fork后共享
+# 回调都在毫秒级返回：聊天回复与数据刷新在后台线程中进行，页面轮询取结果；
+# 超时只用于回收卡住的worker，取gunicorn默认的30秒
+timeout = int(os.getenv("WEB_TIMEOUT", "30"))
+accesslog = os.getenv("ACCESS_LOG", "-")
+
+
+def post_worker_init(worker):
+    # 线程不能跨fork：每个worker在这里启动自己的后台定时刷新，不等页面轮询
+    import dashboard_app
+    dashboard_app.start_background_tasks()
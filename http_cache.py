@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import requests
+
+from file_lock import atomic_write
+
+# ========== HTTP响应缓存 ==========
+# OpenWeatherMap 的实况约10分钟更新一次、5天/3小时预报数小时才变化一次，
+# 重复刷新没有必要每次都请求上游。响应按 (接口, 取整后的经纬度, units, lang) 缓存在磁盘上：
+#   - 未过期(TTL内)直接返回缓存，不发请求；
+#   - 过期后带 If-None-Match / If-Modified-Since 重新验证，304 时沿用缓存并续期；
+#   - 缓存总大小超过上限时按最近最少使用(LRU)淘汰；
+#   - 最近使用的条目同时留在内存中，未过期命中时不读盘。
+
+COORD_DECIMALS = 2  # 经纬度取两位小数（约1km）作为缓存键，同一城市的请求共享缓存
+
+
+def cache_key(url, params, coord_decimals=COORD_DECIMALS):
+    """(接口, 取整经纬度, units, lang) -> 缓存键；appid 等其他参数不参与"""
+    parts = [url.split('?')[0]]
+    for name in ('lat', 'lon'):
+        value = params.get(name)
+        parts.append(f"{name}={round(float(value), coord_decimals):.{coord_decimals}f}" if value is not None else f"{name}=")
+    parts.append(f"units={params.get('units', '')}")
+    parts.append(f"lang={params.get('lang', '')}")
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+class HttpCache:
+    """
+    cache = HttpCache('../data/http_cache', max_bytes=50 * 2**20)
+    data = cache.get_json(session, url, params, ttl=600, timeout=10)
+
+    每个条目一个JSON文件（元数据 + 响应正文）；文件 mtime 记录最近读盘时间，重启后据此恢复LRU顺序。
+    最近使用的 memory_entries 个条目另存一份在内存中。
+    stats 记录 hits(未过期命中) / revalidated(304) / misses(完整下载) / evictions。
+    """
+
+    def __init__(self, cache_dir, max_bytes=50 * 2**20, memory_entries=256):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> 文件大小，按访问先后排序（末尾为最近）
+        self._memory = OrderedDict()  # key -> 条目，按访问先后排序
+        self._total_bytes = 0
+        self._key_locks = {}  # key -> [锁, 使用者数]；只保留正在请求的键
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith('.json'):
+                st = os.stat(os.path.join(cache_dir, name))
+                entries.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    # --------- 条目读写 ---------
+
+    def load(self, key):
+        """从磁盘读取条目（其他进程写入的也能读到），不存在或损坏时返回None"""
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+                self._remember(key, entry)
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return entry
+
+    def cached(self, key):
+        """内存中的条目，不在内存中时从磁盘读取"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._index.move_to_end(key)
+                return entry
+        return self.load(key)
+
+    def store(self, key, entry):
+        path = self._path(key)
+        with atomic_write(path) as f:
+            json.dump(entry, f, ensure_ascii=False)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._total_bytes += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._remember(key, entry)
+            self._evict()
+
+    def _remember(self, key, entry):
+        # 调用方持有 self._lock
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._memory.pop(key, None)
+            self._total_bytes -= size
+            self.stats['evictions'] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._index.clear()
+            self._memory.clear()
+            self._total_bytes = 0
+
+    # --------- 请求 ---------
+
+    def get_json(self, session, url, params, ttl, timeout=None):
+        """
+        带缓存的 GET，返回解析后的JSON。非2xx/304响应照常抛 requests.HTTPError，且不写入缓存。
+        """
+        key = cache_key(url, params)
+        entry = self.cached(key)
+        if entry is not None and time.time() - entry['stored_at'] < ttl:
+            self._count('hits')
+            return json.loads(entry['body'])
+        # 同一键的并发请求只发一次：后到者等待后直接读取刚写入的缓存
+        with self._key_lock(key):
+            entry = self.load(key)  # 读盘：其他进程可能刚刷新过
+            if entry is not None and time.time() - entry['stored_at'] < ttl:
+                self._count('hits')
+                return json.loads(entry['body'])
+            return self._fetch(session, url, params, key, entry, timeout)
+
+    @contextmanager
+    def _key_lock(self, key):
+        """同一键的请求串行化；最后一个使用者离开时删除该键的锁，锁表不会随键数增长"""
+        with self._lock:
+            slot = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._key_locks[key]
+
+    def _fetch(self, session, url, params, key, entry, timeout):
+        now = time.time()
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        resp = session.get(url, params=params, headers=headers, timeout=timeout)
+        if resp.status_code == 304 and entry is not None:
+            self._count('revalidated')
+            entry = dict(entry, stored_at=now)  # 内存中的旧条目可能正被其他线程读取
+            self.store(key, entry)
+            return json.loads(entry['body'])
+        if resp.status_code == 304:
+            # 没有发验证头却收到304（中间代理等）：要求不用缓存再请求一次
+            resp = session.get(url, params=params, headers={'Cache-Control': 'no-cache'}, timeout=timeout)
+            if resp.status_code == 304:
+                raise requests.HTTPError(f"304 Not Modified for {url} without a cached entry", response=resp)
+        resp.raise_for_status()
+        self._count('misses')
+        body = resp.text
+        data = json.loads(body)
+        self.store(key, {
+            'url': url.split('?')[0],
+            'stored_at': now,
+            'etag': resp.headers.get('ETag'),
+            'last_modified': resp.headers.get('Last-Modified'),
+            'body': body,
+        })
+        return data
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._index), bytes=self._total_bytes)
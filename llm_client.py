@@ -0,0 +1,255 @@
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+
+from stats_utils import percentile
+
+# ========== 大模型请求层 ==========
+# 聊天助手的所有模型请求经进程内共享的客户端发出（见 chatbot_service.get_llm_client）：
+#   - 一个客户端一个连接池，keep-alive 复用TCP/TLS连接，不再每条消息新建客户端和握手；
+#   - 连接/读取超时可配置；同时进行的请求数有上限，超出的排队等待空位；
+#   - 429 / 超时 / 连接错误 / 5xx 按指数退避（带抖动，优先遵循 Retry-After）重试，
+#     流式请求只在收到第一段之前重试；
+#   - 记录每次调用的排队、总耗时与首字延迟，stats.summary() 给出分位数。
+# 同步版 LlmClient 供Dash回调和后台线程使用，异步版 AsyncLlmClient 供 asyncio 代码使用
+# （异步客户端的连接池绑定在第一次使用它的事件循环上）。
+
+RETRYABLE_ERRORS = ('RateLimitError', 'APITimeoutError', 'APIConnectionError', 'InternalServerError')
+
+
+class LlmCallStats:
+    """最近 window 次调用的统计"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.status = Counter()     # 每次尝试的状态码或异常名
+        self.latencies = []         # 每次调用的总耗时（含排队与退避）
+        self.first_tokens = []      # 流式调用的首字延迟
+        self.queue_waits = []       # 等待并发空位的时间
+        self._lock = threading.Lock()
+
+    def record_attempt(self, status):
+        with self._lock:
+            self.status[status] += 1
+
+    def record_call(self, latency, retries, ok, queue_wait, first_token=None):
+        with self._lock:
+            self.calls += 1
+            self.retries += retries
+            self.failures += 0 if ok else 1
+            self.latencies = (self.latencies + [latency])[-self.window:]
+            self.queue_waits = (self.queue_waits + [queue_wait])[-self.window:]
+            if first_token is not None:
+                self.first_tokens = (self.first_tokens + [first_token])[-self.window:]
+
+    def summary(self):
+        with self._lock:
+            latencies, first_tokens, waits = list(self.latencies), list(self.first_tokens), list(self.queue_waits)
+            return {
+                'calls': self.calls,
+                'retries': self.retries,
+                'failures': self.failures,
+                'rate_limited': self.status[429],
+                'status': dict(self.status),
+                'latency_p50': percentile(latencies, 50),
+                'latency_p95': percentile(latencies, 95),
+                'latency_max': max(latencies) if latencies else None,
+                'first_token_p50': percentile(first_tokens, 50),
+                'first_token_p95': percentile(first_tokens, 95),
+                'queue_wait_p95': percentile(waits, 95),
+            }
+
+
+class _LlmClientBase:
+    """同步/异步客户端共用的配置与重试策略"""
+
+    def __init__(self, api_key, base_url, max_concurrency=8, timeout=60.0, connect_timeout=5.0,
+                 keepalive=30.0, max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        import openai  # 导入较慢，第一次创建客户端时才导入
+        self._openai = openai
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = LlmCallStats()
+        self._retryable = tuple(getattr(openai, name) for name in RETRYABLE_ERRORS)
+        # openai 依赖的 httpx 版本不一，从它的默认连接限制取得对应的 Limits 类
+        limits_cls = type(openai.DEFAULT_CONNECTION_LIMITS)
+        self._limits = limits_cls(max_connections=max_concurrency, max_keepalive_connections=max_concurrency,
+                                  keepalive_expiry=keepalive)
+        self._timeout = openai.Timeout(timeout, connect=connect_timeout)
+        self._api_key = api_key
+
+    def _status(self, error):
+        return getattr(error, 'status_code', None) or type(error).__name__
+
+    def _backoff(self, attempt, error):
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        # full jitter: [0, min(上限, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+class LlmClient(_LlmClientBase):
+    """
+    client = LlmClient(api_key, base_url, max_concurrency=8, timeout=60, connect_timeout=5)
+    text = client.complete(model=..., messages=..., max_tokens=250)
+    for delta in client.stream(model=..., messages=...): ...
+    client.stats.summary()
+
+    可在多个线程中共用；SDK自带的重试关闭，由本客户端统一重试并计数。
+    """
+
+    def __init__(self, api_key, base_url, **kwargs):
+        super().__init__(api_key, base_url, **kwargs)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.client = self._openai.OpenAI(
+            api_key=self._api_key, base_url=base_url, timeout=self._timeout, max_retries=0,
+            http_client=self._openai.DefaultHttpxClient(limits=self._limits, timeout=self._timeout))
+
+    def _acquire(self):
+        t0 = time.perf_counter()
+        self._slots.acquire()
+        return time.perf_counter() - t0
+
+    def _create(self, **kwargs):
+        """发出请求，可重试的错误按退避重试；返回 (响应, 重试次数)"""
+        attempt = 0
+        while True:
+            try:
+                response = self.client.chat.completions.create(**kwargs)
+                self.stats.record_attempt(200)
+                return response, attempt
+            except self._retryable as e:
+                self.stats.record_attempt(self._status(e))
+                if attempt >= self.max_retries:
+                    e.retries = attempt
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+            except self._openai.APIStatusError as e:
+                self.stats.record_attempt(self._status(e))
+                e.retries = attempt
+                raise
+
+    def complete(self, **kwargs):
+        t0 = time.perf_counter()
+        waited = self._acquire()
+        retries, ok = 0, False
+        try:
+            completion, retries = self._create(**kwargs)
+            ok = True
+            return completion.choices[0].message.content
+        except Exception as e:
+            retries = getattr(e, 'retries', retries)
+            raise
+        finally:
+            self._slots.release()
+            self.stats.record_call(time.perf_counter() - t0, retries, ok, waited)
+
+    def stream(self, **kwargs):
+        """逐段产出回复文本；占用一个并发空位直到流结束"""
+        t0 = time.perf_counter()
+        waited = self._acquire()
+        retries, ok, first_token = 0, False, None
+        try:
+            stream, retries = self._create(stream=True, **kwargs)
+            with stream:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token is None:
+                            first_token = time.perf_counter() - t0
+                        yield chunk.choices[0].delta.content
+            ok = True
+        except Exception as e:
+            retries = getattr(e, 'retries', retries)
+            raise
+        finally:
+            self._slots.release()
+            self.stats.record_call(time.perf_counter() - t0, retries, ok, waited, first_token)
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncLlmClient(_LlmClientBase):
+    """
+    client = AsyncLlmClient(api_key, base_url, max_concurrency=8)
+    text = await client.complete(model=..., messages=...)
+    async for delta in client.stream(model=..., messages=...): ...
+    """
+
+    def __init__(self, api_key, base_url, **kwargs):
+        super().__init__(api_key, base_url, **kwargs)
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.client = self._openai.AsyncOpenAI(
+            api_key=self._api_key, base_url=base_url, timeout=self._timeout, max_retries=0,
+            http_client=self._openai.DefaultAsyncHttpxClient(limits=self._limits, timeout=self._timeout))
+
+    async def _create(self, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.chat.completions.create(**kwargs)
+                self.stats.record_attempt(200)
+                return response, attempt
+            except self._retryable as e:
+                self.stats.record_attempt(self._status(e))
+                if attempt >= self.max_retries:
+                    e.retries = attempt
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+            except self._openai.APIStatusError as e:
+                self.stats.record_attempt(self._status(e))
+                e.retries = attempt
+                raise
+
+    async def complete(self, **kwargs):
+        t0 = time.perf_counter()
+        retries, ok, waited = 0, False, 0.0
+        async with self._slots:
+            waited = time.perf_counter() - t0
+            try:
+                completion, retries = await self._create(**kwargs)
+                ok = True
+                return completion.choices[0].message.content
+            except Exception as e:
+                retries = getattr(e, 'retries', retries)
+                raise
+            finally:
+                self.stats.record_call(time.perf_counter() - t0, retries, ok, waited)
+
+    async def stream(self, **kwargs):
+        t0 = time.perf_counter()
+        retries, ok, first_token, waited = 0, False, None, 0.0
+        async with self._slots:
+            waited = time.perf_counter() - t0
+            try:
+                stream, retries = await self._create(stream=True, **kwargs)
+                async with stream:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if first_token is None:
+                                first_token = time.perf_counter() - t0
+                            yield chunk.choices[0].delta.content
+                ok = True
+            except Exception as e:
+                retries = getattr(e, 'retries', retries)
+                raise
+            finally:
+                self.stats.record_call(time.perf_counter() - t0, retries, ok, waited, first_token)
+
+    async def close(self):
+        await self.client.close()
@@ -0,0 +1,162 @@
+import random
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from stats_utils import percentile
+
+# ========== OpenWeatherMap 请求层 ==========
+# 所有上游请求经同一个客户端发出：
+#   - 令牌桶限速，按套餐的每分钟调用数（免费版60次/分钟）平滑发送，避免触发429；
+#   - 429 / 5xx / 超时 / 连接错误按指数退避（带抖动，优先遵循 Retry-After）重试；
+#   - 每次刷新有总的重试预算，上游故障时不会无限重试拖慢整轮刷新；
+#   - 每次刷新统计请求次数、重试次数、状态码与耗时分位数。
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """容量 capacity、每秒补充 rate 个令牌；acquire() 在令牌不足时阻塞等待，返回等待秒数"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class RefreshStats:
+    """一次刷新内的请求统计与重试预算"""
+
+    def __init__(self, retry_budget):
+        self.retry_budget = retry_budget
+        self.calls = 0              # 逻辑请求数（含重试的算一次）
+        self.attempts = 0           # 实际发出的HTTP请求数
+        self.retries = 0
+        self.failures = 0           # 最终未得到成功响应（连接错误或非2xx/3xx）的逻辑请求
+        self.budget_exhausted = 0   # 因预算耗尽而放弃的重试
+        self.throttled_seconds = 0.0
+        self.status = Counter()
+        self.latencies = []         # 每个逻辑请求的总耗时（含退避）
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def try_spend_retry(self):
+        with self._lock:
+            if self.retry_budget <= 0:
+                self.budget_exhausted += 1
+                return False
+            self.retry_budget -= 1
+            self.retries += 1
+            return True
+
+    def record_attempt(self, status, throttled):
+        with self._lock:
+            self.attempts += 1
+            self.status[status] += 1
+            self.throttled_seconds += throttled
+
+    def record_call(self, latency, ok):
+        with self._lock:
+            self.calls += 1
+            self.failures += 0 if ok else 1
+            self.latencies.append(latency)
+
+    def summary(self):
+        with self._lock:
+            latencies = list(self.latencies)
+            return {
+                'calls': self.calls,
+                'attempts': self.attempts,
+                'retries': self.retries,
+                'failures': self.failures,
+                'retry_budget_left': self.retry_budget,
+                'budget_exhausted': self.budget_exhausted,
+                'throttled_seconds': round(self.throttled_seconds, 3),
+                'status': dict(self.status),
+                'latency_p50': percentile(latencies, 50),
+                'latency_p95': percentile(latencies, 95),
+                'latency_max': max(latencies) if latencies else None,
+            }
+
+
+class OwmClient:
+    """
+    client = OwmClient(session, calls_per_minute=60)
+    stats = client.start_refresh(retry_budget=20)   # 每轮刷新开始时调用
+    resp = client.get(url, params=params, timeout=10)
+    stats.summary()
+
+    get() 的签名与 requests.Session.get 一致，可直接交给 HttpCache 使用。
+    重试用尽后返回最后一次的响应（由调用方 raise_for_status），或抛出最后一次的连接异常。
+    """
+
+    def __init__(self, session, calls_per_minute=60, burst=None, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0, retry_budget=20):
+        self.session = session
+        # calls_per_minute<=0 表示不限速
+        self.bucket = TokenBucket(calls_per_minute / 60.0, burst or calls_per_minute) if calls_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_retry_budget = retry_budget
+        self.stats = RefreshStats(retry_budget)
+
+    def start_refresh(self, retry_budget=None):
+        """开始新一轮刷新：重置统计与重试预算，返回本轮的 RefreshStats"""
+        self.stats = RefreshStats(self.default_retry_budget if retry_budget is None else retry_budget)
+        return self.stats
+
+    def _backoff(self, attempt, resp):
+        retry_after = resp.headers.get('Retry-After') if resp is not None else None
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        # full jitter: [0, min(上限, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        stats = self.stats
+        t0 = time.perf_counter()
+        attempt = 0
+        while True:
+            throttled = self.bucket.acquire() if self.bucket is not None else 0.0
+            resp, error = None, None
+            try:
+                resp = self.session.get(url, params=params, headers=headers, timeout=timeout)
+                status = resp.status_code
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                error, status = e, type(e).__name__
+            stats.record_attempt(status, throttled)
+
+            retryable = error is not None or status in RETRY_STATUSES
+            if not retryable or attempt >= self.max_retries or not stats.try_spend_retry():
+                # 401/404等不重试的4xx与重试用尽的429/5xx都算失败
+                stats.record_call(time.perf_counter() - t0, error is None and resp.ok)
+                if error is not None:
+                    raise error
+                return resp
+            delay = self._backoff(attempt, resp)
+            if resp is not None:
+                resp.close()  # 归还连接
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,159 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# ========== OpenWeatherMap 接口与响应解析 ==========
+# 接口地址、预报时效配置和把接口响应转为 guangdong_weather.json 条目的纯函数。
+# 在线抓取（data_fetcher）与回放录制响应（weather_providers）都从这里导入，
+# 本模块不发请求、不依赖二者，避免两个模块互相导入。
+
+WEATHER_BASE_URL = "http://api.openweathermap.org/data/2.5/weather"
+FORECAST_BASE_URL = "http://api.openweathermap.org/data/2.5/forecast"  # 未来预报接口
+LANG = "zh_cn"
+# 预报时效（小时，1~120，逗号分隔）；是否在3小时时次之间插值
+MAX_FORECAST_HOURS = 120  # 5天预报覆盖的最远时效
+
+
+def parse_forecast_hours(text):
+    """'3,6,12' -> [3.0, 6.0, 12.0]；格式错误或超出 1~MAX_FORECAST_HOURS 时抛 ValueError"""
+    try:
+        hours = [float(h) for h in text.split(",") if h.strip()]
+    except ValueError:
+        hours = None
+    if not hours or any(not 1 <= h <= MAX_FORECAST_HOURS for h in hours):
+        raise ValueError(f"FORECAST_HOURS must be comma-separated hours within 1..{MAX_FORECAST_HOURS}, got {text!r}")
+    return hours
+
+
+# 启动时校验：配置错误直接报错，而不是每轮刷新都让所有城市的预报失败
+FORECAST_HOURS = parse_forecast_hours(os.getenv("FORECAST_HOURS", "3,6,12,24,48,72"))
+FORECAST_INTERPOLATE = os.getenv("FORECAST_INTERPOLATE", "0") == "1"
+
+
+def forecast_time(hour):
+    """预报时效（小时）-> 时刻名 'forecast-{h}h'，与 select_forecast 的 '{h}h' 键一致"""
+    return f"forecast-{hour:g}h"
+
+
+def forecast_hours(weather_time):
+    """forecast_time 的逆操作：'forecast-1.5h' -> 1.5"""
+    return float(weather_time[len("forecast-"):].rstrip("h"))
+
+
+# ========== 实况解析 ==========
+
+def parse_current_weather(d):
+    """/data/2.5/weather 响应 -> 实况字典"""
+    return {
+        "temperature": d["main"]["temp"],
+        "humidity": d["main"]["humidity"],
+        "wind_speed": d["wind"]["speed"],
+        "wind_direction": d["wind"].get("deg", None),
+        "precipitation": d.get("rain", {}).get("1h", 0.0) #
+    }
+
+
+# ========== 预报解析 ==========
+# 预报接口返回5天/3小时共40个时次。一次遍历把 dt 及各变量转为按时间排序的数组，
+# 再用二分查找(searchsorted)为所有目标时效同时选出最近时次，或在相邻两个时次间线性插值。
+
+FORECAST_SERIES_FIELDS = ('temperature', 'humidity', 'wind_speed', 'wind_direction', 'precipitation')
+BJ_TZ = timezone(timedelta(hours=8))
+
+
+def parse_forecast_series(data):
+    """
+    预报接口JSON -> {'dt': int64[n] (升序), 各变量: float[n]}；缺失的风向为NaN，缺失的降水为0。
+    """
+    items = data.get("list") or []
+    rows = [(fc["dt"], fc["main"]["temp"], fc["main"]["humidity"], fc["wind"]["speed"],
+             fc["wind"].get("deg", None), fc.get("rain", {}).get("3h", 0.0)) for fc in items] #
+    columns = list(zip(*rows)) if rows else [()] * 6
+    series = {"dt": np.array(columns[0], dtype=np.int64)}
+    for field, column in zip(FORECAST_SERIES_FIELDS, columns[1:]):
+        series[field] = np.array(column, dtype=float)  # None（缺失风向）-> NaN
+    if len(items) and np.any(np.diff(series["dt"]) < 0):
+        order = np.argsort(series["dt"], kind="stable")
+        series = {k: v[order] for k, v in series.items()}
+    return series
+
+
+def nearest_slots(dt, targets):
+    """对每个目标时间返回最近时次的下标；距离相同时取较早的时次"""
+    right = np.clip(np.searchsorted(dt, targets, side="left"), 0, len(dt) - 1)
+    left = np.clip(right - 1, 0, len(dt) - 1)
+    return np.where(np.abs(targets - dt[left]) <= np.abs(dt[right] - targets), left, right)
+
+
+def select_forecast(series, hours, now=None, interpolate=False):
+    """
+    从预报序列中取出各目标时效（小时，1~MAX_FORECAST_HOURS）的预报，返回 {'{h}h': 预报字典}。
+    interpolate=False: 取最近的时次（与逐个扫描的结果一致）；
+    interpolate=True : 在前后两个时次间按时间线性插值（超出范围时取端点），风向取最近时次。
+    """
+    dt = series["dt"]
+    if not len(dt) or not len(hours):
+        return {}
+    hours = np.asarray(hours, dtype=float)
+    if np.any((hours < 1) | (hours > MAX_FORECAST_HOURS)):
+        raise ValueError(f"forecast hours must be within 1..{MAX_FORECAST_HOURS}: {hours.tolist()}")
+    now = datetime.now(timezone.utc).timestamp() if now is None else now
+    targets = now + hours * 3600.0
+    nearest = nearest_slots(dt, targets)
+
+    if interpolate:
+        values = {f: np.interp(targets, dt, series[f]) for f in FORECAST_SERIES_FIELDS if f != "wind_direction"}
+        values["wind_direction"] = series["wind_direction"][nearest]
+        stamps = targets
+    else:
+        values = {f: series[f][nearest] for f in FORECAST_SERIES_FIELDS}
+        stamps = dt[nearest]
+
+    forecasts = {}
+    for k, hour in enumerate(hours):
+        direction = values["wind_direction"][k]
+        forecasts[f"{hour:g}h"] = {
+            "datetime": datetime.fromtimestamp(int(stamps[k]), BJ_TZ).strftime("%Y-%m-%d %H:%M:%S"),
+            "temperature": float(values["temperature"][k]),
+            "humidity": float(values["humidity"][k]),
+            "wind_speed": float(values["wind_speed"][k]),
+            "wind_direction": None if np.isnan(direction) else float(direction),
+            "precipitation": float(values["precipitation"][k]), #
+        }
+    return forecasts
+
+
+def series_to_json(series):
+    """预报序列数组 -> 可JSON序列化的列式字典（NaN写为null）"""
+    out = {"dt": series["dt"].tolist()}
+    for field in FORECAST_SERIES_FIELDS:
+        out[field] = [None if np.isnan(v) else v for v in series[field].tolist()]
+    return out
+
+
+def series_from_json(obj):
+    """series_to_json 的逆操作"""
+    series = {"dt": np.asarray(obj.get("dt", []), dtype=np.int64)}
+    for field in FORECAST_SERIES_FIELDS:
+        series[field] = np.array(obj.get(field, []), dtype=float)
+    return series
+
+
+def city_entry(city, now_weather, forecast, series):
+    """组装 guangdong_weather.json 中单个城市的条目"""
+    lat = city['lat']
+    lon = city['lon']
+    # Ensure now_weather is not None before trying to access it
+    current_weather_data = now_weather if now_weather else {}
+
+    return {
+        'adcode': city.get('adcode'), # Use .get for safety
+        'lon': lon,
+        'lat': lat,
+        'weather': {
+            'now': current_weather_data,
+            'forecast': forecast,
+            'series': series_to_json(series) if series is not None else {}
+        }
+    }
@@ -3,19 +3,26 @@ import rasterio
 import geopandas as gpd
 import json
 import numpy as np
+import math
+import shapely
+import shapely.geometry
+from concurrent.futures import ProcessPoolExecutor
 from rasterio.warp import calculate_default_transform, reproject, Resampling
 from rasterio.mask import mask
+from rasterio.features import rasterize, geometry_window
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+from rasterio.vrt import WarpedVRT
+import rasterio.shutil
+from build_cache import BuildCache
 
 # ========== 本地地理高程与土地利用数据读取 ==========
 
 def check_tif_value_range(tif_path):
     """
-    获取tif文件的最小最大值
+    获取tif文件的最小最大值（按块流式统计，剔除nodata）
     """
-    with rasterio.open(tif_path) as src:
-        band = src.read(1)
-        min_val = band.min()
-        max_val = band.max()
+    min_val, max_val = raster_min_max(tif_path)
     print(f"{tif_path} value range: min={min_val}, max={max_val}")
     return min_val, max_val
 
@@ -29,30 +36,220 @@ def check_shp_attributes(shp_path):
     return gdf.columns, gdf.head()
 
 
-def reproject_raster(src_tif, dst_tif, target_crs):
+# --------- 重投影参数 ---------
+REPROJECT_WORKERS = int(os.getenv("REPROJECT_WORKERS", os.cpu_count() or 1))  # 进程数，1为串行
+REPROJECT_TILE_SIZE = 256      # 输出GeoTIFF内部分块大小
+REPROJECT_WINDOW_SIZE = 1024   # 单个重投影任务的窗口边长(像元)，为分块大小的整数倍
+DEM_RESAMPLING = Resampling.bilinear      # 连续量：双线性
+LANDUSE_RESAMPLING = Resampling.nearest   # 分类量：最近邻（也可用 Resampling.mode）
+
+# 坐标变换的近似误差上限(像元)，0.125为GDAL默认值。串行与并行使用同一套窗口，结果总是一致。
+# 分块输出与整幅一次重投影并不逐字节相同：GDAL按窗口计算近似变换与重采样核的缩放，即使取极小值
+# 也是如此。最近邻只有零星像元不同，双线性有亚像元级的差异；差异与容差见 benchmarks/bench_reproject.py
+REPROJECT_TOLERANCE = float(os.getenv("REPROJECT_TOLERANCE", "0.125"))
+
+_worker_vrts = {}
+
+
+def iter_tile_windows(width, height, size=REPROJECT_WINDOW_SIZE):
+    """按 size×size 切分目标栅格，窗口与输出分块对齐"""
+    for row0 in range(0, height, size):
+        for col0 in range(0, width, size):
+            yield Window(col0, row0, min(size, width - col0), min(size, height - row0))
+
+
+def _reproject_window(task):
+    """
+    从目标格网的WarpedVRT中读取一个窗口（可在子进程中执行）。
+    每个进程按源文件和目标格网缓存VRT，避免每个窗口重复打开。
+    """
+    vrt_key, band, window = task
+    vrt = _worker_vrts.get(vrt_key)
+    if vrt is None:
+        src_tif, src_nodata, dst_crs, transform, width, height, resampling, num_threads = vrt_key
+        src = rasterio.open(src_tif)
+        vrt = _worker_vrts[vrt_key] = WarpedVRT(
+            src, crs=dst_crs, transform=transform, width=width, height=height,
+            src_nodata=src_nodata, nodata=src_nodata, resampling=resampling,
+            tolerance=REPROJECT_TOLERANCE, warp_extras={'NUM_THREADS': num_threads}
+        )
+    return band, window, vrt.read(band, window=window)
+
+
+def _close_worker_vrt(vrt_key):
+    vrt = _worker_vrts.pop(vrt_key, None)
+    if vrt is not None:
+        src = vrt.src_dataset
+        vrt.close()
+        src.close()
+
+
+def reproject_raster(src_tif, dst_tif, target_crs, resampling=Resampling.nearest,
+                     workers=None, num_threads=1, src_nodata=None, compress='deflate', cog=False):
+    """
+    分块重投影，输出为内部分块、压缩的GeoTIFF。
+    :param resampling: 重采样方法，DEM建议 DEM_RESAMPLING，土地利用建议 LANDUSE_RESAMPLING
+    :param workers: 并行进程数，默认 REPROJECT_WORKERS；为1时在本进程内逐块执行
+    :param num_threads: 每个窗口内GDAL warp的线程数
+    :param src_nodata: 覆盖源栅格的nodata（源文件未标注nodata时使用，如DEM的-32768）
+    :param cog: 为True时最终输出为带金字塔的Cloud Optimized GeoTIFF
+    各窗口独立计算且窗口划分与进程数无关，最近邻下并行输出与串行(workers=1)逐字节一致。
+    """
+    workers = REPROJECT_WORKERS if workers is None else max(1, int(workers))
+    dst_crs = rasterio.crs.CRS.from_user_input(target_crs)
     with rasterio.open(src_tif) as src:
         transform, width, height = calculate_default_transform(
-            src.crs, target_crs, src.width, src.height, *src.bounds)
+            src.crs, dst_crs, src.width, src.height, *src.bounds)
+        src_nodata = src.nodata if src_nodata is None else src_nodata
         kwargs = src.meta.copy()
         kwargs.update({
-            'crs': target_crs,
+            'crs': dst_crs,
             'transform': transform,
             'width': width,
-            'height': height
+            'height': height,
+            'nodata': src_nodata,
+            'tiled': True,
+            'blockxsize': REPROJECT_TILE_SIZE,
+            'blockysize': REPROJECT_TILE_SIZE,
+            'compress': compress,
+            'BIGTIFF': 'IF_SAFER'
         })
-        with rasterio.open(dst_tif, 'w', **kwargs) as dst:
-            for i in range(1, src.count + 1):
-                reproject(
-                    source=rasterio.band(src, i),
-                    destination=rasterio.band(dst, i),
-                    src_transform=src.transform,
-                    src_crs=src.crs,
-                    dst_transform=transform,
-                    dst_crs=target_crs,
-                    resampling=Resampling.nearest
-                )
+        vrt_key = (src_tif, src_nodata, dst_crs.to_wkt(), transform, width, height, resampling, num_threads)
+        tasks = [(vrt_key, i, window)
+                 for i in range(1, src.count + 1)
+                 for window in iter_tile_windows(width, height)]
+
+    out_tif = dst_tif + '.tmp.tif' if cog else dst_tif
+    with rasterio.open(out_tif, 'w', **kwargs) as dst:
+        if workers == 1:
+            try:
+                for task in tasks:
+                    band, window, out = _reproject_window(task)
+                    dst.write(out, band, window=window)
+            finally:
+                _close_worker_vrt(vrt_key)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # 分批提交，限制在途窗口数量，内存与 workers 成正比
+                batch = workers * 4
+                for start in range(0, len(tasks), batch):
+                    for band, window, out in pool.map(_reproject_window, tasks[start:start + batch]):
+                        dst.write(out, band, window=window)
+    if cog:
+        overview_resampling = 'nearest' if resampling == Resampling.nearest else 'average'
+        rasterio.shutil.copy(out_tif, dst_tif, driver='COG', compress=compress,
+                             blocksize=REPROJECT_TILE_SIZE, overview_resampling=overview_resampling,
+                             BIGTIFF='IF_SAFER')
+        os.remove(out_tif)
     print(f"[!] 已重投影到：{dst_tif}")
 
+# ========== 分块流式栅格统计 ==========
+
+STREAM_WINDOW_PIXELS = 4 * 1024 * 1024   # 单个读取窗口的像元数上限
+HISTOGRAM_BINS = 65536                   # 浮点栅格近似分位数所用的直方图箱数
+
+
+def iter_block_windows(src, max_pixels=STREAM_WINDOW_PIXELS):
+    """
+    按块行(block row)对齐的整行条带窗口，每个窗口不超过max_pixels个像元（至少一个块行）。
+    对分块(tiled)和条带(striped)GeoTIFF都只会整块读取，不会重复解码。
+    """
+    block_h = src.block_shapes[0][0]
+    rows_per_window = max(block_h, (max_pixels // max(src.width, 1)) // block_h * block_h)
+    for row0 in range(0, src.height, rows_per_window):
+        yield Window(0, row0, src.width, min(rows_per_window, src.height - row0))
+
+
+def iter_raster_blocks(src, band=1, max_pixels=STREAM_WINDOW_PIXELS):
+    """逐窗口读取栅格，产出 (window, array, valid_mask)，valid_mask 剔除nodata"""
+    nodata = src.nodatavals[band - 1]
+    for window in iter_block_windows(src, max_pixels):
+        arr = src.read(band, window=window)
+        if nodata is None:
+            valid = np.ones(arr.shape, dtype=bool)
+        elif np.isnan(nodata):
+            valid = ~np.isnan(arr)
+        else:
+            valid = arr != nodata
+        if np.issubdtype(arr.dtype, np.floating):
+            valid &= ~np.isnan(arr)
+        yield window, arr, valid
+
+
+def _nodata_override(src, band, nodata):
+    return src.nodatavals[band - 1] if nodata is None else nodata
+
+
+def raster_min_max(tif_path, band=1):
+    """流式计算有效像元(剔除nodata)的最小值和最大值"""
+    min_val, max_val = None, None
+    with rasterio.open(tif_path) as src:
+        for _, arr, valid in iter_raster_blocks(src, band):
+            values = arr[valid]
+            if values.size == 0:
+                continue
+            lo, hi = values.min(), values.max()
+            min_val = lo if min_val is None else min(min_val, lo)
+            max_val = hi if max_val is None else max(max_val, hi)
+    return min_val, max_val
+
+
+def raster_histogram(tif_path, band=1, nodata=None, bins=HISTOGRAM_BINS, value_range=None):
+    """
+    流式直方图，剔除nodata。
+    - 整数栅格：逐值精确计数，返回 (counts, values)，values 为每个计数对应的像元值；
+    - 浮点栅格：在 value_range(默认为min/max)上等宽分箱，返回 (counts, bin_edges)。
+    nodata 为None时使用栅格自带的nodata。
+    """
+    with rasterio.open(tif_path) as src:
+        dtype = np.dtype(src.dtypes[band - 1])
+        nodata = _nodata_override(src, band, nodata)
+        blocks = ((arr, valid & (arr != nodata) if nodata is not None else valid)
+                  for _, arr, valid in iter_raster_blocks(src, band))
+
+        if np.issubdtype(dtype, np.integer) and dtype.itemsize <= 2:
+            info = np.iinfo(dtype)
+            counts = np.zeros(int(info.max) - int(info.min) + 1, dtype=np.int64)
+            for arr, valid in blocks:
+                counts += np.bincount(arr[valid].astype(np.int64) - info.min, minlength=counts.size)
+            return counts, np.arange(info.min, info.max + 1)
+
+        if value_range is None:
+            value_range = raster_min_max(tif_path, band)
+        counts = np.zeros(bins, dtype=np.int64)
+        edges = np.linspace(float(value_range[0]), float(value_range[1]), bins + 1)
+        for arr, valid in blocks:
+            counts += np.histogram(arr[valid], bins=edges)[0]
+        return counts, edges
+
+
+def raster_percentile(tif_path, q, band=1, nodata=None, bins=HISTOGRAM_BINS):
+    """
+    流式分位数（剔除nodata），内存与栅格大小无关。
+    8/16位整数栅格(如DEM)由精确计数直方图求得，结果与 np.percentile(线性插值) 完全一致；
+    其他类型按 bins 个等宽箱近似，误差不超过一个箱宽。
+    """
+    counts, axis = raster_histogram(tif_path, band, nodata, bins)
+    total = counts.sum()
+    if total == 0:
+        return float('nan')
+    cum = np.cumsum(counts)
+    rank = q / 100.0 * (total - 1)
+    lo_rank, hi_rank = int(math.floor(rank)), int(math.ceil(rank))
+
+    if axis.size == counts.size:
+        # 精确：第k小的值即累计计数首次超过k的位置
+        lo_val = axis[np.searchsorted(cum, lo_rank, side='right')]
+        hi_val = axis[np.searchsorted(cum, hi_rank, side='right')]
+        return float(lo_val + (hi_val - lo_val) * (rank - lo_rank))
+
+    # 近似：在所在箱内线性插值
+    idx = int(np.searchsorted(cum, rank, side='right'))
+    before = cum[idx - 1] if idx > 0 else 0
+    frac = (rank - before) / counts[idx] if counts[idx] else 0.0
+    return float(axis[idx] + (axis[idx + 1] - axis[idx]) * frac)
+
+
 # ========== 构建低地指数 ==========
 
 def calc_lowland_index(dem_arr, province_lowland_threshold, na_value=-32768):
@@ -97,6 +294,92 @@ def get_city_mask(city_shp, city_name, target_raster):
         out_image = out_image.squeeze()
         return out_image, out_transform
 
+# ========== 分区统计（一次栅格化，全部城市单遍统计） ==========
+
+def rasterize_city_labels(city_geoms, src, window=None):
+    """
+    将全部城市多边形一次性栅格化为与src(或其中window)对齐的标签数组：
+    第i个城市的像元值为 i+1，不属于任何城市为0。像元中心落入多边形即归属，与mask()一致。
+    """
+    if window is None:
+        out_shape, transform = (src.height, src.width), src.transform
+    else:
+        out_shape, transform = (int(window.height), int(window.width)), src.window_transform(window)
+    return rasterize(
+        ((geom, i + 1) for i, geom in enumerate(city_geoms)),
+        out_shape=out_shape, transform=transform, fill=0, dtype='int32'
+    )
+
+
+def zonal_lowland_index(city_geoms, dem_path, province_lowland_threshold, na_value=-32768):
+    """
+    单遍计算全部城市的低地指数，返回与city_geoms顺序一致的数组。
+    按块窗口流式读取DEM，每个窗口只栅格化对应范围的标签。
+    分母沿用 calc_lowland_index(get_city_mask(...)) 的口径：城市裁剪窗口内的全部像元数。
+    """
+    lowland_counts = np.zeros(len(city_geoms) + 1, dtype=np.int64)
+    with rasterio.open(dem_path) as src:
+        window_pixels = np.array([
+            int(w.height) * int(w.width)
+            for w in (geometry_window(src, [geom]) for geom in city_geoms)
+        ], dtype=float)
+        for window in iter_block_windows(src):
+            dem = src.read(1, window=window)
+            labels = rasterize_city_labels(city_geoms, src, window)
+            lowland = (dem != na_value) & (dem <= province_lowland_threshold)
+            lowland_counts += np.bincount(labels[lowland], minlength=lowland_counts.size)
+    return lowland_counts[1:] / window_pixels
+
+
+def zonal_landuse_stats(city_geoms, landuse_path):
+    """
+    单遍统计全部城市的土地利用类型占比，返回 region_landuse_stats 格式的字典列表。
+    每个块窗口用 标签×类别数+类别 组合键做一次 np.bincount，累加得到 [城市, 类别] 直方图。
+    """
+    with rasterio.open(landuse_path) as src:
+        dtype = np.dtype(src.dtypes[0])
+        if np.issubdtype(dtype, np.integer) and dtype.itemsize == 1:
+            n_classes = int(np.iinfo(dtype).max) + 1
+        else:
+            n_classes = int(raster_min_max(landuse_path)[1]) + 1
+        nodata = src.nodata
+        hist = np.zeros((len(city_geoms) + 1) * n_classes, dtype=np.int64)
+        for window in iter_block_windows(src):
+            landuse = src.read(1, window=window)
+            labels = rasterize_city_labels(city_geoms, src, window)
+            keep = (labels > 0) & (landuse > 0)
+            if nodata is not None:
+                keep &= landuse != nodata
+            hist += np.bincount(labels[keep].astype(np.int64) * n_classes + landuse[keep].astype(np.int64),
+                                minlength=hist.size)
+    hist = hist.reshape(len(city_geoms) + 1, n_classes)[1:]
+
+    stats = []
+    for counts in hist:
+        total = counts.sum()
+        present = np.nonzero(counts)[0]
+        stats.append({int(u): int(counts[u]) / total for u in present} if total else {})
+    return stats
+
+
+def zonal_city_stats(city_geoms, dem_path, landuse_path, province_lowland_threshold,
+                     landuse_weights, na_value=-32768):
+    """
+    全部城市的低地指数、土地利用占比、不透水面比例和火险权重。
+    每个栅格只读取、栅格化一次，取代逐城市调用 get_city_mask 的循环。
+    """
+    lowland = zonal_lowland_index(city_geoms, dem_path, province_lowland_threshold, na_value)
+    landuse = zonal_landuse_stats(city_geoms, landuse_path)
+    return [
+        {
+            'lowland_index': float(lowland_index),
+            'landuse_stats': landuse_stats,
+            'impervious_frac': float(impervious_fraction(landuse_stats)),
+            'fire_risk_weight': calc_fire_risk_weight(landuse_stats, landuse_weights),
+        }
+        for lowland_index, landuse_stats in zip(lowland, landuse)
+    ]
+
 # --------- 火灾风险相关参数 ---------
 LANDUSE_WEIGHTS = {
     1: 1.0,   # Cropland
@@ -120,82 +403,204 @@ def calc_fire_risk_weight(landuse_stats, landuse_weights):
 
 
 
-# ========== main ==========
+# ========== 格网静态因子（栅格分辨率风险模式） ==========
 
-if __name__ == "__main__":
+GRID_RESOLUTION_DEG = 0.01   # 格网分辨率(度)，约1km
+GRID_CHUNK_ROWS = 64         # 每次处理的格网行数，控制内存峰值
 
-    # --- DEM与土地利用本地数据 ---
-    dem_tif_path = "../data/dem/广东高程数据1.tif"
-    landuse_tif_path = "../data/landuse/CLCD_v01_2023_albert_guangdong.tif"
-    city_shp_path = "../data/admin_unit/地级.shp"
 
-    # 检查DEM高程范围
-    check_tif_value_range(dem_tif_path)
-    # 检查土地利用分布
-    check_tif_value_range(landuse_tif_path)
-    # 查看行政区划信息
-    check_shp_attributes(city_shp_path)
+def make_grid(bounds, resolution=GRID_RESOLUTION_DEG):
+    """按经纬度范围生成固定格网，返回 (transform, height, width)，原点在西北角"""
+    west, south, east, north = bounds
+    west = math.floor(west / resolution) * resolution
+    north = math.ceil(north / resolution) * resolution
+    width = int(math.ceil((east - west) / resolution))
+    height = int(math.ceil((north - south) / resolution))
+    return from_origin(west, north, resolution, resolution), height, width
 
-    # 读取shp并筛选广东省
-    gdf = gpd.read_file(city_shp_path)
-    gd_gdf = gdf[gdf['省级'] == "广东省"].copy()
-    # 与API的坐标系相统一： WGS84
-    if gd_gdf.crs != 'EPSG:4326':
-        gd_gdf = gd_gdf.to_crs(epsg=4326)
 
-    gd_gdf.to_file('../data/admin_unit/guangdong_border.geojson', driver='GeoJSON', encoding='utf-8')
+def _source_window(src, bounds, pad=1):
+    """覆盖给定范围的源栅格窗口（向外扩pad个像元并裁剪到栅格内）"""
+    west, south, east, north = bounds
+    inv = ~src.transform
+    cols, rows = zip(*[inv * (x, y) for x, y in ((west, north), (east, south))])
+    col0 = max(int(math.floor(min(cols))) - pad, 0)
+    row0 = max(int(math.floor(min(rows))) - pad, 0)
+    col1 = min(int(math.ceil(max(cols))) + pad, src.width)
+    row1 = min(int(math.ceil(max(rows))) + pad, src.height)
+    if col1 <= col0 or row1 <= row0:
+        return None
+    return Window(col0, row0, col1 - col0, row1 - row0)
 
-    # 计算几何中心用于API定位
-    gd_gdf['centroid'] = gd_gdf.geometry.centroid
-    gd_gdf['lon'] = gd_gdf['centroid'].x
-    gd_gdf['lat'] = gd_gdf['centroid'].y
+
+def grid_average(src, indicator_fn, grid_transform, row_start, row_stop, width):
+    """
+    将源栅格的指示量(indicator_fn(arr)，nodata处为NaN)按面积平均到格网的 [row_start, row_stop) 行。
+    只读取覆盖这几行的源窗口，内存与块大小成正比。
+    """
+    nrows = row_stop - row_start
+    chunk_transform = grid_transform * grid_transform.translation(0, row_start)
+    dst = np.full((nrows, width), np.nan, dtype=np.float32)
+    west, north = chunk_transform * (0, 0)
+    east, south = chunk_transform * (width, nrows)
+    window = _source_window(src, (west, south, east, north))
+    if window is None:
+        return dst
+    values = indicator_fn(src.read(1, window=window)).astype(np.float32)
+    reproject(
+        source=values,
+        destination=dst,
+        src_transform=src.window_transform(window),
+        src_crs=src.crs,
+        src_nodata=np.nan,
+        dst_transform=chunk_transform,
+        dst_crs=src.crs,
+        dst_nodata=np.nan,
+        resampling=Resampling.average
+    )
+    return dst
+
+
+def build_static_grid(gd_gdf, dem_path, landuse_path, province_lowland_threshold,
+                      landuse_weights, out_path, na_value=-32768,
+                      resolution=GRID_RESOLUTION_DEG, chunk_rows=GRID_CHUNK_ROWS):
+    """
+    生成全省固定经纬度格网上的逐格静态因子，保存为npz:
+    lat/lon(格元中心)、lowland_index(低地像元比例)、impervious_frac(不透水比例)、
+    fire_risk_weight(土地利用加权火险权重)、city_index(所属城市在cities_meta中的序号，-1为省外)。
+    省界外的格元为NaN。按 chunk_rows 行分块处理。
+    """
+    transform, height, width = make_grid(gd_gdf.total_bounds, resolution)
+    city_index = rasterize(
+        ((geom, i) for i, geom in enumerate(gd_gdf.geometry)),
+        out_shape=(height, width), transform=transform, fill=-1, dtype='int16'
+    )
+    outside = city_index < 0
+
+    weight_lut = np.zeros(256, dtype=np.float32)
+    for landuse_type, weight in landuse_weights.items():
+        weight_lut[landuse_type] = weight
+
+    def lowland_indicator(arr):
+        return np.where(arr == na_value, np.nan, arr <= province_lowland_threshold)
+
+    def impervious_indicator(arr):
+        return np.where(arr > 0, arr == 8, np.nan)
+
+    def fire_weight_indicator(arr):
+        return np.where(arr > 0, weight_lut[np.clip(arr, 0, 255)], np.nan)
+
+    layers = {name: np.full((height, width), np.nan, dtype=np.float32)
+              for name in ('lowland_index', 'impervious_frac', 'fire_risk_weight')}
+    with rasterio.open(dem_path) as dem_src, rasterio.open(landuse_path) as lu_src:
+        for row_start in range(0, height, chunk_rows):
+            row_stop = min(row_start + chunk_rows, height)
+            rows = slice(row_start, row_stop)
+            layers['lowland_index'][rows] = grid_average(dem_src, lowland_indicator, transform, row_start, row_stop, width)
+            layers['impervious_frac'][rows] = grid_average(lu_src, impervious_indicator, transform, row_start, row_stop, width)
+            layers['fire_risk_weight'][rows] = grid_average(lu_src, fire_weight_indicator, transform, row_start, row_stop, width)
+    for layer in layers.values():
+        layer[outside] = np.nan
+
+    lon = transform.c + resolution * (np.arange(width) + 0.5)
+    lat = transform.f - resolution * (np.arange(height) + 0.5)
+    np.savez_compressed(out_path, lat=lat, lon=lon, city_index=city_index,
+                        resolution=resolution, **layers)
+    print(f"[!] 格网静态因子已保存：{out_path} ({height}x{width}, {resolution}°)")
+    return out_path
+
+
+# ========== 地图几何简化（分级简化 + 坐标量化） ==========
+
+# 缩放级别 -> (简化容差(度), 坐标保留小数位)。容差约为该级别下半个屏幕像素
+GEOJSON_SIMPLIFY_LEVELS = {
+    5: (0.01, 3),
+    7: (0.003, 4),
+    9: (0.0008, 5),
+}
+GEOJSON_PROPERTIES = ['地级', '地级码']   # 地图只需要 featureidkey 对应的属性
 
 
-    # 统一栅格数据投影（以地级市shp为基准）
-    target_crs = gd_gdf.crs
-    # 处理DEM
-    dem_reproj_path = '../data/dem/guangdong_dem_reproj.tif'
-    if not os.path.exists(dem_reproj_path):
-        reproject_raster(dem_tif_path, dem_reproj_path, target_crs)
-    # 处理土地利用
-    landuse_reproj_path = '../data/landuse/guangdong_landuse_reproj.tif'
-    if not os.path.exists(landuse_reproj_path):
-        reproject_raster(landuse_tif_path, landuse_reproj_path, target_crs)
+def simplified_geojson_path(geojson_path, zoom):
+    root, ext = os.path.splitext(geojson_path)
+    return f"{root}_z{zoom}{ext}"
+
 
+def _round_coords(coords, ndigits):
+    if isinstance(coords[0], (int, float)):
+        return [round(c, ndigits) for c in coords]
+    return [_round_coords(c, ndigits) for c in coords]
+
+
+def simplify_city_geometry(gd_gdf, tolerance, ndigits):
+    """
+    对全部城市多边形做拓扑保持的整体简化（coverage simplify，相邻城市共享边界同步简化，
+    不产生缝隙/重叠），再把坐标吸附到 10^-ndigits 度网格上。
+    GEOS < 3.12 时退回逐个多边形 simplify(preserve_topology=True)。
+    """
+    geoms = gd_gdf.geometry
+    try:
+        simplified = geoms.simplify_coverage(tolerance)
+    except (AttributeError, NotImplementedError, shapely.errors.UnsupportedGEOSVersionError):
+        simplified = geoms.simplify(tolerance, preserve_topology=True)
+    return simplified.set_precision(10 ** -ndigits)
 
-    # 计算全省DEM低地阈值
-    with rasterio.open(dem_reproj_path) as src:
-        dem_data = src.read(1)
-        na_value = -32768
-        # 剔除缺失值
-        valid_dem_flat = dem_data[dem_data != na_value]
-        province_lowland_threshold = np.percentile(valid_dem_flat, 30)
-        print(f"全省低地阈值 ({30}%) = (m)", province_lowland_threshold)
 
-    # 计算并合并低地指数
+def write_simplified_geojson(gd_gdf, geojson_path, levels=GEOJSON_SIMPLIFY_LEVELS):
+    """
+    为各缩放级别写出简化、量化后的紧凑GeoJSON（无缩进、只保留地图所需属性），
+    返回 {zoom: path}。仪表盘直接按字节读取并下发，不再解析/重新序列化。
+    """
+    paths = {}
+    for zoom, (tolerance, ndigits) in sorted(levels.items()):
+        geometry = simplify_city_geometry(gd_gdf, tolerance, ndigits)
+        features = []
+        for (_, row), geom in zip(gd_gdf.iterrows(), geometry):
+            geo = shapely.geometry.mapping(geom)
+            features.append({
+                'type': 'Feature',
+                'properties': {k: row[k] for k in GEOJSON_PROPERTIES if k in row},
+                'geometry': {'type': geo['type'], 'coordinates': _round_coords(geo['coordinates'], ndigits)},
+            })
+        path = simplified_geojson_path(geojson_path, zoom)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'type': 'FeatureCollection', 'features': features}, f,
+                      ensure_ascii=False, separators=(',', ':'), default=int)
+        print(f"[!] 简化边界 z{zoom} (tol={tolerance}°)：{path}, {os.path.getsize(path) / 1024:.0f} KB")
+        paths[zoom] = path
+    return paths
+
+
+# ========== 城市元数据 ==========
+
+LOWLAND_PERCENTILE = 30   # 全省低地阈值分位数(%)
+
+
+def build_cities_meta(gd_gdf, dem_reproj_path, landuse_reproj_path, province_lowland_threshold,
+                      out_path, na_value=-32768):
+    """分区统计各城市低地指数、不透水面比例、火险权重，写出 guangdong_cities_meta.json"""
     cities_meta = []
 
-    for idx, row in gd_gdf.iterrows():
+    # 分区统计：每个栅格只栅格化、扫描一次
+    city_stats = zonal_city_stats(list(gd_gdf.geometry), dem_reproj_path, landuse_reproj_path,
+                                  province_lowland_threshold, LANDUSE_WEIGHTS, na_value=na_value)
+
+    for (idx, row), stats in zip(gd_gdf.iterrows(), city_stats):
         city_name = row['地级']
         adcode = row['地级码']
         lon = row['lon']
         lat = row['lat']
 
-        # -- 新增：城市区域DEM和土地覆盖裁剪 --
-        dem_arr, _ = get_city_mask(city_shp_path, city_name, dem_reproj_path)
-        landuse_arr, _ = get_city_mask(city_shp_path, city_name, landuse_reproj_path)
-
         # 低地指数
-        lowland_index = calc_lowland_index(dem_arr, province_lowland_threshold, na_value=na_value)
+        lowland_index = stats['lowland_index']
         print(f"{city_name} 低地指数: {lowland_index:.3f}")
 
-        # 计算各土地利用比例与不透水面比例
-        landuse_stats = region_landuse_stats(landuse_arr)
-        imperv_frac = float(impervious_fraction(landuse_stats))
+        # 各土地利用比例与不透水面比例
+        imperv_frac = stats['impervious_frac']
         print(f"{city_name} 不透水面比例: {imperv_frac:.3f}")
 
-        # 火灾风险权重计算
-        fire_risk_weight = calc_fire_risk_weight(landuse_stats, LANDUSE_WEIGHTS)
+        # 火灾风险权重
+        fire_risk_weight = stats['fire_risk_weight']
         print(f"{city_name} 火灾风险权重: {fire_risk_weight:.3f}")
 
         meta = {
@@ -209,7 +614,100 @@ if __name__ == "__main__":
         }
         cities_meta.append(meta)
 
-    with open('../data/admin_unit/guangdong_cities_meta.json', 'w', encoding='utf-8') as f:
+    with open(out_path, 'w', encoding='utf-8') as f:
         json.dump(cities_meta, f, ensure_ascii=False, indent=2)
 
-    print("guangdong_cities_meta.json 已保存，")
\ No newline at end of file
+    print("guangdong_cities_meta.json 已保存，")
+
+
+# ========== main ==========
+
+if __name__ == "__main__":
+
+    # --- DEM与土地利用本地数据 ---
+    dem_tif_path = "../data/dem/广东高程数据1.tif"
+    landuse_tif_path = "../data/landuse/CLCD_v01_2023_albert_guangdong.tif"
+    city_shp_path = "../data/admin_unit/地级.shp"
+
+    # --- 派生产物 ---
+    geojson_path = '../data/admin_unit/guangdong_border.geojson'
+    dem_reproj_path = '../data/dem/guangdong_dem_reproj.tif'
+    landuse_reproj_path = '../data/landuse/guangdong_landuse_reproj.tif'
+    cities_meta_path = '../data/admin_unit/guangdong_cities_meta.json'
+    static_grid_path = '../data/admin_unit/guangdong_static_grid.npz'
+    na_value = -32768
+
+    # 构建缓存：按输入内容哈希+参数判断各阶段是否需要重算，清单记录来源与耗时
+    cache = BuildCache('../data/build_manifest.json')
+
+    # 查看行政区划信息
+    check_shp_attributes(city_shp_path)
+
+    # 读取shp并筛选广东省
+    gdf = gpd.read_file(city_shp_path)
+    gd_gdf = gdf[gdf['省级'] == "广东省"].copy()
+    # 与API的坐标系相统一： WGS84
+    if gd_gdf.crs != 'EPSG:4326':
+        gd_gdf = gd_gdf.to_crs(epsg=4326)
+
+    cache.run('border_geojson', inputs=[city_shp_path], params={'province': '广东省', 'crs': 'EPSG:4326'},
+              outputs=[geojson_path],
+              build=lambda: gd_gdf.to_file(geojson_path, driver='GeoJSON', encoding='utf-8'))
+    cache.run('border_geojson_simplified', inputs=[city_shp_path],
+              params={'province': '广东省', 'levels': GEOJSON_SIMPLIFY_LEVELS, 'properties': GEOJSON_PROPERTIES},
+              outputs=[simplified_geojson_path(geojson_path, z) for z in GEOJSON_SIMPLIFY_LEVELS],
+              build=lambda: write_simplified_geojson(gd_gdf, geojson_path))
+
+    # 计算几何中心用于API定位
+    gd_gdf['centroid'] = gd_gdf.geometry.centroid
+    gd_gdf['lon'] = gd_gdf['centroid'].x
+    gd_gdf['lat'] = gd_gdf['centroid'].y
+
+
+    # 统一栅格数据投影（以地级市shp为基准）
+    target_crs = gd_gdf.crs
+    reproj_params = {'crs': target_crs.to_string(), 'tolerance': REPROJECT_TOLERANCE, 'cog': True}
+
+    def build_dem_reproj():
+        # 检查DEM高程范围
+        check_tif_value_range(dem_tif_path)
+        reproject_raster(dem_tif_path, dem_reproj_path, target_crs,
+                         resampling=DEM_RESAMPLING, src_nodata=na_value, cog=True)
+
+    def build_landuse_reproj():
+        # 检查土地利用分布
+        check_tif_value_range(landuse_tif_path)
+        reproject_raster(landuse_tif_path, landuse_reproj_path, target_crs,
+                         resampling=LANDUSE_RESAMPLING, cog=True)
+
+    # 处理DEM
+    cache.run('dem_reproj', inputs=[dem_tif_path],
+              params=dict(reproj_params, resampling=DEM_RESAMPLING.name, src_nodata=na_value),
+              outputs=[dem_reproj_path], build=build_dem_reproj)
+    # 处理土地利用
+    cache.run('landuse_reproj', inputs=[landuse_tif_path],
+              params=dict(reproj_params, resampling=LANDUSE_RESAMPLING.name),
+              outputs=[landuse_reproj_path], build=build_landuse_reproj)
+
+
+    # 计算全省DEM低地阈值（流式精确分位数，不整幅读入DEM）
+    province_lowland_threshold = cache.run(
+        'lowland_threshold', inputs=[dem_reproj_path],
+        params={'percentile': LOWLAND_PERCENTILE, 'na_value': na_value}, outputs=[],
+        build=lambda: raster_percentile(dem_reproj_path, LOWLAND_PERCENTILE, nodata=na_value))
+    print(f"全省低地阈值 ({LOWLAND_PERCENTILE}%) = (m)", province_lowland_threshold)
+
+    # 计算并合并低地指数、不透水面比例与火险权重
+    derived_inputs = [city_shp_path, dem_reproj_path, landuse_reproj_path]
+    derived_params = {'province': '广东省', 'lowland_threshold': province_lowland_threshold,
+                      'landuse_weights': LANDUSE_WEIGHTS, 'na_value': na_value}
+    cache.run('cities_meta', inputs=derived_inputs, params=derived_params, outputs=[cities_meta_path],
+              build=lambda: build_cities_meta(gd_gdf, dem_reproj_path, landuse_reproj_path,
+                                              province_lowland_threshold, cities_meta_path, na_value=na_value))
+
+    # 格网模式：逐格低地/不透水/火险权重
+    cache.run('static_grid', inputs=derived_inputs,
+              params=dict(derived_params, resolution=GRID_RESOLUTION_DEG), outputs=[static_grid_path],
+              build=lambda: build_static_grid(gd_gdf, dem_reproj_path, landuse_reproj_path,
+                                              province_lowland_threshold, LANDUSE_WEIGHTS,
+                                              static_grid_path, na_value=na_value))
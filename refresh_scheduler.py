@@ -0,0 +1,134 @@
+import random
+import threading
+import time
+import traceback
+
+# ========== 后台定时刷新 ==========
+# 刷新（抓取天气 → 预计算风险 → 发布快照）在后台线程中运行，不占用Dash请求线程。
+# 定时间隔加随机抖动，避免多个实例同时请求上游；失败后按指数退避重试。
+# 手动刷新只是把任务放入队列（唤醒后台线程），立即返回；刷新进行中点击的，在本次结束后再刷新一次
+# （本次可能在点击之前就已取完数据）。
+
+
+class RefreshScheduler:
+    """
+    scheduler = RefreshScheduler(job, interval=1800, jitter=60)
+    scheduler.start()
+    scheduler.request_refresh()   # 按钮：排队一次刷新，立即返回
+    scheduler.status()            # 版本号、上次成功/失败时间、下次运行时间……
+
+    job() 抛出异常即视为失败。interval<=0 时只在 request_refresh()（及 run_on_start）时运行。
+    """
+
+    def __init__(self, job, interval=1800.0, jitter=60.0, retry_delay=30.0, max_backoff=1800.0,
+                 run_on_start=False, name="weather-refresh"):
+        self.job = job
+        self.interval = float(interval)
+        self.jitter = float(jitter)
+        self.retry_delay = float(retry_delay)
+        self.max_backoff = float(max_backoff)
+        self.name = name
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = run_on_start
+        self.version = 0               # 每次成功刷新 +1
+        self.trigger = None            # 当前/上一次运行的起因：'requested'（手动或启动时）/ 'scheduled'（定时或重试）
+        self.running = False
+        self.failures = 0              # 连续失败次数
+        self.last_success = None
+        self.last_error = None
+        self.last_error_time = None
+        self.last_duration = None
+        self.next_run = None
+
+    # --------- 控制 ---------
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def request_refresh(self):
+        """
+        排队一次刷新并立即返回；已有尚未开始的排队时并入该次，正在运行时排在它之后。
+        返回是否新排入队列
+        """
+        with self._lock:
+            if self._pending:
+                return False
+            self._pending = True
+        self._wake.set()
+        return True
+
+    # --------- 调度 ---------
+
+    def _delay_after(self, ok):
+        if ok:
+            if self.interval <= 0:
+                return None
+            return max(0.0, self.interval + random.uniform(-self.jitter, self.jitter))
+        backoff = min(self.max_backoff, self.retry_delay * 2 ** (self.failures - 1))
+        return backoff * random.uniform(0.5, 1.0)  # 部分抖动的指数退避
+
+    def _run(self):
+        delay = self._delay_after(True) if not self._pending else 0.0
+        while not self._stop.is_set():
+            self.next_run = None if delay is None else time.time() + delay
+            self._wake.wait(delay)
+            if self._stop.is_set():
+                break
+            self._wake.clear()
+            with self._lock:
+                self.trigger = 'requested' if self._pending else 'scheduled'
+                self._pending = False
+                self.running = True
+            delay = self._delay_after(self._run_job())
+            if self._pending:  # 运行期间又有手动请求：立即再运行一次
+                delay = 0.0
+
+    def _run_job(self):
+        t0 = time.perf_counter()
+        try:
+            self.job()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            self.last_error_time = time.time()
+            print(f"[!] {self.name} failed ({self.failures} in a row): {self.last_error}")
+            traceback.print_exc()
+            return False
+        else:
+            self.failures = 0
+            self.version += 1
+            self.last_success = time.time()
+            return True
+        finally:
+            self.last_duration = time.perf_counter() - t0
+            with self._lock:
+                self.running = False
+
+    def status(self):
+        return {
+            'version': self.version,
+            'running': self.running,
+            'trigger': self.trigger,
+            'pending': self._pending,
+            'failures': self.failures,
+            'last_success': self.last_success,
+            'last_error': self.last_error,
+            'last_error_time': self.last_error_time,
+            'last_duration': self.last_duration,
+            'next_run': self.next_run,
+        }
@@ -1,10 +1,11 @@
-from data_fetcher import update_weather_json
+# 运行时的风险计算只依赖 NumPy；rasterio / geopandas 只在 preprocess_static_data.py 的预处理中使用
+from weather_store import get_weather_store
+from file_lock import atomic_write
+from weather_snapshot import SNAPSHOT_FIELDS, SNAPSHOT_TIMES, pack_weather, pack_forecast_series, load_weather_snapshot
 
 import numpy as np
-import rasterio
-from rasterio.mask import mask
-import geopandas as gpd
 import json
+from datetime import datetime, timedelta, timezone
 
 
 # --------- 洪水风险相关参数 ---------
@@ -65,84 +66,439 @@ def classify_flood_risk(score):
         return "极高风险"
 
 
-# ========== 汇总数据进行估计 ==========
+# ========== 向量化风险引擎 ==========
 
-def estimate_region_risk(cities_meta, weather_dict, weather_time='now'):
+# 风险等级，下标与阈值分段一一对应
+RISK_LEVELS = ["极低风险", "低风险", "中风险", "高风险", "极高风险"]
+# 分数缺失(NaN)时的等级下标与名称
+NO_DATA_LEVEL = -1
+NO_DATA_LABEL = "无数据"
+# 所有可选的估计时刻（与列式天气快照的时刻一致，预报时效由 FORECAST_HOURS 决定）
+RISK_TIMES = list(SNAPSHOT_TIMES)
+# 天气数组最后一维的变量顺序（与列式天气快照一致）
+WEATHER_FIELDS = SNAPSHOT_FIELDS
+
+
+def threshold_array(thresholds):
+    """阈值字典 -> 升序数组 [very_low, low, medium, high]"""
+    return np.array([thresholds[k] for k in ("very_low", "low", "medium", "high")], dtype=float)
+
+
+def classify_scores(scores, thresholds):
     """
-    输入所有城市元信息(cities_meta)和weather_dict
-    返回每个城市的洪水风险结果
-    weather_time:
-    - 'now'         取当前天气
-    - 'forecast-3h' 取3小时预报
-    - 'forecast-6h' 取6小时预报
-    依次类推...
+    批量分级，返回RISK_LEVELS下标数组。
+    searchsorted(side='left') 使 score <= 阈值 落入该级，与 classify_*_risk 的if/elif一致。
+    NaN 分数（缺失数据）会被 searchsorted 排到最高一级，这里先记为 NO_DATA_LEVEL。
     """
-    results = {}
-    for city_info in cities_meta:
-        city_name = city_info["city_name"]
-        city_weather = weather_dict.get(city_name, {})
-        weather_data = None
-
-        # 选择天气数据
-        if weather_time == 'now':
-            weather_data = (
-                city_weather.get('weather', {}).get('now', None)
-            )
-        elif weather_time.startswith('forecast-'):
-            forecast_hr = weather_time.split('-')[1]  # 提取'3h'、'6h'这类
-            weather_data = (
-                city_weather
-                .get('weather', {})
-                .get('forecast', {})
-                .get(forecast_hr, None)
-            )
-        else:
-            print(f"Unknown weather_time: {weather_time}")
-            weather_data = None
+    levels = np.searchsorted(threshold_array(thresholds), scores, side="left")
+    return np.where(np.isnan(scores), NO_DATA_LEVEL, levels)
 
-        if weather_data is None:
-            print(f"Warning: Weather data missing for {city_name} at {weather_time}.")
-            continue
 
-        precip = weather_data.get('precipitation', 0.0)
-        temp = weather_data.get('temperature', 0.0)
-        humidity = weather_data.get('humidity', 0.0)
-        wind_speed = weather_data.get('wind_speed', 0.0)
+def risk_level_name(level):
+    """等级下标 -> 名称；NO_DATA_LEVEL 为 NO_DATA_LABEL"""
+    return RISK_LEVELS[level] if level >= 0 else NO_DATA_LABEL
+
+
+def pack_city_factors(cities_meta):
+    """城市静态因子打包为列数组（只需在cities_meta变化时做一次）"""
+    return {
+        "city_name": [c["city_name"] for c in cities_meta],
+        "lowland_index": np.array([c["lowland_index"] for c in cities_meta], dtype=float),
+        "impervious_frac": np.array([c["impervious_frac"] for c in cities_meta], dtype=float),
+        "fire_risk_weight": np.array([c.get("fire_risk_weight", 1.0) for c in cities_meta], dtype=float),
+    }
+
+
+def evaluate_risk_arrays(lowland_index, impervious_frac, fire_weight, weather_values):
+    """
+    一次性计算所有城市(或格点)、所有时刻的洪水/火灾指数与等级。
+    静态因子形状为 [n]，weather_values 形状为 [n, time, WEATHER_FIELDS]（或 [n, WEATHER_FIELDS]）。
+    """
+    precip, temp, humidity, wind_speed = np.moveaxis(weather_values, -1, 0)
+    extra_dims = (slice(None),) + (np.newaxis,) * (precip.ndim - 1)
+    flood_score = calc_flood_index(precip, lowland_index[extra_dims], impervious_frac[extra_dims])
+    fire_score = calc_fire_index(temp, humidity, wind_speed, fire_weight[extra_dims])
+    return {
+        "flood_score": flood_score,
+        "flood_level": classify_scores(flood_score, FLOOD_RISK_THRESHOLDS),
+        "fire_score": fire_score,
+        "fire_level": classify_scores(fire_score, FIRE_RISK_THRESHOLDS),
+    }
+
+
+def estimate_risk_table(cities_meta, weather_dict, weather_times=RISK_TIMES):
+    """
+    所有城市 × 所有时刻的风险结果（数组形式）。
+    返回 dict: city_name, weather_times, factors, weather [city, time, var], valid [city, time],
+    以及 flood_score / flood_level / fire_score / fire_level [city, time]。
+    """
+    factors = pack_city_factors(cities_meta)
+    weather_values, valid = pack_weather(factors["city_name"], weather_dict, weather_times)
+    return _risk_table(factors, weather_values, valid, weather_times)
+
+
+def _risk_table(factors, weather_values, valid, weather_times):
+    table = evaluate_risk_arrays(factors["lowland_index"], factors["impervious_frac"],
+                                 factors["fire_risk_weight"], weather_values)
+    table.update({
+        "city_name": factors["city_name"],
+        "weather_times": list(weather_times),
+        "factors": factors,
+        "weather": weather_values,
+        "valid": valid,
+    })
+    return table
+
+
+def snapshot_weather_arrays(snapshot, city_names, weather_times=RISK_TIMES):
+    """
+    从列式天气快照（load_weather_snapshot）取出 [city, time, WEATHER_FIELDS] 数组与有效掩模。
+    城市、时刻、字段顺序与快照一致时直接返回快照中的数组（不复制）；
+    否则按名称重排，快照中没有的城市/时刻视为缺失。
+    """
+    if snapshot["fields"] != list(WEATHER_FIELDS):
+        raise ValueError(f"snapshot fields {snapshot['fields']} do not match {WEATHER_FIELDS}")
+    if snapshot["city_name"] == list(city_names) and snapshot["weather_times"] == list(weather_times):
+        return snapshot["values"], snapshot["valid"]
+    city_pos = {c: i for i, c in enumerate(snapshot["city_name"])}
+    time_pos = {t: j for j, t in enumerate(snapshot["weather_times"])}
+    values = np.full((len(city_names), len(weather_times), len(WEATHER_FIELDS)), np.nan)
+    valid = np.zeros((len(city_names), len(weather_times)), dtype=bool)
+    rows = [(i, city_pos[c]) for i, c in enumerate(city_names) if c in city_pos]
+    cols = [(j, time_pos[t]) for j, t in enumerate(weather_times) if t in time_pos]
+    if rows and cols:
+        dst_i, src_i = map(list, zip(*rows))
+        dst_j, src_j = map(list, zip(*cols))
+        values[np.ix_(dst_i, dst_j)] = snapshot["values"][np.ix_(src_i, src_j)]
+        valid[np.ix_(dst_i, dst_j)] = snapshot["valid"][np.ix_(src_i, src_j)]
+    return values, valid
+
+
+def estimate_risk_table_from_snapshot(cities_meta, snapshot, weather_times=RISK_TIMES):
+    """
+    与 estimate_risk_table 相同，但天气来自列式快照（快照对象或 .npz 路径），无需解析JSON。
+    """
+    if isinstance(snapshot, str):
+        snapshot = load_weather_snapshot(snapshot)
+    factors = pack_city_factors(cities_meta)
+    weather_values, valid = snapshot_weather_arrays(snapshot, factors["city_name"], weather_times)
+    return _risk_table(factors, weather_values, valid, weather_times)
+
+
+def estimate_series_risk(city_meta, weather_values):
+    """
+    单个城市的天气序列（如历史归档）[k, WEATHER_FIELDS] -> 各时刻的 flood/fire 分数与等级 [k]。
+    用当前的静态因子与阈值计算；缺失数据的时刻分数为NaN、等级为 NO_DATA_LEVEL。
+    """
+    factors = pack_city_factors([city_meta])
+    table = evaluate_risk_arrays(factors["lowland_index"], factors["impervious_frac"],
+                                 factors["fire_risk_weight"], np.asarray(weather_values, dtype=float)[np.newaxis])
+    return {key: value[0] for key, value in table.items()}
+
+
+# ========== 预报序列滑动窗口聚合 ==========
+# 各变量在窗口内的聚合方式：降水取累计量，温度/风速取最大值，湿度取平均
+WINDOW_AGGREGATES = {
+    "precipitation": "sum",
+    "temperature": "max",
+    "humidity": "mean",
+    "wind_speed": "max",
+}
+BJ_TZ = timezone(timedelta(hours=8))
+
+
+def rolling_window(values, window, how="sum", axis=1):
+    """
+    沿 axis 做前向滑动窗口聚合：out[..., t, ...] 为 values[t : t+window] 的 max / sum / mean。
+    所有城市一次计算（sum/mean 用累加和相减，max 用滑动视图）；
+    窗口内有缺失(NaN)或窗口超出序列末尾时结果为NaN。
+    """
+    values = np.moveaxis(np.asarray(values, dtype=float), axis, -1)
+    n = values.shape[-1]
+    out = np.full(values.shape, np.nan)
+    if window < 1 or window > n:
+        return np.moveaxis(out, -1, axis)
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    missing = np.pad(np.cumsum(np.isnan(values), axis=-1), pad)
+    complete = (missing[..., window:] - missing[..., :-window]) == 0
+    if how in ("sum", "mean"):
+        csum = np.pad(np.cumsum(np.nan_to_num(values), axis=-1), pad)
+        agg = csum[..., window:] - csum[..., :-window]
+        if how == "mean":
+            agg = agg / window
+    elif how == "max":
+        agg = np.lib.stride_tricks.sliding_window_view(values, window, axis=-1).max(axis=-1)
+    else:
+        raise ValueError(f"unknown aggregation: {how}")
+    out[..., :n - window + 1] = np.where(complete, agg, np.nan)
+    return np.moveaxis(out, -1, axis)
+
+
+def window_slots(series_dt, window_hours):
+    """窗口小时数 -> 时次个数（按序列的时间步长，OpenWeatherMap为3小时）"""
+    if len(series_dt) < 2:
+        return 1
+    step = float(np.median(np.diff(series_dt))) / 3600.0
+    return max(1, int(np.ceil(window_hours / step - 1e-9)))
+
+
+def aggregate_forecast_series(series_values, window, aggregates=WINDOW_AGGREGATES):
+    """[city, slot, WEATHER_FIELDS] -> 每个起始时次往后 window 个时次的聚合天气，形状不变"""
+    out = np.empty(np.shape(series_values))
+    for k, field in enumerate(WEATHER_FIELDS):
+        out[..., k] = rolling_window(series_values[..., k], window, aggregates[field], axis=1)
+    return out
+
+
+def estimate_window_risk_table(cities_meta, weather, window_hours=24, aggregates=WINDOW_AGGREGATES):
+    """
+    基于完整预报序列的滑动窗口风险：每个起始时次取其后 window_hours 小时的聚合天气
+    （默认累计降水、最高温、平均湿度、最大风速）计算洪水/火灾指数。
+    weather 可以是天气字典、列式快照或 .npz 路径。
+    返回与 estimate_risk_table 相同结构的表，weather_times 为各窗口起始时刻（北京时间），
+    另含 series_dt [slot]（UTC秒）与 window_hours；不满一个窗口的尾部时次 valid 为 False。
+    注意：阈值沿用单时次的标定，累计降水会使洪水分数整体偏高。
+    """
+    factors = pack_city_factors(cities_meta)
+    if isinstance(weather, str):
+        weather = load_weather_snapshot(weather)
+    if "series_values" in weather and list(weather["city_name"]) == factors["city_name"]:
+        series_dt, values = weather["series_dt"], weather["series_values"]  # 快照顺序一致，直接使用
+    else:
+        if "series_values" in weather:
+            weather = snapshot_to_series_dict(weather)
+        series_dt, values, _ = pack_forecast_series(factors["city_name"], weather)
+    window_values = aggregate_forecast_series(values, window_slots(series_dt, window_hours), aggregates)
+    valid = ~np.isnan(window_values).any(axis=-1)
+    labels = [datetime.fromtimestamp(int(t), BJ_TZ).strftime('%Y-%m-%d %H:%M:%S') for t in series_dt]
+    table = _risk_table(factors, window_values, valid, labels)
+    table.update({"series_dt": np.asarray(series_dt), "window_hours": window_hours})
+    return table
+
 
-        lowland_index = city_info["lowland_index"]
-        impervious_frac = city_info["impervious_frac"]
-        fire_weight = city_info.get("fire_risk_weight", 1.0)
+def snapshot_to_series_dict(snapshot):
+    """列式快照中的预报序列 -> {city: {'weather': {'series': {...}}}}，用于按其他城市顺序重新打包"""
+    weather_dict = {}
+    dt = [int(t) for t in snapshot["series_dt"]]
+    for i, city_name in enumerate(snapshot["city_name"]):
+        series = {"dt": dt}
+        for k, field in enumerate(snapshot["fields"]):
+            series[field] = [None if np.isnan(v) else v for v in snapshot["series_values"][i, :, k].tolist()]
+        weather_dict[city_name] = {"weather": {"series": series}}
+    return weather_dict
 
-        flood_score = calc_flood_index(precip, lowland_index, impervious_frac)
-        flood_risk_class = classify_flood_risk(flood_score)
 
-        fire_score = calc_fire_index(temp, humidity, wind_speed, fire_weight)
-        fire_risk_class = classify_fire_risk(fire_score)
+def risk_table_to_results(table, weather_time, warn=True):
+    """
+    把数组结果中的某一时刻转换为 estimate_region_risk 的字典格式。
+    warn=False 时不逐城市打印缺失数据的警告（批量预计算时使用）。
+    """
+    j = table["weather_times"].index(weather_time)
+    factors = table["factors"]
+    weather = table["weather"][:, j, :].tolist()
+    flood_score = table["flood_score"][:, j].tolist()
+    fire_score = table["fire_score"][:, j].tolist()
+    flood_level = table["flood_level"][:, j].tolist()
+    fire_level = table["fire_level"][:, j].tolist()
 
+    results = {}
+    for i, city_name in enumerate(table["city_name"]):
+        if not table["valid"][i, j]:
+            if warn:
+                print(f"Warning: Weather data missing for {city_name} at {weather_time}.")
+            continue
+        precip, temp, humidity, wind_speed = weather[i]
         results[city_name] = {
-            "flood_score": flood_score,
-            "flood_risk_level": flood_risk_class,
-            "fire_score": fire_score,
-            "fire_risk_level": fire_risk_class,
+            "flood_score": flood_score[i],
+            "flood_risk_level": risk_level_name(flood_level[i]),
+            "fire_score": fire_score[i],
+            "fire_risk_level": risk_level_name(fire_level[i]),
 
             "precip": precip,
-            "lowland_index": lowland_index,
-            "impervious_frac": impervious_frac,
+            "lowland_index": float(factors["lowland_index"][i]),
+            "impervious_frac": float(factors["impervious_frac"][i]),
             "temperature": temp,
             "humidity": humidity,
             "wind_speed": wind_speed,
-            "fire_weight": fire_weight
+            "fire_weight": float(factors["fire_risk_weight"][i])
         }
     return results
 
 
+# ========== 风险快照（天气刷新后一次性预计算全部时刻） ==========
+
+def save_risk_table(table, path, source_stamp=None):
+    """
+    将 estimate_risk_table 的结果保存为npz快照（写临时文件后原子替换）。
+    source_stamp: 生成该快照的天气文件标识（如 (mtime_ns, size)），用于判断快照是否过期。
+    """
+    factors = table["factors"]
+    arrays = {
+        "city_name": np.array(table["city_name"]),
+        "weather_times": np.array(table["weather_times"]),
+        "weather": table["weather"],
+        "valid": table["valid"],
+        "flood_score": table["flood_score"],
+        "flood_level": table["flood_level"].astype(np.int8),
+        "fire_score": table["fire_score"],
+        "fire_level": table["fire_level"].astype(np.int8),
+        "lowland_index": factors["lowland_index"],
+        "impervious_frac": factors["impervious_frac"],
+        "fire_risk_weight": factors["fire_risk_weight"],
+        "source_stamp": np.array(source_stamp if source_stamp is not None else [], dtype=np.int64),
+    }
+    with atomic_write(path, "wb") as f:
+        np.savez(f, **arrays)
+    return path
+
+
+def load_risk_table(path):
+    """读取 save_risk_table 的快照，返回 (table, source_stamp)"""
+    with np.load(path) as data:
+        table = {
+            "city_name": data["city_name"].tolist(),
+            "weather_times": data["weather_times"].tolist(),
+            "weather": data["weather"],
+            "valid": data["valid"],
+            "flood_score": data["flood_score"],
+            "flood_level": data["flood_level"],
+            "fire_score": data["fire_score"],
+            "fire_level": data["fire_level"],
+        }
+        table["factors"] = {
+            "city_name": table["city_name"],
+            "lowland_index": data["lowland_index"],
+            "impervious_frac": data["impervious_frac"],
+            "fire_risk_weight": data["fire_risk_weight"],
+        }
+        stamp = tuple(data["source_stamp"].tolist()) or None
+    return table, stamp
+
+
+def precompute_risk(cities_meta, weather_dict, snapshot_path=None, source_stamp=None):
+    """
+    天气数据更新后调用：一次计算 now 与全部预报时刻的风险，
+    返回 (table, {weather_time: estimate_region_risk格式的结果})，并可同时写出磁盘快照。
+    """
+    # 缺失数据的逐城市警告在这里没有意义
+    table = estimate_risk_table(cities_meta, weather_dict, RISK_TIMES)
+    results_by_time = {t: risk_table_to_results(table, t, warn=False) for t in RISK_TIMES}
+    if snapshot_path:
+        save_risk_table(table, snapshot_path, source_stamp)
+    return table, results_by_time
+
+
+# ========== 格网风险模式 ==========
+
+GRID_CHUNK_ROWS = 64   # 每块格网行数；内存峰值约为 行数 × 列数 × 城市数 × 8字节
+IDW_POWER = 2.0        # 反距离加权插值幂次
+
+
+def load_static_grid(path):
+    """读取 preprocess_static_data.build_static_grid 生成的格网静态因子"""
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
+
+def idw_weights(point_lat, point_lon, grid_lat, grid_lon, power=IDW_POWER):
+    """
+    格点 [rows, cols] 相对站点 [n] 的反距离权重，形状 [rows*cols, n]，每行和为1。
+    距离采用等距圆柱近似（省域尺度足够）。格点与站点重合时取该站点值。
+    """
+    lon2d, lat2d = np.meshgrid(grid_lon, grid_lat)
+    coslat = np.cos(np.deg2rad(np.mean(point_lat)))
+    dx = (lon2d.reshape(-1, 1) - point_lon[np.newaxis, :]) * coslat
+    dy = lat2d.reshape(-1, 1) - point_lat[np.newaxis, :]
+    dist2 = dx * dx + dy * dy
+    with np.errstate(divide='ignore'):
+        weights = dist2 ** (-power / 2.0)
+    exact = dist2 == 0
+    hit = exact.any(axis=1)
+    weights[hit] = exact[hit]
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights
+
+
+def iter_grid_risk(static_grid, cities_meta, weather_dict, weather_time='now',
+                   chunk_rows=GRID_CHUNK_ROWS, power=IDW_POWER):
+    """
+    按行分块计算格网风险，逐块产出 (row_slice, result)。
+    城市点天气经反距离加权插值到格点，再与逐格静态因子一起走 evaluate_risk_arrays。
+    result 中各数组形状为 [块行数, 列数]；省界外格元分数为NaN、等级为-1。
+    """
+    city_names = [c["city_name"] for c in cities_meta]
+    weather_values, valid = pack_weather(city_names, weather_dict, [weather_time])
+    valid = valid[:, 0]
+    point_lat = np.array([c["lat"] for c in cities_meta], dtype=float)[valid]
+    point_lon = np.array([c["lon"] for c in cities_meta], dtype=float)[valid]
+    point_values = weather_values[valid, 0, :]
+
+    grid_lat, grid_lon = static_grid["lat"], static_grid["lon"]
+    height, width = len(grid_lat), len(grid_lon)
+    for row_start in range(0, height, chunk_rows):
+        rows = slice(row_start, min(row_start + chunk_rows, height))
+        lowland = static_grid["lowland_index"][rows].reshape(-1).astype(float)
+        imperv = static_grid["impervious_frac"][rows].reshape(-1).astype(float)
+        fire_weight = static_grid["fire_risk_weight"][rows].reshape(-1).astype(float)
+
+        if len(point_values):
+            weights = idw_weights(point_lat, point_lon, grid_lat[rows], grid_lon, power)
+            cell_weather = weights @ point_values
+        else:
+            cell_weather = np.full((lowland.size, len(WEATHER_FIELDS)), np.nan)
+
+        result = evaluate_risk_arrays(lowland, imperv, fire_weight, cell_weather)
+        for kind in ("flood", "fire"):
+            result[f"{kind}_level"] = result[f"{kind}_level"].astype(np.int8)  # 缺失为 NO_DATA_LEVEL
+        for i, field in enumerate(WEATHER_FIELDS):
+            result[field] = cell_weather[:, i]
+        yield rows, {k: v.reshape(rows.stop - rows.start, width) for k, v in result.items()}
+
+
+def estimate_grid_risk(static_grid, cities_meta, weather_dict, weather_time='now',
+                       chunk_rows=GRID_CHUNK_ROWS, power=IDW_POWER):
+    """
+    全格网风险估计。输出为float32分数与int8等级的 [rows, cols] 数组，
+    计算过程按块进行，额外内存只与 chunk_rows 有关。
+    """
+    shape = (len(static_grid["lat"]), len(static_grid["lon"]))
+    out = {
+        "flood_score": np.full(shape, np.nan, dtype=np.float32),
+        "flood_level": np.full(shape, NO_DATA_LEVEL, dtype=np.int8),
+        "fire_score": np.full(shape, np.nan, dtype=np.float32),
+        "fire_level": np.full(shape, NO_DATA_LEVEL, dtype=np.int8),
+    }
+    for rows, result in iter_grid_risk(static_grid, cities_meta, weather_dict, weather_time, chunk_rows, power):
+        for key, arr in out.items():
+            arr[rows] = result[key]
+    out["lat"] = static_grid["lat"]
+    out["lon"] = static_grid["lon"]
+    return out
+
+
+# ========== 汇总数据进行估计 ==========
+
+def estimate_region_risk(cities_meta, weather_dict, weather_time='now'):
+    """
+    输入所有城市元信息(cities_meta)和weather_dict
+    返回每个城市的洪水风险结果
+    weather_time:
+    - 'now'         取当前天气
+    - 'forecast-3h' 取3小时预报
+    - 'forecast-6h' 取6小时预报
+    依次类推...
+    计算由向量化引擎 estimate_risk_table 完成，这里只做字典格式适配。
+    """
+    table = estimate_risk_table(cities_meta, weather_dict, [weather_time])
+    return risk_table_to_results(table, weather_time)
+
+
 if __name__ == "__main__":
 
     with open("../data/admin_unit/guangdong_cities_meta.json", encoding="utf-8") as f:
         cities_meta = json.load(f)
 
-    with open("../data/guangdong_weather.json", encoding="utf-8") as f:
-        weather_dict = json.load(f)
+    weather_dict = get_weather_store("../data/guangdong_weather.json").get()
 
     # weather_dict = update_weather_json()
 
@@ -0,0 +1,10 @@
+# ========== 请求统计的公共工具 ==========
+# OpenWeatherMap 与大模型两个请求层的 stats.summary() 共用。
+
+
+def percentile(values, q):
+    """最近秩分位数（q 取 0..100）；values 为空时返回None"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
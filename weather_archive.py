@@ -0,0 +1,183 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from owm_parse import forecast_hours
+from weather_snapshot import SNAPSHOT_FIELDS, SNAPSHOT_TIMES, weather_block
+
+# ========== 天气历史归档 ==========
+# guangdong_weather.json 每次刷新都会被覆盖；归档库为每次抓取追加一条记录(城市 × 时刻)，
+# 以 (city, issue_time, valid_time) 为主键顺序存储，按城市 + 时间范围的查询只需走一段索引。
+# issue_date 列（北京时间日期）用于按天统计/清理。只追加，不修改已有记录。
+
+ARCHIVE_FIELDS = SNAPSHOT_FIELDS + ('wind_direction',)
+BJ_TZ = timezone(timedelta(hours=8))
+DATETIME_FMT = "%Y-%m-%d %H:%M:%S"
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS weather_obs (
+    city        TEXT    NOT NULL,
+    issue_time  INTEGER NOT NULL,   -- 抓取时间 (unix秒)
+    valid_time  INTEGER NOT NULL,   -- 数据对应的时间 (unix秒)；now 等于 issue_time
+    horizon     TEXT    NOT NULL,   -- 'now' / 'forecast-3h' ...
+    issue_date  TEXT    NOT NULL,   -- 抓取日期 (北京时间 YYYY-MM-DD)
+    {', '.join(f'{field} REAL' for field in ARCHIVE_FIELDS)},
+    PRIMARY KEY (city, issue_time, valid_time, horizon)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS weather_obs_issue_date ON weather_obs (issue_date);
+"""
+
+
+def weather_archive_path(json_path):
+    """guangdong_weather.json -> guangdong_weather_archive.sqlite"""
+    return os.path.splitext(json_path)[0] + '_archive.sqlite'
+
+
+def _valid_time(block, weather_time, issue_time):
+    """预报块的 datetime 为北京时间；缺失时按预报时效推算"""
+    if weather_time == 'now':
+        return issue_time
+    if block.get('datetime'):
+        try:
+            dt = datetime.strptime(block['datetime'], DATETIME_FMT).replace(tzinfo=BJ_TZ)
+            return int(dt.timestamp())
+        except ValueError:
+            pass
+    return issue_time + int(round(forecast_hours(weather_time) * 3600))  # 时效可为小数，如 1.5h
+
+
+def fetch_rows(weather_dict, issue_time, weather_times=SNAPSHOT_TIMES):
+    """一次抓取的天气字典 -> 归档行"""
+    issue_date = datetime.fromtimestamp(issue_time, BJ_TZ).strftime("%Y-%m-%d")
+    rows = []
+    for city_name, city_weather in weather_dict.items():
+        for weather_time in weather_times:
+            block = weather_block(city_weather or {}, weather_time)
+            if not block:
+                continue
+            rows.append((city_name, issue_time, _valid_time(block, weather_time, issue_time),
+                         weather_time, issue_date) + tuple(block.get(field) for field in ARCHIVE_FIELDS))
+    return rows
+
+
+class WeatherArchive:
+    """
+    archive = WeatherArchive('../data/guangdong_weather_archive.sqlite')
+    archive.append_fetch(weather_dict)                       # 每次抓取后追加
+    hist = archive.city_history('广州市', start=t0, end=t1)   # 按城市与时间范围查询
+
+    每次操作使用独立连接（WAL模式），可在多个线程/进程间同时读写。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+        return conn
+
+    def append_fetch(self, weather_dict, issue_time=None):
+        """追加一次抓取的全部城市与时刻，返回新写入的行数"""
+        return self.append_fetches([(issue_time, weather_dict)])
+
+    def append_fetches(self, fetches):
+        """批量追加多次抓取 [(issue_time, weather_dict)]，一个事务内 executemany 写入"""
+        rows = []
+        for issue_time, weather_dict in fetches:
+            issue_time = int(issue_time if issue_time is not None else time.time())
+            rows.extend(fetch_rows(weather_dict, issue_time))
+        columns = ('city', 'issue_time', 'valid_time', 'horizon', 'issue_date') + ARCHIVE_FIELDS
+        sql = (f"INSERT OR IGNORE INTO weather_obs ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' * len(columns))})")
+        with closing(self._connect()) as conn, conn:
+            before = conn.total_changes
+            conn.executemany(sql, rows)
+            return conn.total_changes - before
+
+    def city_history(self, city, start=None, end=None, horizons=('now',)):
+        """
+        某城市在 [start, end] (issue_time, unix秒) 内的记录，按 issue_time, valid_time 排序。
+        返回 dict: issue_time, valid_time (int64), horizon (list)，以及 ARCHIVE_FIELDS 各列 (float, 缺失为NaN)。
+        """
+        sql = (f"SELECT issue_time, valid_time, horizon, {', '.join(ARCHIVE_FIELDS)} FROM weather_obs "
+               "WHERE city = ? AND issue_time BETWEEN ? AND ?")
+        params = [city, int(start) if start is not None else 0,
+                  int(end) if end is not None else 2 ** 62]
+        if horizons:
+            sql += f" AND horizon IN ({', '.join('?' * len(horizons))})"
+            params.extend(horizons)
+        sql += " ORDER BY issue_time, valid_time"
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        columns = list(zip(*rows)) if rows else [()] * (3 + len(ARCHIVE_FIELDS))
+        history = {
+            'issue_time': np.array(columns[0], dtype=np.int64),
+            'valid_time': np.array(columns[1], dtype=np.int64),
+            'horizon': list(columns[2]),
+        }
+        for k, field in enumerate(ARCHIVE_FIELDS):
+            history[field] = np.array(columns[3 + k], dtype=float)  # None -> NaN
+        return history
+
+    def issue_times(self, start=None, end=None):
+        """[start, end] 内所有抓取时间（升序）"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT DISTINCT issue_time FROM weather_obs "
+                                "WHERE issue_time BETWEEN ? AND ? ORDER BY issue_time",
+                                (int(start) if start is not None else 0,
+                                 int(end) if end is not None else 2 ** 62)).fetchall()
+        return [row[0] for row in rows]
+
+    def fetch_weather_dict(self, issue_time):
+        """还原某次抓取的天气字典（now 与各预报时效，结构同 guangdong_weather.json 的 weather 部分）"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT city, valid_time, horizon, {', '.join(ARCHIVE_FIELDS)} "
+                                "FROM weather_obs WHERE issue_time = ?", (int(issue_time),)).fetchall()
+        weather_dict = {}
+        for city, valid_time, horizon, *values in rows:
+            city_weather = weather_dict.setdefault(city, {'weather': {'now': {}, 'forecast': {}}})['weather']
+            block = dict(zip(ARCHIVE_FIELDS, values))
+            if horizon == 'now':
+                city_weather['now'] = block
+            else:
+                block['datetime'] = datetime.fromtimestamp(valid_time, BJ_TZ).strftime(DATETIME_FMT)
+                city_weather['forecast'][horizon.split('-')[1]] = block
+        return weather_dict
+
+    def latest_issue_time(self, city=None):
+        sql, params = "SELECT MAX(issue_time) FROM weather_obs", ()
+        if city is not None:
+            sql, params = sql + " WHERE city = ?", (city,)
+        with closing(self._connect()) as conn:
+            return conn.execute(sql, params).fetchone()[0]
+
+    def count(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM weather_obs").fetchone()[0]
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_weather_archive(path):
+    """按文件绝对路径返回进程内共享的 WeatherArchive"""
+    key = os.path.abspath(path)
+    with _archives_lock:
+        archive = _archives.get(key)
+        if archive is None:
+            archive = _archives[key] = WeatherArchive(key)
+        return archive
@@ -0,0 +1,253 @@
+import abc
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+from http_cache import cache_key
+from owm_parse import (FORECAST_BASE_URL, FORECAST_HOURS, FORECAST_INTERPOLATE, LANG, WEATHER_BASE_URL,
+                       city_entry, parse_current_weather, parse_forecast_series, select_forecast)
+from weather_archive import get_weather_archive
+
+# ========== 天气数据源 ==========
+# update_weather_json 通过数据源逐城市获取天气条目，不再直接依赖 OpenWeatherMap：
+#   - data_fetcher.OpenWeatherMapProvider：在线抓取（默认）；
+#   - RecordedResponseProvider：回放录制的接口响应（HTTP缓存目录格式），按录制时间轴以任意倍速放出；
+#   - SnapshotReplayProvider：回放归档的天气快照（guangdong_weather.json 副本或归档库），每次刷新推进一帧。
+# 后两者不需要网络和API_KEY，用于离线环境、复现历史天气过程和压测。
+
+
+class WeatherProvider(abc.ABC):
+    """
+    数据源接口。每轮刷新依次调用:
+        provider.check()            # 无法使用时返回错误信息，否则None
+        provider.start_refresh()
+        provider.fetch_city(city)   # 可在多个线程中并发调用，返回 (city_name, 城市天气条目)
+        provider.finish_refresh()   # 返回本轮统计（dict，可为None）
+    城市天气条目的结构与 guangdong_weather.json 一致。
+    """
+    name = "provider"
+
+    def check(self):
+        return None
+
+    def start_refresh(self):
+        pass
+
+    @abc.abstractmethod
+    def fetch_city(self, city):
+        pass
+
+    def finish_refresh(self):
+        return None
+
+
+class ReplayClock:
+    """
+    录制时间轴 -> 墙钟。speed 为倍速（60 表示墙钟1秒回放录制的1分钟），speed<=0 时不等待。
+    第一次 start(t) 把录制时间 t 对齐到当前墙钟。
+    """
+
+    def __init__(self, speed=0.0):
+        self.speed = float(speed)
+        self._origin = None  # (墙钟, 录制时间)
+        self._lock = threading.Lock()
+
+    def start(self, recorded_time):
+        with self._lock:
+            if self._origin is None:
+                self._origin = (time.time(), float(recorded_time))
+
+    def recorded_now(self):
+        """当前墙钟对应的录制时间；未开始或不限速时为None"""
+        if self._origin is None or self.speed <= 0:
+            return None
+        wall, recorded = self._origin
+        return recorded + (time.time() - wall) * self.speed
+
+    def wait_until(self, recorded_time):
+        """阻塞到回放时钟走到 recorded_time，返回等待秒数"""
+        now = self.recorded_now()
+        if now is None or recorded_time <= now:
+            return 0.0
+        delay = (recorded_time - now) / self.speed
+        time.sleep(delay)
+        return delay
+
+
+class _ReplayStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.served = 0
+        self.missing = 0
+        self.waited = 0.0
+
+    def record(self, found, waited=0.0):
+        with self._lock:
+            if found:
+                self.served += 1
+            else:
+                self.missing += 1
+            self.waited += waited
+
+    def summary(self, **extra):
+        with self._lock:
+            return dict(extra, served=self.served, missing=self.missing, waited_seconds=round(self.waited, 3))
+
+
+class RecordedResponseProvider(WeatherProvider):
+    """
+    回放录制的 OpenWeatherMap 响应。录制目录与 HttpCache 的格式相同（每个响应一个JSON文件，
+    含 body 与 stored_at），把 HTTP_CACHE_DIR 指向一个目录在线刷新一次即完成录制。
+    响应按各自的 stored_at 以 speed 倍速放出；预报时效相对录制时刻选取，而非当前时间。
+    """
+    name = "recorded"
+
+    def __init__(self, directory, speed=0.0):
+        self.directory = directory
+        self.clock = ReplayClock(speed)
+        self._entries = {}
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self._entries[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: skipping unreadable recording {path}: {e}")
+        self._stats = _ReplayStats()
+
+    def check(self):
+        if not self._entries:
+            return f"No recorded responses found in {self.directory}."
+        return None
+
+    def start_refresh(self):
+        self.clock.start(min(entry['stored_at'] for entry in self._entries.values()))
+        self._stats = _ReplayStats()
+
+    def _replay(self, url, lat, lon):
+        params = {"lat": lat, "lon": lon, "units": "metric", "lang": LANG}
+        entry = self._entries.get(cache_key(url, params))
+        if entry is None:
+            self._stats.record(False)
+            return None, None
+        self._stats.record(True, self.clock.wait_until(entry['stored_at']))
+        return json.loads(entry['body']), entry['stored_at']
+
+    def fetch_city(self, city):
+        lat, lon = city['lat'], city['lon']
+        now_weather, forecast, series = None, {}, None
+        try:
+            current, _ = self._replay(WEATHER_BASE_URL, lat, lon)
+            if current is not None:
+                now_weather = parse_current_weather(current)
+            data, recorded_at = self._replay(FORECAST_BASE_URL, lat, lon)
+            if data is not None and "list" in data:
+                series = parse_forecast_series(data)
+                forecast = select_forecast(series, FORECAST_HOURS, now=recorded_at, interpolate=FORECAST_INTERPOLATE)
+        except (KeyError, ValueError) as e:
+            print(f"Error parsing recorded weather for {city['city_name']}: {e}")
+        return city['city_name'], city_entry(city, now_weather, forecast, series)
+
+    def finish_refresh(self):
+        return self._stats.summary(recordings=len(self._entries))
+
+
+class SnapshotReplayProvider(WeatherProvider):
+    """
+    回放归档的天气快照。frames 为 [(issue_time, 天气字典或返回天气字典的函数)]，按时间排序。
+    speed<=0 时每次刷新推进一帧（到最后一帧后 loop=True 则从头开始，否则停在最后一帧）；
+    speed>0 时按回放时钟选取不晚于当前录制时间的最新一帧。
+    """
+    name = "snapshots"
+
+    def __init__(self, frames, speed=0.0, loop=False):
+        self.frames = sorted(frames, key=lambda frame: frame[0])
+        self.clock = ReplayClock(speed)
+        self.loop = loop
+        self._next = 0
+        self._frame_index = None
+        self._frame = {}
+        self._stats = _ReplayStats()
+
+    @classmethod
+    def from_sources(cls, sources, speed=0.0, loop=False):
+        """
+        sources: 路径列表（可含通配符）。.json 为天气JSON，抓取时间取文件修改时间；
+        .sqlite 为天气归档库，每次抓取为一帧。
+        路径不存在（通配符没有匹配）时抛 FileNotFoundError，避免为拼错的 .sqlite 路径新建空库。
+        """
+        frames = []
+        for pattern in sources:
+            paths = sorted(glob.glob(pattern))
+            if not paths:
+                raise FileNotFoundError(f"weather snapshot source not found: {pattern}")
+            for path in paths:
+                if path.endswith('.sqlite'):
+                    archive = get_weather_archive(path)
+                    frames.extend((t, (lambda t=t, a=archive: a.fetch_weather_dict(t))) for t in archive.issue_times())
+                else:
+                    frames.append((os.path.getmtime(path), (lambda p=path: _load_json(p))))
+        return cls(frames, speed, loop)
+
+    def check(self):
+        if not self.frames:
+            return "No weather snapshots to replay."
+        return None
+
+    def _pick_frame(self):
+        self.clock.start(self.frames[0][0])
+        recorded_now = self.clock.recorded_now()
+        if recorded_now is not None:
+            times = [frame[0] for frame in self.frames]
+            return max(0, bisect.bisect_right(times, recorded_now) - 1)
+        index = self._next
+        if index >= len(self.frames):
+            index = 0 if self.loop else len(self.frames) - 1
+        self._next = index + 1
+        return index
+
+    def start_refresh(self):
+        index = self._pick_frame()
+        if index != self._frame_index:
+            frame = self.frames[index][1]
+            self._frame = frame() if callable(frame) else frame
+            self._frame_index = index
+        self._stats = _ReplayStats()
+
+    def fetch_city(self, city):
+        city_name = city['city_name']
+        weather = (self._frame.get(city_name) or {}).get('weather')
+        self._stats.record(weather is not None)
+        entry = city_entry(city, None, {}, None)
+        if weather is not None:
+            entry['weather'] = weather
+        return city_name, entry
+
+    def finish_refresh(self):
+        return self._stats.summary(frame=self._frame_index, frames=len(self.frames),
+                                   issue_time=self.frames[self._frame_index][0])
+
+
+def _load_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def provider_from_env(spec, speed=0.0, online=None):
+    """
+    'openweathermap' | 'recorded:<目录>' | 'snapshots:<路径,路径...>' -> 数据源实例
+    online: 在线数据源的类（data_fetcher 传入 OpenWeatherMapProvider）
+    """
+    kind, _, arg = (spec or 'openweathermap').partition(':')
+    kind = kind.strip().lower()
+    if kind in ('openweathermap', 'owm'):
+        if online is None:
+            raise ValueError("WEATHER_PROVIDER=openweathermap needs the online provider from data_fetcher")
+        return online()
+    if kind == 'recorded':
+        return RecordedResponseProvider(arg, speed)
+    if kind == 'snapshots':
+        return SnapshotReplayProvider.from_sources([p for p in arg.split(',') if p], speed)
+    raise ValueError(f"unknown WEATHER_PROVIDER: {spec}")
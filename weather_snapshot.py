@@ -0,0 +1,142 @@
+import os
+
+import numpy as np
+
+from file_lock import atomic_write
+from owm_parse import FORECAST_HOURS, forecast_time
+
+# ========== 列式天气快照 ==========
+# guangdong_weather.json 是按城市名嵌套的字典，读取方需要完整解析再逐层取值。
+# 快照把同一份数据保存为定长数组 values[city, horizon, field]，并附带城市名、时刻、字段索引表，
+# 以未压缩的 .npz 写在JSON旁边，读取时不必逐层解析JSON。
+# 完整的3小时预报序列另存为 series_values[city, slot, field]，各城市对齐到同一组时次 series_dt。
+
+# 实况 + 配置的各预报时效（FORECAST_HOURS），与抓取时写入的预报键一致
+SNAPSHOT_TIMES = ('now',) + tuple(forecast_time(h) for h in FORECAST_HOURS)
+SNAPSHOT_FIELDS = ('precipitation', 'temperature', 'humidity', 'wind_speed')
+SNAPSHOT_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)  # 版本1没有预报序列
+
+
+def weather_snapshot_path(json_path):
+    """guangdong_weather.json -> guangdong_weather.npz"""
+    return os.path.splitext(json_path)[0] + '.npz'
+
+
+def weather_block(city_weather, weather_time):
+    """取某城市某时刻的天气字典，未知时刻或缺失时返回None"""
+    if weather_time == 'now':
+        return city_weather.get('weather', {}).get('now', None)
+    if weather_time.startswith('forecast-'):
+        forecast_hr = weather_time.split('-')[1]  # 提取'3h'、'6h'这类
+        return city_weather.get('weather', {}).get('forecast', {}).get(forecast_hr, None)
+    print(f"Unknown weather_time: {weather_time}")
+    return None
+
+
+def pack_weather(city_names, weather_dict, weather_times=SNAPSHOT_TIMES, fields=SNAPSHOT_FIELDS):
+    """
+    天气字典 -> 数组 [city, time, field]，以及有效掩模 [city, time]。
+    缺失的时刻整行为NaN；已有时刻中缺失的字段按0.0处理（与逐城市版本一致）。
+    """
+    values = np.full((len(city_names), len(weather_times), len(fields)), np.nan)
+    valid = np.zeros((len(city_names), len(weather_times)), dtype=bool)
+    for i, city_name in enumerate(city_names):
+        city_weather = weather_dict.get(city_name, {})
+        for j, weather_time in enumerate(weather_times):
+            block = weather_block(city_weather, weather_time)
+            if block is None:
+                continue
+            valid[i, j] = True
+            values[i, j] = [block.get(field, 0.0) for field in fields]
+    return values, valid
+
+
+def pack_forecast_series(city_names, weather_dict, fields=SNAPSHOT_FIELDS):
+    """
+    各城市的完整预报序列（weather['series']）-> 对齐到公共时次的数组。
+    返回 dt [slot]（UTC秒，升序）、values [city, slot, field]、valid [city, slot]；
+    某城市缺少某时次（或该时次字段缺失）时为NaN / False。
+    """
+    city_series = [weather_dict.get(c, {}).get('weather', {}).get('series') or {} for c in city_names]
+    dt = np.unique(np.concatenate([np.asarray(s.get('dt', []), dtype=np.int64) for s in city_series]
+                                  + [np.zeros(0, dtype=np.int64)]))
+    values = np.full((len(city_names), len(dt), len(fields)), np.nan)
+    for i, series in enumerate(city_series):
+        if not series.get('dt'):
+            continue
+        pos = np.searchsorted(dt, np.asarray(series['dt'], dtype=np.int64))
+        for k, field in enumerate(fields):
+            column = series.get(field)
+            if column is not None:
+                values[i, pos, k] = np.array(column, dtype=float)  # null -> NaN
+    valid = ~np.isnan(values).any(axis=-1)
+    return dt, values, valid
+
+
+def write_weather_snapshot(path, city_names, weather_dict, weather_times=SNAPSHOT_TIMES):
+    """打包天气字典并写出快照（原子替换）"""
+    values, valid = pack_weather(city_names, weather_dict, weather_times)
+    series_dt, series_values, series_valid = pack_forecast_series(city_names, weather_dict)
+    forecast_time = np.zeros(valid.shape, dtype='U19')  # 各时刻的预报时间（北京时间），now为空
+    for i, city_name in enumerate(city_names):
+        city_weather = weather_dict.get(city_name, {})
+        for j, weather_time in enumerate(weather_times):
+            block = weather_block(city_weather, weather_time)
+            if block is not None and block.get('datetime'):
+                forecast_time[i, j] = block['datetime']
+    arrays = {
+        'version': np.array(SNAPSHOT_VERSION, dtype=np.int32),
+        'city_name': np.array(city_names, dtype=str),
+        'weather_times': np.array(weather_times, dtype=str),
+        'fields': np.array(SNAPSHOT_FIELDS, dtype=str),
+        'values': values,
+        'valid': valid,
+        'forecast_time': forecast_time,
+        'series_dt': series_dt,
+        'series_values': series_values,
+        'series_valid': series_valid,
+    }
+    with atomic_write(path, 'wb') as f:
+        np.savez(f, **arrays)  # 不压缩：体积很小，读取时省去解压
+    return path
+
+
+def load_weather_snapshot(path):
+    """
+    读取快照，返回 dict: city_name, weather_times, fields (list),
+    values [city, time, field], valid [city, time], forecast_time [city, time]，
+    以及完整预报序列 series_dt [slot]、series_values [city, slot, field]、series_valid [city, slot]
+    （版本1的快照没有序列，这三项为空数组）。
+    """
+    with np.load(path) as data:
+        snap = {name: data[name] for name in data.files}
+    version = int(snap.pop('version'))
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError(f"unsupported weather snapshot version {version} in {path}")
+    if 'series_dt' not in snap:
+        n_cities, n_fields = len(snap['city_name']), len(snap['fields'])
+        snap['series_dt'] = np.zeros(0, dtype=np.int64)
+        snap['series_values'] = np.zeros((n_cities, 0, n_fields))
+        snap['series_valid'] = np.zeros((n_cities, 0), dtype=bool)
+    for name in ('city_name', 'weather_times', 'fields'):
+        snap[name] = [str(v) for v in snap[name]]
+    return snap
+
+
+def snapshot_to_weather_dict(snap):
+    """快照 -> 与 guangdong_weather.json 同结构的字典（仅含快照中的字段），用于校验"""
+    weather_dict = {}
+    for i, city_name in enumerate(snap['city_name']):
+        now, forecast = None, {}
+        for j, weather_time in enumerate(snap['weather_times']):
+            if not snap['valid'][i, j]:
+                continue
+            block = {field: float(snap['values'][i, j, k]) for k, field in enumerate(snap['fields'])}
+            if weather_time == 'now':
+                now = block
+            else:
+                block['datetime'] = str(snap['forecast_time'][i, j])
+                forecast[weather_time.split('-')[1]] = block
+        weather_dict[city_name] = {'weather': {'now': now, 'forecast': forecast}}
+    return weather_dict
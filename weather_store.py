@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+
+# ========== 天气数据进程内缓存 ==========
+# guangdong_weather.json 只在刷新时改变，而仪表盘每次交互都要读取它。
+# WeatherStore 缓存解析后的数据，以文件 (mtime_ns, size) 作为版本标识，
+# 只有文件变化时才重新解析；同一进程内的多个Dash工作线程共享同一份数据。
+
+
+def file_stamp(path):
+    """文件版本标识 (mtime_ns, size)；文件不存在时抛 FileNotFoundError"""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class WeatherStore:
+    """
+    store = get_weather_store('../data/guangdong_weather.json')
+    weather_dict = store.get()                 # 未变化时直接返回内存中的数据
+    weather_dict, stamp = store.snapshot()     # 同时返回版本标识，便于缓存派生结果
+
+    返回的数据在线程间共享，调用方不要原地修改。
+    文件不存在抛 FileNotFoundError，内容损坏抛 json.JSONDecodeError（保留上一版数据不变）。
+    """
+
+    def __init__(self, path, loader=_load_json):
+        self.path = path
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # (数据, 版本标识) 作为一个不可变元组整体替换，读取方一次取出，不会拿到新旧混搭的一对
+        self._entry = (None, None)
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.reload_seconds = 0.0
+        self.last_reload_seconds = 0.0
+
+    def snapshot(self):
+        """返回 (数据, 版本标识)"""
+        stamp = file_stamp(self.path)
+        data, cached_stamp = self._entry
+        if cached_stamp == stamp:
+            self._count(hit=True)
+            return data, stamp
+        with self._lock:
+            # 其他线程可能已在等待期间完成加载
+            stamp = file_stamp(self.path)
+            data, cached_stamp = self._entry
+            if cached_stamp == stamp:
+                self._count(hit=True)
+                return data, stamp
+            self._count(hit=False)
+            t0 = time.perf_counter()
+            data = self.loader(self.path)
+            elapsed = time.perf_counter() - t0
+            self._entry = (data, stamp)
+            self.reloads += 1
+            self.reload_seconds += elapsed
+            self.last_reload_seconds = elapsed
+            return data, stamp
+
+    def _count(self, hit):
+        # 单独的锁：命中路径不必等待正在进行的重新加载
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self):
+        return self.snapshot()[0]
+
+    def put(self, data):
+        """写出文件后调用：直接登记刚写入的数据，避免下次读取时重新解析"""
+        with self._lock:
+            stamp = file_stamp(self.path)
+            self._entry = (data, stamp)
+        return stamp
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = (None, None)
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'path': self.path,
+            'stamp': self._entry[1],
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'reloads': self.reloads,
+            'reload_seconds_total': round(self.reload_seconds, 6),
+            'last_reload_seconds': round(self.last_reload_seconds, 6),
+        }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_weather_store(path):
+    """按文件绝对路径返回进程内共享的 WeatherStore"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = WeatherStore(key)
+        return store
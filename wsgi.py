@@ -0,0 +1,21 @@
+"""
+生产环境入口（WSGI）。例如:
+    gunicorn -c gunicorn.conf.py wsgi:server
+
+preload 模式下本模块只在主进程导入一次：城市元数据、边界GeoJSON、基础图形以及已有天气数据的风险快照
+都在fork之前加载好，各worker以写时复制方式共享，不再各自重复加载。
+后台刷新线程不在这里启动（线程不能跨fork），由 gunicorn.conf.py 的 post_worker_init 钩子
+在每个worker中调用 dashboard_app.start_background_tasks() 启动；用其他WSGI服务器时需在worker中同样调用。
+"""
+import json
+
+import dashboard_app
+
+if dashboard_app.weather_data_available():
+    try:
+        dashboard_app.get_risk_snapshot()  # 预先解析天气并计算风险，worker直接复用
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: could not preload the risk snapshot: {e}")
+
+app = dashboard_app.create_app()
+server = app.server  # WSGI callable